@@ -0,0 +1,54 @@
+"""
+Measure the memory taken by the bodies of a polling client, which gets the
+same response over and over, with and without a shared BodyStore.
+
+Usage: python benchmarks/bench_body_store.py [transactions] [body bytes]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis.body import Body, BodyStore  # noqa: E402
+from htmlvis.htmlvis import Request, Response, Transaction  # noqa: E402
+from htmlvis.transaction_store import ListStore  # noqa: E402
+
+
+def main(num_transactions=10000, body_bytes=4096):
+    for bodies in (None, BodyStore(max_bytes=1024 * 1024)):
+        tracemalloc.start()
+        begin = time.time()
+        store = ListStore(bodies=bodies)
+        for index in range(num_transactions):
+            store.append(_polling_transaction(index, body_bytes))
+        elapsed = time.time() - begin
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('%-10s %8.1f KiB  %6.2f us per transaction' %
+              ('shared' if bodies else 'unshared', memory / 1024.0,
+               elapsed / num_transactions * 1e6))
+
+
+def _polling_transaction(index, body_bytes):
+    # A fresh copy of the payload, as if it had just been received
+    content = b''.join([b'{"status": "', b'x' * body_bytes, b'"}'])
+    return Transaction(
+        client_name='Client',
+        server_name='Server',
+        request=Request(
+            body=None,
+            elapsed=index,
+            headers={},
+            method='GET',
+            url_path='/health'),
+        response=Response(
+            body=Body(content=content, encoding='utf-8'),
+            elapsed=index,
+            headers={},
+            status='200 OK'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,71 @@
+"""
+Compare scanning a capture stored as columns with walking a list of
+Transaction objects.
+
+Usage: python benchmarks/bench_columnar.py [number of transactions]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis import columnar  # noqa: E402
+from htmlvis.htmlvis import Request, Response, Transaction  # noqa: E402
+
+STATUSES = ['200 OK', '201 Created', '404 Not Found', '500 Server Error']
+
+
+def main(num_transactions=1000000):
+    transactions = []
+    stores = [('pure-python', columnar.ColumnarStore(use_numpy=False))]
+    if columnar.numpy is not None:
+        stores.append(('numpy', columnar.ColumnarStore()))
+    for index in range(num_transactions):
+        transaction = Transaction(
+            client_name='Client',
+            server_name='Server',
+            request=Request(
+                body=None,
+                elapsed=index * 0.001,
+                headers=None,
+                method='GET',
+                url_path='/items/%d' % (index % 100)),
+            response=Response(
+                body=None,
+                elapsed=index * 0.001 + (index % 7) * 0.01,
+                headers=None,
+                status=STATUSES[index % len(STATUSES)]))
+        transactions.append(transaction)
+        for _, store in stores:
+            store.append(transaction)
+
+    start = time.time()
+    slow_errors = [
+        transaction for transaction in transactions
+        if transaction.response.elapsed - transaction.request.elapsed >= 0.05
+        and int(transaction.response.status.split(' ', 1)[0]) >= 500
+    ]
+    by_status = {}
+    for transaction in transactions:
+        by_status[transaction.response.status] = by_status.get(
+            transaction.response.status, 0) + 1
+    _report(num_transactions, 'objects', time.time() - start,
+            len(slow_errors))
+
+    for name, store in stores:
+        start = time.time()
+        slow_errors = store.where(min_latency=0.05, min_status_code=500)
+        store.count_by('status')
+        _report(num_transactions, name, time.time() - start,
+                len(slow_errors))
+
+
+def _report(num_transactions, name, elapsed, num_matches):
+    print('%8d transactions  %-12s filter and count: %8.1f ms '
+          '(%d matches)' % (num_transactions, name, elapsed * 1000,
+                            num_matches))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,88 @@
+"""
+Measure note formatting on a mix of JSON, HTML, plain text and binary
+bodies, comparing the former formatters applied to every note with the
+NoteFormatter, with and without captured content types.
+
+Usage: python benchmarks/bench_formatting.py [notes] [note bytes]
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis import formatting  # noqa: E402
+from htmlvis.seqdiag_model import Category, make_message  # noqa: E402
+
+
+def main(num_notes=2000, note_bytes=4096):
+    bodies = _make_bodies(num_notes, note_bytes)
+    # Note formatters are built per repetition, as renderers do per diagram
+    strategies = [
+        ('every formatter', lambda: _every_formatter, True),
+        ('sniffed', formatting.NoteFormatter, False),
+        ('content types', formatting.NoteFormatter, True),
+    ]
+    for name, make_formatter, with_content_type in strategies:
+        elapsed = min(
+            timeit.repeat(
+                lambda: _format_all(bodies, make_formatter(),
+                                    with_content_type),
+                number=1,
+                repeat=5))
+        print('%-16s %7.2f us per note' % (name,
+                                           elapsed / len(bodies) * 1e6))
+
+
+def _every_formatter(msg):
+    formatting.prettify_json(msg)
+    formatting.shorten_long_strings(msg)
+
+
+def _format_all(bodies, format_note, with_content_type):
+    for content_type, note in bodies:
+        format_note(
+            make_message(
+                category=Category.response,
+                src='Server',
+                dst='Client',
+                text='200 OK',
+                note=note,
+                when=0.0,
+                data={
+                    'content_type':
+                    content_type if with_content_type else None
+                }))
+
+
+def _make_bodies(num_notes, note_bytes):
+    generator = random.Random(0)
+    items = note_bytes // 40
+    json_note = json.dumps(
+        [{'id': index, 'name': 'item number %d' % index}
+         for index in range(items)])
+    html_note = '<html><body>%s</body></html>' % (
+        '<p class="item">"a quoted paragraph"</p>' * items)
+    text_note = 'a line of "plain text" in a log\n' * items
+    binary_note = bytearray(
+        generator.randrange(256)
+        for _ in range(note_bytes)).decode('utf-8', 'replace')
+    kinds = [
+        ('application/json', json_note),
+        ('text/html; charset=utf-8', html_note),
+        ('text/plain', text_note),
+        ('application/octet-stream', binary_note),
+    ]
+    # Every note is distinct, so that none is served from the note cache
+    bodies = []
+    for index in range(num_notes):
+        content_type, note = generator.choice(kinds)
+        bodies.append((content_type, note.replace('item', 'item%d' % index,
+                                                  1)))
+    return bodies
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
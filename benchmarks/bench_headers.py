@@ -0,0 +1,50 @@
+"""
+Measure the cost of capturing the headers of a response, and the memory
+they take, when copied into a dict, interned in a HeaderStore and
+captured lazily.
+
+Usage: python benchmarks/bench_headers.py [captures]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+from requests.structures import CaseInsensitiveDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis.headers import HeaderStore  # noqa: E402
+
+HEADERS = CaseInsensitiveDict({
+    'Content-Type': 'application/json',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'Server': 'nginx',
+    'Strict-Transport-Security': 'max-age=31536000',
+    'Vary': 'Accept-Encoding',
+    'X-Content-Type-Options': 'nosniff',
+})
+
+
+def main(num_captures=100000):
+    strategies = [
+        ('dict copy', lambda headers: {k: v for k, v in headers.items()}),
+        ('interned', HeaderStore().capture),
+        ('lazy', HeaderStore(lazy=True).capture),
+    ]
+    for name, capture in strategies:
+        elapsed = min(
+            timeit.repeat(
+                lambda: capture(HEADERS), number=num_captures, repeat=3))
+        tracemalloc.start()
+        kept = [capture(HEADERS) for _ in range(num_captures)]
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+        print('%-10s %6.2f us per capture  %5d bytes per capture' %
+              (name, elapsed / num_captures * 1e6, memory / num_captures))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
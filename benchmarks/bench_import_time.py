@@ -0,0 +1,82 @@
+"""
+Measure how long importing htmlvis takes, with python -X importtime, and
+fail if it regresses: a bare import must stay within its budget and must
+not pull in bottle, requests, attrs, six or the rendering modules.
+
+Usage: python benchmarks/bench_import_time.py [runs]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+STATEMENTS = [
+    'import htmlvis',
+    'from htmlvis import RequestsSniffer',
+    'from htmlvis import BottleSniffer',
+    'from htmlvis import save_seq_diag',
+]
+
+# Microseconds that a bare import htmlvis may take
+BARE_IMPORT_BUDGET = 20000
+
+HEAVY_MODULES = ['bottle', 'requests', 'attr', 'six', 'json',
+                 'htmlvis.htmlvis', 'htmlvis.plantuml', 'htmlvis.paging']
+
+
+def main(runs=5):
+    if sys.version_info < (3, 7):
+        print('htmlvis is only imported lazily on Python 3.7+')
+        return
+    failures = []
+    for statement in STATEMENTS:
+        timings = sorted(_import_time(statement) for _ in range(runs))
+        median = timings[len(timings) // 2]
+        print('%-38s %8.1f ms' % (statement, median / 1000.0))
+        if statement == 'import htmlvis' and median > BARE_IMPORT_BUDGET:
+            failures.append('import htmlvis took %d us' % median)
+    imported = _imported_modules('import htmlvis')
+    for name in HEAVY_MODULES:
+        if name in imported:
+            failures.append('import htmlvis imported %s' % name)
+    for failure in failures:
+        print('REGRESSION: %s' % failure)
+    if failures:
+        sys.exit(1)
+
+
+def _import_time(statement):
+    """Microseconds spent in a fresh interpreter importing the htmlvis
+    modules that the statement imports directly, and their dependencies
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True)
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented below the one that triggered them
+        name = name[1:]
+        if name.startswith('htmlvis'):
+            total += int(cumulative)
+    return total
+
+
+def _imported_modules(statement):
+    output = subprocess.check_output(
+        [
+            sys.executable, '-c',
+            '%s; import sys; print("\\n".join(sys.modules))' % statement
+        ],
+        cwd=ROOT,
+        universal_newlines=True)
+    return set(output.split())
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,67 @@
+"""
+Measure the formatting of 1 MB JSON notes, comparing the former
+prettify_json and shorten_long_strings passes with the single-pass
+JSONFormatter, with and without a note budget.
+
+Usage: python benchmarks/bench_json_formatting.py [note bytes] [budget]
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis import formatting  # noqa: E402
+from htmlvis.seqdiag_model import Category, make_message  # noqa: E402
+
+
+def main(note_bytes=1024 * 1024, budget=64 * 1024):
+    note = _make_note(note_bytes)
+    strategies = [
+        ('three passes', _three_passes),
+        ('single pass', formatting.JSONFormatter()),
+        ('with budget', formatting.JSONFormatter(max_chars=budget)),
+    ]
+    for name, format_note in strategies:
+        elapsed = min(
+            timeit.repeat(lambda: format_note(note), number=1, repeat=5))
+        print('%-13s %8.1f ms per note, %8d chars' %
+              (name, elapsed * 1e3, len(format_note(note))))
+
+
+def _three_passes(note):
+    msg = make_message(
+        category=Category.response,
+        src='Server',
+        dst='Client',
+        text='200 OK',
+        note=note,
+        when=0.0,
+        data=None)
+    formatting.prettify_json(msg)
+    formatting.shorten_long_strings(msg)
+    return msg.note
+
+
+def _make_note(note_bytes):
+    generator = random.Random(0)
+    items = []
+    size = 0
+    while size < note_bytes:
+        item = {
+            'id': len(items),
+            'name': 'user %d' % generator.randrange(10**6),
+            'description': 'a fairly long description of this item ' * 3,
+            'score': generator.random(),
+            'active': generator.random() < 0.5,
+            'tags': ['tag-%d' % generator.randrange(50) for _ in range(3)],
+        }
+        items.append(item)
+        size += len(json.dumps(item))
+    return json.dumps({'items': items, 'count': len(items)})
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
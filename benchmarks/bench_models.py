@@ -0,0 +1,89 @@
+"""
+Measure the memory taken by captured transactions and the cost of
+building sequence diagram messages, comparing the slotted models with
+equivalent models that keep a per-instance __dict__.
+
+Usage: python benchmarks/bench_models.py [number of transactions]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+import attr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis import htmlvis, seqdiag_model  # noqa: E402
+from htmlvis.htmlvis import Request, Response, Transaction  # noqa: E402
+
+DictRequest = attr.make_class(
+    'DictRequest', ['body', 'elapsed', 'headers', 'method', 'url_path'])
+DictResponse = attr.make_class('DictResponse',
+                               ['body', 'elapsed', 'headers', 'status'])
+DictTransaction = attr.make_class(
+    'DictTransaction', ['client_name', 'request', 'response', 'server_name'])
+
+
+def main(num_transactions=100000):
+    dict_based = _bytes_per_transaction(num_transactions, DictTransaction,
+                                        DictRequest, DictResponse, str)
+    slotted = _bytes_per_transaction(num_transactions, Transaction, Request,
+                                     Response, htmlvis.intern_text)
+    print('memory per transaction  dict-based: %5d bytes  slotted and '
+          'interned: %5d bytes' % (dict_based, slotted))
+
+    category = seqdiag_model.Category.request
+    validated = min(
+        timeit.repeat(
+            lambda: seqdiag_model.Message(
+                category=category,
+                src='Client',
+                dst='Server',
+                text='GET /items',
+                note='',
+                when=0.0,
+                data={}),
+            number=100000))
+    unchecked = min(
+        timeit.repeat(
+            lambda: seqdiag_model.make_message(
+                category=category,
+                src='Client',
+                dst='Server',
+                text='GET /items',
+                note='',
+                when=0.0,
+                data={}),
+            number=100000))
+    print('message construction  Message: %5.2f us  make_message: %5.2f us' %
+          (10 * validated, 10 * unchecked))
+
+
+def _bytes_per_transaction(num_transactions, transaction_cls, request_cls,
+                           response_cls, intern_text):
+    tracemalloc.start()
+    transactions = []
+    for index in range(num_transactions):
+        transactions.append(
+            transaction_cls(
+                client_name='Client',
+                server_name='Server',
+                request=request_cls(
+                    body=None,
+                    elapsed=index * 0.001,
+                    headers=None,
+                    method=intern_text('get'.upper()),
+                    url_path='/items'),
+                response=response_cls(
+                    body=None,
+                    elapsed=index * 0.001 + 0.0005,
+                    headers=None,
+                    status=intern_text(' '.join(['200', 'OK'])))))
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used // num_transactions
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
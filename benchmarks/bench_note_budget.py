@@ -0,0 +1,57 @@
+"""
+Measure the rendering of a diagram with a single JSON note of growing
+size, without a note budget and with the default NoteBudget.
+
+Usage: python benchmarks/bench_note_budget.py [largest note bytes]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis import formatting, plantuml  # noqa: E402
+from htmlvis.seqdiag_model import Category, make_message  # noqa: E402
+
+
+def main(max_note_bytes=16 * 1024 * 1024):
+    budgets = [
+        ('no budget', formatting.NoteBudget(max_bytes=None, max_lines=None)),
+        ('default budget', formatting.DEFAULT_BUDGET),
+    ]
+    note_bytes = 64 * 1024
+    while note_bytes <= max_note_bytes:
+        note = _make_note(note_bytes)
+        for name, budget in budgets:
+            elapsed = min(
+                timeit.repeat(
+                    lambda: _render(note, budget), number=1, repeat=3))
+            print('%8d KiB note, %-15s %8.1f ms' % (note_bytes // 1024, name,
+                                                    elapsed * 1e3))
+        note_bytes *= 4
+
+
+def _render(note, budget):
+    msg = make_message(
+        category=Category.response,
+        src='Server',
+        dst='Client',
+        text='200 OK',
+        note=note,
+        when=0.0,
+        data={'content_type': 'application/json'})
+    for _ in plantuml._generate_textual_representation(
+            [msg], note_formatter=formatting.NoteFormatter(budget=budget)):
+        pass
+
+
+def _make_note(note_bytes):
+    item = {'id': 0, 'name': 'a name that is rather long', 'tags': ['a', 'b']}
+    count = note_bytes // len(json.dumps(item))
+    return json.dumps({'items': [dict(item, id=index)
+                                 for index in range(count)]})
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,76 @@
+"""
+Measure the rendering of diagrams whose notes repeat a few distinct JSON
+payloads, as polling clients produce, without a note cache, with the one
+every diagram builds, and with a NoteCache kept across diagrams.
+
+Usage: python benchmarks/bench_note_cache.py [notes] [distinct] [diagrams]
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis import formatting, plantuml  # noqa: E402
+from htmlvis.seqdiag_model import Category, make_message  # noqa: E402
+
+
+class _NoCache(formatting.NoteCache):
+    def format(self, formatter, note):
+        return formatter(note)
+
+
+def main(num_notes=2000, num_distinct=20, num_diagrams=5):
+    payloads = _make_payloads(num_distinct)
+    generator = random.Random(0)
+    notes = [generator.choice(payloads) for _ in range(num_notes)]
+    shared = formatting.NoteCache()
+    strategies = [
+        ('no cache', _NoCache),
+        ('per diagram', lambda: None),
+        ('across diagrams', lambda: shared),
+    ]
+    for name, make_cache in strategies:
+        elapsed = min(
+            timeit.repeat(
+                lambda: [_render(notes, make_cache())
+                         for _ in range(num_diagrams)],
+                number=1,
+                repeat=3))
+        print('%-16s %7.2f ms per diagram' % (name,
+                                              elapsed / num_diagrams * 1e3))
+    print('shared cache: %d hits, %d misses, %d bytes' %
+          (shared.hits, shared.misses, shared.cached_bytes))
+
+
+def _render(notes, note_cache):
+    messages = (make_message(
+        category=Category.response,
+        src='Server',
+        dst='Client',
+        text='200 OK',
+        note=note,
+        when=float(index),
+        data={'content_type': 'application/json'})
+                for index, note in enumerate(notes))
+    for _ in plantuml._generate_textual_representation(
+            messages,
+            note_formatter=formatting.NoteFormatter(cache=note_cache)):
+        pass
+
+
+def _make_payloads(num_distinct):
+    return [
+        json.dumps({
+            'status': 'running',
+            'progress': index,
+            'items': [{'id': item, 'name': 'item number %d' % item}
+                      for item in range(100)],
+        }) for index in range(num_distinct)
+    ]
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,38 @@
+"""
+Compare rendering a paged capture in one process with rendering it across
+a pool of worker processes.
+
+Usage: python benchmarks/bench_paging.py [number of messages [page size]]
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_plantuml import _make_messages  # noqa: E402
+from htmlvis import paging  # noqa: E402
+
+
+def main(num_messages=200000, page_size=5000):
+    directory = tempfile.mkdtemp()
+    try:
+        for workers in [None] + sorted({2, multiprocessing.cpu_count()}):
+            messages = _make_messages(num_messages)
+            start = time.time()
+            paging.save_pages(
+                os.path.join(directory, 'diagram.html'),
+                paging.paginate(messages, max_messages=page_size),
+                workers=workers)
+            print('%7d messages, %5d per page, workers: %4s  %7.3f s' %
+                  (num_messages, page_size, workers, time.time() - start))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,62 @@
+"""
+Measure how PlantUML diagram generation scales with the number of messages.
+
+The time per message should stay flat as the number of messages grows.
+
+Usage: python benchmarks/bench_plantuml.py [number of messages ...]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis import plantuml, seqdiag_model  # noqa: E402
+
+DEFAULT_NUM_MESSAGES = [1000, 10000, 100000]
+
+
+def main(all_num_messages):
+    for num_messages in all_num_messages:
+        messages = _make_messages(num_messages)
+        start = time.time()
+        text_len = sum(
+            len(chunk)
+            for chunk in plantuml._generate_textual_representation(messages))
+        text_time = time.time() - start
+
+        messages = _make_messages(num_messages)
+        start = time.time()
+        html_len = len(plantuml.html_image(messages))
+        html_time = time.time() - start
+        print('%7d messages  text: %7.3f s (%5.2f us/msg, %6d KiB)  '
+              'html_image: %7.3f s (%5.2f us/msg, %6d KiB)' %
+              (num_messages, text_time, 1e6 * text_time / num_messages,
+               text_len // 1024, html_time, 1e6 * html_time / num_messages,
+               html_len // 1024))
+
+
+def _make_messages(num_messages):
+    messages = []
+    for index in range(num_messages):
+        if index % 2 == 0:
+            category = seqdiag_model.Category.request
+            src, dst, text = 'Client', 'Server', 'GET /items/%d' % index
+        else:
+            category = seqdiag_model.Category.response
+            src, dst, text = 'Server', 'Client', '200 OK'
+        note = json.dumps({'id': index, 'name': 'item number %d' % index})
+        messages.append(
+            seqdiag_model.Message(
+                category=category,
+                src=src,
+                dst=dst,
+                text=text,
+                note=note,
+                when=index * 0.001))
+    return messages
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_NUM_MESSAGES)
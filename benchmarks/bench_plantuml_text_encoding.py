@@ -0,0 +1,72 @@
+"""
+Compare the throughput of the base64-based PlantUML text encoder with the
+reference byte-by-byte implementation, and the peak memory of encoding a
+whole diagram at once with encoding it incrementally.
+
+Usage: python benchmarks/bench_plantuml_text_encoding.py [size in KiB ...]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis import plantuml_text_encoding  # noqa: E402
+
+DEFAULT_SIZES_KIB = [64, 1024, 4096]
+
+
+def main(sizes_kib):
+    for size_kib in sizes_kib:
+        data = os.urandom(size_kib * 1024)
+        reference_data = bytearray(data)
+        fast = _throughput(
+            lambda: plantuml_text_encoding._encode_with_base64(data),
+            len(data))
+        reference = _throughput(
+            lambda: plantuml_text_encoding._encode_similar_to_base64(
+                reference_data),
+            len(data))
+        print('%6d KiB  base64: %9.1f MiB/s  reference: %7.2f MiB/s  '
+              'speedup: %6.0fx' % (size_kib, fast, reference,
+                                   fast / reference))
+    for size_kib in sizes_kib:
+        _compare_peak_memory(size_kib)
+
+
+def _compare_peak_memory(size_kib):
+    line = 'Alice -> Bob: %s\n' % os.urandom(24).hex()
+    num_lines = size_kib * 1024 // len(line)
+
+    def chunks():
+        for _ in range(num_lines):
+            yield line
+
+    whole = _peak_memory(
+        lambda: plantuml_text_encoding.encode(''.join(chunks())))
+    incremental = _peak_memory(
+        lambda: sum(len(piece) for piece in
+                    plantuml_text_encoding.iterencode(chunks())))
+    print('%6d KiB  peak memory  encode: %8.1f KiB  iterencode: %8.1f KiB' %
+          (size_kib, whole / 1024.0, incremental / 1024.0))
+
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _throughput(func, num_bytes):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=3, number=number)) / number
+    return num_bytes / best / (1024 * 1024)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES_KIB)
@@ -0,0 +1,58 @@
+"""
+Measure the latency that the RequestsSniffer hook adds to every response,
+when transactions are built in the calling thread and when they are
+handed over to a BackgroundRecorder.
+
+Usage: python benchmarks/bench_recorder.py [responses]
+"""
+import datetime
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis.recorder import BackgroundRecorder  # noqa: E402
+from htmlvis.requests_sniffer import RequestsSniffer  # noqa: E402
+
+
+def main(num_responses=20000):
+    response = _make_response()
+    for recorder in (None, BackgroundRecorder(max_pending=num_responses)):
+        sniffer = RequestsSniffer('Client', 'Server', recorder=recorder)
+        begin = time.time()
+        for _ in range(num_responses):
+            sniffer(response)
+        hook_elapsed = time.time() - begin
+        sniffer.flush()
+        total_elapsed = time.time() - begin
+        assert len(sniffer.transactions) == num_responses
+        print('%-10s %6.2f us per hook call, %6.2f us per transaction' %
+              ('background' if recorder else 'inline',
+               hook_elapsed / num_responses * 1e6,
+               total_elapsed / num_responses * 1e6))
+        if recorder:
+            recorder.close()
+
+
+def _make_response():
+    request = requests.Request(
+        'POST',
+        'http://example.com/api/1/items?page=2',
+        headers={'Accept': 'application/json'},
+        json={'name': 'item'}).prepare()
+    response = requests.Response()
+    response.request = request
+    response.status_code = 201
+    response.reason = 'Created'
+    response.headers['Content-Type'] = 'application/json'
+    response.encoding = 'utf-8'
+    response._content = b'{"id": 1, "name": "item"}'
+    response.elapsed = datetime.timedelta(milliseconds=5)
+    return response
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
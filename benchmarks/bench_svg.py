@@ -0,0 +1,31 @@
+"""
+Measure how the local SVG backend scales with the number of messages.
+
+Usage: python benchmarks/bench_svg.py [number of messages ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_plantuml import _make_messages  # noqa: E402
+from htmlvis import svg  # noqa: E402
+
+DEFAULT_NUM_MESSAGES = [1000, 10000, 50000]
+
+
+def main(all_num_messages):
+    for num_messages in all_num_messages:
+        messages = _make_messages(num_messages)
+        start = time.time()
+        svg_len = len(svg.html_image(messages))
+        elapsed = time.time() - start
+        print('%7d messages  svg: %7.3f s (%5.2f us/msg, %7d KiB)' %
+              (num_messages, elapsed, 1e6 * elapsed / num_messages,
+               svg_len // 1024))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_NUM_MESSAGES)
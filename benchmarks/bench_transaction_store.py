@@ -0,0 +1,66 @@
+"""
+Measure capture throughput when many threads record transactions at once,
+with the shared ListStore and with the PerThreadStore.
+
+Usage: python benchmarks/bench_transaction_store.py [transactions per thread]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis.htmlvis import Request, Response, Transaction  # noqa: E402
+from htmlvis.requests_sniffer import RequestsSniffer  # noqa: E402
+from htmlvis.transaction_store import ListStore  # noqa: E402
+from htmlvis.transaction_store import PerThreadStore  # noqa: E402
+
+THREAD_COUNTS = [1, 8, 64]
+
+
+def main(per_thread=20000):
+    for num_threads in THREAD_COUNTS:
+        for store_cls in (ListStore, PerThreadStore):
+            sniffer = RequestsSniffer('Client', 'Server', store=store_cls())
+            elapsed = _capture(sniffer, num_threads, per_thread)
+            total = num_threads * per_thread
+            assert len(sniffer.snapshot_and_reset()) == total
+            print('%3d threads  %-15s %9.0f transactions/s' %
+                  (num_threads, store_cls.__name__, total / elapsed))
+
+
+def _capture(sniffer, num_threads, per_thread):
+    start = threading.Event()
+
+    def capture():
+        start.wait()
+        for index in range(per_thread):
+            sniffer._record(
+                Transaction(
+                    client_name='Client',
+                    server_name='Server',
+                    request=Request(
+                        body=None,
+                        elapsed=time.time(),
+                        headers=None,
+                        method='GET',
+                        url_path='/'),
+                    response=Response(
+                        body=None,
+                        elapsed=time.time(),
+                        headers=None,
+                        status='200 OK')))
+
+    threads = [threading.Thread(target=capture) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    begin = time.time()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return time.time() - begin
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
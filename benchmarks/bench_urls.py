@@ -0,0 +1,56 @@
+"""
+Measure URL splitting on a workload of 10k distinct URLs over 200 hosts,
+comparing the former regular expression per URL with the URLParser, with
+and without route rules.
+
+Usage: python benchmarks/bench_urls.py [distinct URLs] [hosts]
+"""
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from htmlvis.urls import ID_RULES, URLParser  # noqa: E402
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+
+def main(num_urls=10000, num_hosts=200):
+    urls = _make_urls(num_urls, num_hosts)
+    strategies = [
+        ('regex per URL', _regex_url_path),
+        ('URLParser', URLParser().parse),
+        ('with routes', URLParser(route_rules=ID_RULES).parse),
+    ]
+    for name, parse in strategies:
+        elapsed = min(
+            timeit.repeat(
+                lambda: [parse(url) for url in urls], number=1, repeat=5))
+        print('%-14s %6.2f us per URL' % (name, elapsed / len(urls) * 1e6))
+
+
+def _regex_url_path(url):
+    url_host = urlsplit(url).netloc
+    return re.sub('.*' + url_host, '', url)
+
+
+def _make_urls(num_urls, num_hosts):
+    generator = random.Random(0)
+    urls = set()
+    while len(urls) < num_urls:
+        urls.add('https://service-%d.example.com/api/v1/users/%d/orders/%d'
+                 '?page=%d' % (generator.randrange(num_hosts),
+                               generator.randrange(100000),
+                               generator.randrange(1000),
+                               generator.randrange(10)))
+    return sorted(urls, key=lambda _: generator.random())
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -4,15 +4,48 @@ __author__ = """Damian Quiroga"""
 __email__ = 'qdamian@gmail.com'
 __version__ = '0.1.0'
 
+import importlib
 import sys
 
-# flake8: noqa: F401 imported but unused
-from .htmlvis import save_seq_diag
-from .requests_sniffer import RequestsSniffer
-from .bottle_sniffer import BottleSniffer
+# Public names and the modules that define them, which are only imported
+# the first time one of their names is used (PEP 562)
+_LAZY_ATTRIBUTES = {
+    'save_seq_diag': 'htmlvis',
+    'transaction_to_dict': 'htmlvis',
+    'RequestsSniffer': 'requests_sniffer',
+    'BottleSniffer': 'bottle_sniffer',
+}
+_LAZY_SUBMODULES = ()
 
 if hasattr(sys, '_called_from_test'):
-    from .htmlvis import HTTPSniffer, Transaction, Request, Response
-    from .htmlvis import seqdiag
-    from .htmlvis import seqdiag_model
-    from . import plantuml_text_encoding
+    _LAZY_ATTRIBUTES.update({
+        'HTTPSniffer': 'htmlvis',
+        'Transaction': 'htmlvis',
+        'Request': 'htmlvis',
+        'Response': 'htmlvis',
+    })
+    _LAZY_SUBMODULES = ('seqdiag', 'seqdiag_model', 'plantuml_text_encoding')
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError('module %r has no attribute %r' %
+                             (__name__, name))
+    value = getattr(importlib.import_module('.' + module_name, __name__),
+                    name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(
+        set(globals()) | set(_LAZY_ATTRIBUTES) | set(_LAZY_SUBMODULES))
+
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ is ignored before Python 3.7, import everything
+    for _name in list(_LAZY_ATTRIBUTES) + list(_LAZY_SUBMODULES):
+        globals()[_name] = __getattr__(_name)
@@ -0,0 +1,349 @@
+"""
+Captured HTTP bodies, kept as raw bytes and only decoded when rendered
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from attr import Factory, attrib, attrs
+from six import binary_type, string_types
+
+_CHUNK_BYTES = 64 * 1024
+
+
+@attrs(slots=True)
+class Body(object):
+    """The raw content of a body and its declared encoding, if any.
+
+    If a limit is given, at most that many bytes are kept and the body is
+    marked as truncated when there was more. The size counts every byte of
+    the body, kept or not, and the digest is the hex digest of all of them
+    once a tee has seen the whole body.
+    """
+    # The content, or the chunks kept since it was last read, which are
+    # only joined then so that keeping a long stream takes linear time
+    _content = attrib(default=b'')
+    encoding = attrib(default=None)
+    limit = attrib(default=None)
+    truncated = attrib(default=False)
+    size = attrib(
+        default=Factory(lambda self: len(self.content), takes_self=True))
+    digest = attrib(default=None)
+
+    @property
+    def content(self):
+        if isinstance(self._content, list):
+            self._content = b''.join(self._content)
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+
+    @property
+    def text(self):
+        """The content decoded with the declared encoding, or UTF-8.
+        Undecodable bytes are replaced rather than guessing the charset.
+        """
+        return _decode(self.content, self.encoding)
+
+    def keep(self, chunk):
+        "Append a chunk of content, up to the limit"
+        # Every byte seen is kept until the body is truncated
+        kept = self.size
+        self.size += len(chunk)
+        if self.truncated:
+            return
+        if self.limit is not None and kept + len(chunk) > self.limit:
+            self.truncated = True
+            chunk = chunk[:max(self.limit - kept, 0)]
+        if chunk:
+            if not isinstance(self._content, list):
+                self._content = [self._content]
+            self._content.append(chunk)
+
+
+@attrs(slots=True)
+class SpooledBody(object):
+    """A body whose content was kept in a temporary file at path, which is
+    closed once written and removed along with the body. It is pickled as
+    a plain Body.
+    """
+    path = attrib()
+    kept = attrib(default=0)
+    encoding = attrib(default=None)
+    truncated = attrib(default=False)
+    size = attrib(default=0)
+    digest = attrib(default=None)
+
+    @property
+    def content(self):
+        "The kept bytes, read back from the file"
+        with open(self.path, 'rb') as spooled:
+            return spooled.read()
+
+    @property
+    def text(self):
+        return _decode(self.content, self.encoding)
+
+    def __reduce__(self):
+        return (Body, (self.content, self.encoding, None, self.truncated,
+                       self.size, self.digest))
+
+    def __del__(self):
+        try:
+            os.remove(self.path)
+        except (AttributeError, OSError):
+            pass
+
+
+def spool(stream,
+          limit=None,
+          spool_bytes=64 * 1024,
+          digest=None,
+          encoding=None):
+    """Copy a file-like body in chunks, so that large bodies never sit in
+    memory at once. At most limit bytes are kept: in a Body up to
+    spool_bytes, or in a SpooledBody beyond that, without keeping its file
+    open. The rest of the body is only read, to count and digest it, if a
+    digest is wanted.
+    """
+    kept = []
+    kept_bytes = 0
+    size = 0
+    truncated = False
+    spooled = None
+    hasher = hashlib.new(digest) if digest else None
+    try:
+        while True:
+            chunk = stream.read(_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            if limit is not None and kept_bytes + len(chunk) > limit:
+                chunk = chunk[:limit - kept_bytes]
+                truncated = True
+            if chunk:
+                kept.append(chunk)
+                kept_bytes += len(chunk)
+                if spooled is None and kept_bytes > spool_bytes:
+                    spooled = tempfile.NamedTemporaryFile(
+                        prefix='htmlvis-', suffix='.body', delete=False)
+                if spooled is not None:
+                    spooled.write(b''.join(kept))
+                    kept = []
+            elif hasher is None:
+                break
+    except Exception:
+        if spooled is not None:
+            spooled.close()
+            os.remove(spooled.name)
+        raise
+    finally:
+        if spooled is not None:
+            spooled.close()
+    body_digest = hasher.hexdigest() if hasher is not None else None
+    if spooled is None:
+        return Body(
+            content=b''.join(kept),
+            encoding=encoding,
+            truncated=truncated,
+            size=size,
+            digest=body_digest)
+    return SpooledBody(
+        path=spooled.name,
+        kept=kept_bytes,
+        encoding=encoding,
+        truncated=truncated,
+        size=size,
+        digest=body_digest)
+
+
+class _Tee(object):
+    "Keep the chunks of a body that pass through, and their digest"
+
+    def __init__(self, body, digest=None):
+        self.body = body
+        self._hash = hashlib.new(digest) if digest else None
+
+    def _keep(self, chunk):
+        if not chunk:
+            return
+        if not isinstance(chunk, binary_type):
+            chunk = chunk.encode(self.body.encoding or 'utf-8')
+        self.body.keep(chunk)
+        if self._hash is not None:
+            self._hash.update(chunk)
+
+    def _finish(self):
+        # Join the kept chunks once they are all there
+        self.body.content
+        if self._hash is not None:
+            self.body.digest = self._hash.hexdigest()
+
+
+class TeeReader(_Tee):
+    """Wrap a file-like raw stream, such as the urllib3 response behind a
+    requests Response, so that the bytes the application reads are also
+    kept in a Body. Everything else is delegated to the wrapped stream.
+
+    Servers that send files with sendfile() bypass read(), in which case
+    nothing is kept.
+    """
+
+    def __init__(self, raw, body, digest=None):
+        super(TeeReader, self).__init__(body, digest)
+        self._raw = raw
+
+    def read(self, *args, **kwargs):
+        data = self._raw.read(*args, **kwargs)
+        if data:
+            self._keep(data)
+        else:
+            self._finish()
+        return data
+
+    def stream(self, *args, **kwargs):
+        for chunk in self._raw.stream(*args, **kwargs):
+            self._keep(chunk)
+            yield chunk
+        self._finish()
+
+    def close(self):
+        self._finish()
+        close = getattr(self._raw, 'close', None)
+        if close is not None:
+            close()
+
+    def __iter__(self):
+        for chunk in self._raw:
+            self._keep(chunk)
+            yield chunk
+        self._finish()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class TeeIterable(_Tee):
+    """Wrap the iterable of chunks of a response body, such as a generator
+    returned by a WSGI handler, so that the chunks are also kept in a Body
+    as they are sent. Text chunks are kept encoded with the body encoding.
+    """
+
+    def __init__(self, iterable, body, digest=None):
+        super(TeeIterable, self).__init__(body, digest)
+        self._iterable = iterable
+
+    def __iter__(self):
+        for chunk in self._iterable:
+            self._keep(chunk)
+            yield chunk
+        self._finish()
+
+    def close(self):
+        self._finish()
+        close = getattr(self._iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+class BodyStore(object):
+    """Share identical bodies across transactions, so that memory grows
+    with the number of distinct payloads rather than with the number of
+    requests.
+
+    Bodies are looked up by their content, through its hash, which Python
+    computes once per string and caches. Each payload is reference
+    counted. Payloads that no transaction references any more are kept for
+    future duplicates, and the least recently used of them are forgotten
+    once all the unique payloads add up to more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.unique_bytes = 0
+        self._lock = threading.Lock()
+        # content -> [shared content, references]
+        self._entries = {}
+        # Unreferenced contents, least recently used first
+        self._unreferenced = OrderedDict()
+
+    def add(self, content):
+        """Return the shared copy of content, and count a reference to it.
+        Anything other than a non-empty string is returned as it is.
+        """
+        if not content or not isinstance(content,
+                                         (string_types, binary_type)):
+            return content
+        with self._lock:
+            entry = self._entries.get(content)
+            if entry is None:
+                entry = self._entries[content] = [content, 0]
+                self.unique_bytes += len(content)
+            elif not entry[1]:
+                del self._unreferenced[content]
+            entry[1] += 1
+            self._evict()
+            return entry[0]
+
+    def release(self, content):
+        "Drop a reference to a shared content returned by add"
+        if not content or not isinstance(content,
+                                         (string_types, binary_type)):
+            return
+        with self._lock:
+            entry = self._entries.get(content)
+            if entry is None or entry[0] is not content or not entry[1]:
+                return
+            entry[1] -= 1
+            if not entry[1]:
+                self._unreferenced[content] = None
+                self._evict()
+
+    def references(self, content):
+        "The number of references to a content"
+        entry = self._entries.get(content)
+        return entry[1] if entry else 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self.unique_bytes > self.max_bytes and self._unreferenced:
+            content, _ = self._unreferenced.popitem(last=False)
+            del self._entries[content]
+            self.unique_bytes -= len(content)
+
+
+def as_text(body):
+    """Turn a captured body into the text of a diagram note"""
+    if isinstance(body, (Body, SpooledBody)):
+        return body.text
+    if isinstance(body, binary_type):
+        return body.decode('utf-8', 'replace')
+    return body
+
+
+def body_size(body):
+    """The number of bytes or characters captured for a body"""
+    if isinstance(body, Body):
+        return len(body.content)
+    if isinstance(body, SpooledBody):
+        return body.kept
+    if isinstance(body, (string_types, binary_type)):
+        return len(body)
+    return 0
+
+
+def _decode(content, encoding):
+    try:
+        return content.decode(encoding or 'utf-8', 'replace')
+    except LookupError:
+        return content.decode('utf-8', 'replace')
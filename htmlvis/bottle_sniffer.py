@@ -5,8 +5,14 @@ See https://bottlepy.org/docs/dev/plugindev.html
 import time
 
 import bottle
+from six import binary_type, string_types
 
-from .htmlvis import HTTPSniffer, Request, Response, Transaction
+from .body import Body, TeeIterable, TeeReader, spool
+from .htmlvis import (HTTPSniffer, Request, Response, Transaction,
+                      intern_text)
+
+# Responses that Bottle sends in one go, which are captured as they are
+_BUFFERED_TYPES = string_types + (binary_type, list, tuple, dict)
 
 
 class BottleSniffer(HTTPSniffer):
@@ -14,17 +20,45 @@ class BottleSniffer(HTTPSniffer):
     A Bottle plugin than can be installed in a Bottle application to capture
     HTTP transactions.
     See https://bottlepy.org/docs/dev/api.html#bottle.Bottle.install
+
+    Generators, files and other streamed responses are captured as they are
+    sent to the client, without buffering them: up to stream_body_bytes of
+    them are kept, along with their size and their body_digest hash.
+
+    Up to request_body_bytes of request bodies are kept (all by default),
+    in a closed temporary file beyond spool_bytes, so that uploads are not
+    held in memory twice.
+
+    See HTTPSniffer for the include and exclude capture rules, which are
+    checked once the handler has returned and before anything is copied.
     """
     api = 2
 
-    def __init__(self):
-        super(BottleSniffer, self).__init__()
-        self._transactions = []
+    def __init__(self,
+                 store=None,
+                 recorder=None,
+                 stream_body_bytes=1024,
+                 body_digest='sha256',
+                 request_body_bytes=None,
+                 spool_bytes=64 * 1024,
+                 headers=None,
+                 include=(),
+                 exclude=()):
+        super(BottleSniffer, self).__init__(
+            store=store,
+            recorder=recorder,
+            headers=headers,
+            include=include,
+            exclude=exclude)
         self.start_time = time.time()
+        self._stream_body_bytes = stream_body_bytes
+        self._body_digest = body_digest
+        self._request_body_bytes = request_body_bytes
+        self._spool_bytes = spool_bytes
 
     @property
     def transactions(self):
-        return self._transactions
+        return self._store
 
     def apply(self, callback, context):
         """
@@ -33,43 +67,104 @@ class BottleSniffer(HTTPSniffer):
         """
 
         def decorator(*args, **kwargs):
-            response_status = '500 Internal Server Error'
-            handler_response = ''
+            request_elapsed_time = time.time() - self.start_time
             try:
-                request = self._gather_request_info(context)
                 handler_response = callback(*args, **kwargs)
-                response_status = bottle.response.status
-                return handler_response
             except bottle.HTTPResponse as http_error:
-                response_status = http_error.status
+                self._sniff(context, request_elapsed_time, http_error,
+                            http_error.status_code, http_error.status)
+                raise
+            except Exception:
+                self._sniff(context, request_elapsed_time, '', 500,
+                            '500 Internal Server Error')
                 raise
-            finally:
-                response = self._gather_response_info(
-                    context, handler_response, response_status)
-                transaction = Transaction(
-                    client_name='client name',
-                    request=request,
-                    response=response,
-                    server_name='server name')
-                self.transactions.append(transaction)
+            return self._sniff(context, request_elapsed_time,
+                               handler_response, bottle.response.status_code,
+                               bottle.response.status)
 
         return decorator
 
-    def _gather_request_info(self, context):
-        elapsed_time = time.time() - self.start_time
-        headers = {key: val for key, val in bottle.request.headers.items()}
-        return Request(
-            body=bottle.request.body.read(),
-            elapsed=elapsed_time,
-            headers=headers,
-            method=context.method,
-            url_path=bottle.request.path)
+    def _sniff(self, context, request_elapsed_time, handler_response,
+               status_code, status):
+        """Capture a transaction, unless the capture rules exclude it,
+        and return the handler response to send, which may be wrapped
+        """
+        if self._filter is not None and not self._filter.captures(
+                context.method, status_code,
+                bottle.request.environ.get('HTTP_HOST', ''),
+                bottle.request.path):
+            return handler_response
+        handler_response = self._tee(handler_response)
+        request = self._gather_request_info(context, request_elapsed_time)
+        response = self._gather_response_info(context, handler_response,
+                                              status)
+        self._capture(self._build_transaction, request, response)
+        return handler_response
+
+    def _gather_request_info(self, context, elapsed_time):
+        # Headers are copied here, as Bottle keeps changing the live ones
+        # while _build_transaction may run in a background recorder
+        body = spool(
+            bottle.request.body,
+            limit=self._request_body_bytes,
+            spool_bytes=self._spool_bytes,
+            digest=self._body_digest)
+        return (body if body.size else b'',
+                elapsed_time,
+                tuple(bottle.request.headers.items()),
+                context.method,
+                bottle.request.path,
+                context.rule)
+
+    def _tee(self, handler_response, charset=None):
+        "Wrap streamed bodies so that they are captured as they are sent"
+        if isinstance(handler_response, bottle.HTTPResponse):
+            handler_response.body = self._tee(handler_response.body,
+                                              handler_response.charset)
+            return handler_response
+        if handler_response is None or isinstance(handler_response,
+                                                  _BUFFERED_TYPES):
+            return handler_response
+        body = Body(
+            encoding=charset or bottle.response.charset,
+            limit=self._stream_body_bytes)
+        if hasattr(handler_response, 'read'):
+            return TeeReader(handler_response, body, self._body_digest)
+        if hasattr(handler_response, '__iter__'):
+            return TeeIterable(handler_response, body, self._body_digest)
+        return handler_response
 
     def _gather_response_info(self, context, handler_response, status):
-        elapsed_time = time.time() - self.start_time
-        headers = {key: val for key, val in bottle.response.headers.items()}
-        return Response(
-            body=handler_response,
+        return (_captured_body(handler_response),
+                time.time() - self.start_time,
+                tuple(bottle.response.headers.items()),
+                status)
+
+    def _build_transaction(self, request, response):
+        body, elapsed_time, headers, method, url_path, route = request
+        request = Request(
+            body=body,
             elapsed=elapsed_time,
-            headers=headers,
-            status=status)
+            headers=self._headers.capture(headers),
+            method=intern_text(method),
+            url_path=url_path,
+            route=route)
+        body, elapsed_time, headers, status = response
+        response = Response(
+            body=body,
+            elapsed=elapsed_time,
+            headers=self._headers.capture(headers),
+            status=intern_text(status))
+        return Transaction(
+            client_name='client name',
+            request=request,
+            response=response,
+            server_name='server name')
+
+
+def _captured_body(handler_response):
+    if isinstance(handler_response, bottle.HTTPResponse):
+        return _captured_body(handler_response.body)
+    if isinstance(handler_response, (TeeReader, TeeIterable)):
+        return handler_response.body
+    return handler_response
@@ -0,0 +1,222 @@
+"""
+Append-only, on-disk log of captured transactions.
+
+A capture log is a directory of segments. Each segment is a pair of files:
+a .log file with the pickled transactions one after the other, and an .idx
+file with a fixed-size entry per transaction holding its offset and length
+in the .log file plus its request and response elapsed times. Entries are
+only written once the transaction they point to is fully written, so a
+reader never sees partial transactions, even while the log is growing.
+"""
+import mmap
+import os
+import pickle
+import re
+import struct
+import threading
+from contextlib import closing
+
+from .htmlvis import HTTPSniffer
+from .transaction_store import TransactionStore
+
+INDEX_ENTRY = struct.Struct('<QQdd')
+SEGMENT_NAME = 'segment-%06d'
+SEGMENT_RE = re.compile(r'^segment-(\d{6})\.idx$')
+PICKLE_PROTOCOL = 2
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+class CaptureLog(TransactionStore):
+    """A transaction store that appends transactions to a capture log instead
+    of keeping them in memory. Only the last transaction is kept around.
+
+    Appending to a directory that already holds a capture log continues it
+    in a new segment. A new segment is also started once the current one
+    reaches segment_bytes. Appends from several threads are written one
+    after the other.
+    """
+
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._reader = CaptureLogReader(directory)
+        self._segment_number = max(_segment_numbers(directory) or [0])
+        self._log_file = None
+        self._index_file = None
+        self._segment_size = 0
+        self._count = len(self._reader)
+        self._last = None
+        # Keeps the offset of each index entry in step with its data
+        self._lock = threading.Lock()
+
+    def append(self, transaction):
+        with self._lock:
+            data = _serialize(transaction)
+            if self._log_file is None or (
+                    self._segment_size and
+                    self._segment_size + len(data) > self.segment_bytes):
+                self._start_segment()
+            self._log_file.write(data)
+            self._log_file.flush()
+            self._index_file.write(
+                INDEX_ENTRY.pack(self._segment_size, len(data),
+                                 transaction.request.elapsed,
+                                 transaction.response.elapsed))
+            self._index_file.flush()
+            self._segment_size += len(data)
+            self._count += 1
+            self._last = transaction
+
+    def clear(self):
+        """Delete every segment of the capture log"""
+        with self._lock:
+            self._close()
+            for number in _segment_numbers(self.directory):
+                for path in _segment_paths(self.directory, number):
+                    os.remove(path)
+            self._segment_number = 0
+            self._count = 0
+            self._last = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        for open_file in (self._log_file, self._index_file):
+            if open_file is not None:
+                open_file.close()
+        self._log_file = self._index_file = None
+
+    def __iter__(self):
+        return iter(self._reader)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index == -1 and self._last is not None:
+            return self._last
+        return self._reader[index]
+
+    def _start_segment(self):
+        self._close()
+        self._segment_number += 1
+        log_path, index_path = _segment_paths(self.directory,
+                                              self._segment_number)
+        self._log_file = open(log_path, 'ab')
+        self._index_file = open(index_path, 'ab')
+        self._segment_size = 0
+
+
+class CaptureLogReader(HTTPSniffer):
+    """Read the transactions of a capture log lazily, memory-mapping its
+    segments, possibly while another process is still appending to it.
+
+    It can be given to save_seq_diag like any other sniffer.
+    """
+
+    def __init__(self, directory):
+        super(CaptureLogReader, self).__init__()
+        self.directory = directory
+
+    @property
+    def transactions(self):
+        return self
+
+    @property
+    def ordered(self):
+        last_request_elapsed = last_response_elapsed = float('-inf')
+        for _, index in self._indexes():
+            for _, _, request_elapsed, response_elapsed in _entries(index):
+                if (request_elapsed < last_request_elapsed or
+                        response_elapsed < last_response_elapsed):
+                    return False
+                last_request_elapsed = request_elapsed
+                last_response_elapsed = response_elapsed
+        return True
+
+    def __iter__(self):
+        for number, index in self._indexes():
+            log_path, _ = _segment_paths(self.directory, number)
+            with _mapped(log_path) as log:
+                for offset, length, _, _ in _entries(index):
+                    yield pickle.loads(log[offset:offset + length])
+
+    def __len__(self):
+        return sum(
+            len(index) // INDEX_ENTRY.size for _, index in self._indexes())
+
+    def __getitem__(self, index):
+        num_transactions = len(self)
+        position = index + num_transactions if index < 0 else index
+        if not 0 <= position < num_transactions:
+            raise IndexError('capture log index out of range')
+        for number, segment_index in self._indexes():
+            num_entries = len(segment_index) // INDEX_ENTRY.size
+            if position < num_entries:
+                offset, length, _, _ = INDEX_ENTRY.unpack_from(
+                    segment_index, position * INDEX_ENTRY.size)
+                log_path, _ = _segment_paths(self.directory, number)
+                with open(log_path, 'rb') as log_file:
+                    log_file.seek(offset)
+                    return pickle.loads(log_file.read(length))
+            position -= num_entries
+
+    def _indexes(self):
+        """Yield the number and the memory-mapped index of every segment"""
+        for number in _segment_numbers(self.directory):
+            _, index_path = _segment_paths(self.directory, number)
+            with _mapped(index_path) as index:
+                yield number, index
+
+
+def _serialize(transaction):
+    try:
+        return pickle.dumps(transaction, PICKLE_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        # Bodies can be arbitrary objects, e.g. what a Bottle handler returns
+        for message in (transaction.request, transaction.response):
+            message.body = repr(message.body)
+        return pickle.dumps(transaction, PICKLE_PROTOCOL)
+
+
+def _entries(index):
+    "Iterate over the complete entries of a memory-mapped index"
+    for position in range(0, len(index) - INDEX_ENTRY.size + 1,
+                          INDEX_ENTRY.size):
+        yield INDEX_ENTRY.unpack_from(index, position)
+
+
+def _mapped(path):
+    "Memory-map a whole file for reading"
+    with open(path, 'rb') as mapped_file:
+        size = os.fstat(mapped_file.fileno()).st_size
+        if not size:
+            return closing(_EmptyMap())
+        return closing(
+            mmap.mmap(mapped_file.fileno(), size, access=mmap.ACCESS_READ))
+
+
+class _EmptyMap(bytes):
+    "Stand-in for files that are empty, since they can't be memory-mapped"
+
+    def close(self):
+        pass
+
+
+def _segment_numbers(directory):
+    numbers = []
+    for file_name in os.listdir(directory):
+        match = SEGMENT_RE.match(file_name)
+        if match:
+            numbers.append(int(match.group(1)))
+    return sorted(numbers)
+
+
+def _segment_paths(directory, number):
+    name = SEGMENT_NAME % number
+    return (os.path.join(directory, name + '.log'),
+            os.path.join(directory, name + '.idx'))
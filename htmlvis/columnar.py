@@ -0,0 +1,278 @@
+"""
+Columnar transaction store, for analysing large captures.
+
+Timestamps and status codes are kept in typed arrays, participants, methods,
+URL paths, routes and status lines are dictionary-encoded as integer ids,
+and bodies and headers live in side tables. Filtering, sorting and
+aggregating only touch the columns involved, using NumPy when it is
+available.
+"""
+from array import array
+
+from .htmlvis import Request, Response, Transaction
+from .transaction_store import TransactionStore
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NUMERIC_COLUMNS = ('request_elapsed', 'response_elapsed', 'status_code')
+ENCODED_COLUMNS = ('client_name', 'server_name', 'method', 'url_path',
+                   'route', 'status')
+
+
+class ColumnarStore(TransactionStore):
+    """A transaction store that keeps transactions as columns.
+
+    Transactions are rebuilt when the store is iterated or indexed, so it
+    can be used by sniffers and save_seq_diag like any other store.
+    NumPy is used for the analysis methods if it is installed, unless
+    use_numpy is False.
+    """
+
+    def __init__(self, use_numpy=True):
+        self._numpy = numpy if use_numpy else None
+        self.clear()
+
+    def append(self, transaction):
+        request = transaction.request
+        response = transaction.response
+        self._columns['request_elapsed'].append(request.elapsed)
+        self._columns['response_elapsed'].append(response.elapsed)
+        self._columns['status_code'].append(_status_code(response.status))
+        for name, value in (('client_name', transaction.client_name),
+                            ('server_name', transaction.server_name),
+                            ('method', request.method),
+                            ('url_path', request.url_path),
+                            ('route', request.route),
+                            ('status', response.status)):
+            self._columns[name].append(self._dictionaries[name].encode(value))
+        self._request_bodies.append(request.body)
+        self._response_bodies.append(response.body)
+        self._request_headers.append(request.headers)
+        self._response_headers.append(response.headers)
+
+    def clear(self):
+        self._columns = {
+            'request_elapsed': array('d'),
+            'response_elapsed': array('d'),
+            'status_code': array('H'),
+        }
+        for name in ENCODED_COLUMNS:
+            self._columns[name] = array('I')
+        self._dictionaries = dict(
+            (name, _Dictionary()) for name in ENCODED_COLUMNS)
+        self._request_bodies = []
+        self._response_bodies = []
+        self._request_headers = []
+        self._response_headers = []
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._transaction(index)
+
+    def __len__(self):
+        return len(self._columns['request_elapsed'])
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError('transaction index out of range')
+        return self._transaction(index % len(self))
+
+    def column(self, name):
+        """Get a column by name: the values of numeric columns, or the ids of
+        dictionary-encoded ones. They are copied into a NumPy array if NumPy
+        is used, since arrays can't grow while NumPy shares their memory, or
+        returned as they are otherwise.
+        """
+        column = self._columns[name]
+        if self._numpy is not None:
+            if not column:
+                return self._numpy.array([], dtype=column.typecode)
+            return self._numpy.frombuffer(
+                column, dtype=column.typecode).copy()
+        return column
+
+    def values(self, name):
+        """Get the distinct values of a dictionary-encoded column, indexed by
+        their id
+        """
+        return list(self._dictionaries[name].values)
+
+    def latencies(self):
+        """Time between each request and its response"""
+        request_elapsed = self.column('request_elapsed')
+        response_elapsed = self.column('response_elapsed')
+        if self._numpy is not None:
+            return response_elapsed - request_elapsed
+        return array('d', (response - request for request, response in zip(
+            request_elapsed, response_elapsed)))
+
+    def where(self,
+              status_code=None,
+              min_status_code=None,
+              max_status_code=None,
+              min_latency=None,
+              max_latency=None,
+              **encoded_values):
+        """Get the indexes of the transactions that match every condition.
+
+        Besides the status code and latency limits, values of the
+        dictionary-encoded columns can be given by name, e.g. method='GET'.
+        """
+        conditions = []
+        if status_code is not None:
+            conditions.append(('status_code', _equal, status_code))
+        if min_status_code is not None:
+            conditions.append(('status_code', _greater_equal,
+                               min_status_code))
+        if max_status_code is not None:
+            conditions.append(('status_code', _less_equal, max_status_code))
+        for name, value in encoded_values.items():
+            if name not in ENCODED_COLUMNS:
+                raise ValueError('Unknown column: %s' % name)
+            value_id = self._dictionaries[name].ids.get(value)
+            if value_id is None:
+                return self._indexes([])
+            conditions.append((name, _equal, value_id))
+        if min_latency is not None:
+            conditions.append((None, _greater_equal, min_latency))
+        if max_latency is not None:
+            conditions.append((None, _less_equal, max_latency))
+
+        if self._numpy is not None:
+            mask = self._numpy.ones(len(self), dtype=bool)
+            for name, compare, value in conditions:
+                mask &= compare(self._condition_column(name), value)
+            return self._numpy.flatnonzero(mask)
+        indexes = range(len(self))
+        for name, compare, value in conditions:
+            column = self._condition_column(name)
+            indexes = [
+                index for index in indexes if compare(column[index], value)
+            ]
+        return self._indexes(indexes)
+
+    def sort_by(self, name, indexes=None, reverse=False):
+        """Get the indexes of the transactions, or of the given subset of
+        them, sorted by a column. Dictionary-encoded columns are sorted by
+        their values.
+        """
+        if name in ENCODED_COLUMNS:
+            ranks = self._ranks(name)
+            if self._numpy is not None:
+                sort_column = self._numpy.array(
+                    ranks, dtype=int)[self.column(name)]
+            else:
+                sort_column = [ranks[value_id]
+                               for value_id in self._columns[name]]
+        elif name == 'latency':
+            sort_column = self.latencies()
+        else:
+            sort_column = self.column(name)
+        if indexes is None:
+            indexes = range(len(self))
+        if self._numpy is not None:
+            indexes = self._numpy.asarray(indexes, dtype=int)
+            order = indexes[self._numpy.argsort(
+                sort_column[indexes], kind='stable')]
+            return order[::-1] if reverse else order
+        return self._indexes(
+            sorted(
+                indexes,
+                key=sort_column.__getitem__,
+                reverse=reverse))
+
+    def count_by(self, name, indexes=None):
+        """Count the transactions, or the given subset of them, by the value
+        of a column
+        """
+        column = self._columns[name]
+        decode = None
+        if name in ENCODED_COLUMNS:
+            decode = self._dictionaries[name].values.__getitem__
+        if self._numpy is not None:
+            ids = self.column(name)
+            if indexes is not None:
+                ids = ids[indexes]
+            unique, counts = self._numpy.unique(ids, return_counts=True)
+            pairs = zip(unique.tolist(), counts.tolist())
+        else:
+            counts = {}
+            for index in (range(len(self)) if indexes is None else indexes):
+                counts[column[index]] = counts.get(column[index], 0) + 1
+            pairs = counts.items()
+        return dict(
+            (decode(value) if decode else value, count)
+            for value, count in pairs)
+
+    def _transaction(self, index):
+        decoded = dict((name, self._dictionaries[name].values[
+            self._columns[name][index]]) for name in ENCODED_COLUMNS)
+        return Transaction(
+            client_name=decoded['client_name'],
+            server_name=decoded['server_name'],
+            request=Request(
+                body=self._request_bodies[index],
+                elapsed=self._columns['request_elapsed'][index],
+                headers=self._request_headers[index],
+                method=decoded['method'],
+                url_path=decoded['url_path'],
+                route=decoded['route']),
+            response=Response(
+                body=self._response_bodies[index],
+                elapsed=self._columns['response_elapsed'][index],
+                headers=self._response_headers[index],
+                status=decoded['status']))
+
+    def _condition_column(self, name):
+        return self.latencies() if name is None else self.column(name)
+
+    def _ranks(self, name):
+        "Map every id of a dictionary-encoded column to its sorting rank"
+        values = self._dictionaries[name].values
+        ranks = [0] * len(values)
+        for rank, value_id in enumerate(
+                sorted(range(len(values)), key=values.__getitem__)):
+            ranks[value_id] = rank
+        return ranks
+
+    def _indexes(self, indexes):
+        if self._numpy is not None:
+            return self._numpy.asarray(indexes, dtype=int)
+        return list(indexes)
+
+
+class _Dictionary(object):
+    "Bidirectional mapping between distinct values and consecutive ids"
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def encode(self, value):
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+
+def _status_code(status):
+    try:
+        return int(str(status).split(' ', 1)[0])
+    except ValueError:
+        return 0
+
+
+def _equal(left, right):
+    return left == right
+
+
+def _greater_equal(left, right):
+    return left >= right
+
+
+def _less_equal(left, right):
+    return left <= right
@@ -0,0 +1,71 @@
+"""
+Rules that decide at capture time which transactions are recorded
+"""
+import re
+
+from attr import attrib, attrs
+
+# Fields of a capture subject are separated by newlines, which can't show
+# up in request lines
+_SEPARATOR = '\n'
+_ANY = '[^\n]*'
+
+
+@attrs(slots=True)
+class Rule(object):
+    """Matches transactions by HTTP method, status, host and path.
+
+    Hosts and paths are glob patterns, where * and ? match any run of
+    characters and any single character. Statuses are codes such as 404,
+    where x matches any digit, as in '5xx'. Parts left as None match
+    anything.
+    """
+    method = attrib(default=None)
+    path = attrib(default=None)
+    host = attrib(default=None)
+    status = attrib(default=None)
+
+    def pattern(self):
+        "The regular expression matched against a capture subject"
+        return _SEPARATOR.join((
+            _ANY if self.method is None else re.escape(self.method.upper()),
+            _ANY if self.status is None else _status_pattern(self.status),
+            _ANY if self.host is None else _glob_pattern(self.host),
+            _ANY if self.path is None else _glob_pattern(self.path),
+        ))
+
+
+class CaptureFilter(object):
+    """Decide whether a transaction is captured: it must match one of the
+    include rules, if there are any, and none of the exclude rules.
+
+    All the rules are compiled into a single regular expression, matched
+    once per transaction against its method, status, host and path.
+    """
+
+    def __init__(self, include=(), exclude=()):
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        pattern = ''
+        if self.exclude:
+            pattern += '(?!(?:%s)\\Z)' % '|'.join(
+                rule.pattern() for rule in self.exclude)
+        if self.include:
+            pattern += '(?:%s)\\Z' % '|'.join(
+                rule.pattern() for rule in self.include)
+        self._match = re.compile(pattern).match
+
+    def captures(self, method, status, host, path):
+        subject = _SEPARATOR.join((method.upper(), str(status), host, path))
+        return self._match(subject) is not None
+
+
+def _glob_pattern(glob):
+    return ''.join(
+        _ANY if char == '*' else '[^\n]' if char == '?' else re.escape(char)
+        for char in glob)
+
+
+def _status_pattern(status):
+    return ''.join('\\d' if char in 'xX' else re.escape(char)
+                   for char in str(status))
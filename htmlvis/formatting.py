@@ -1,15 +1,37 @@
 """
 Collection of callables that (possibly) transform the messages
 """
+import hashlib
 import json
 import re
+import threading
 from collections import OrderedDict
+from json.encoder import encode_basestring_ascii as _encode_string
+
+from attr import attrib, attrs
+from six import integer_types, string_types, text_type
 
 try:
     from contextlib import suppress
 except ImportError:
     from contextlib2 import suppress
 
+MAX_STRING_LENGTH = 15
+INDENT = '    '
+# Ends the formatted notes that went over their budget
+TRUNCATION_MARK = '\n...'
+# Starts the notes summarised for going over their NoteBudget
+SUMMARY = '[%d bytes, digest %s]\n'
+# The message data describing the body in its note
+NOTE_INFO = ('content_type', 'size', 'digest')
+_LONG_STRING = re.compile('"([^"\n]{%d}).*?"' % MAX_STRING_LENGTH)
+_FIRST_CHAR = re.compile(r'\s*(\S)')
+# A string, a number or literal, or any other single character
+_JSON_TOKEN = re.compile(
+    r'\s*(?:("(?:[^"\\]|\\.)*")|([^\s{}\[\],:"]+)|(\S))')
+_INFINITY = float('inf')
+_MISSING = object()
+
 
 def prettify_json(msg):
     if not msg.note:
@@ -24,9 +46,436 @@ def prettify_json(msg):
 def shorten_long_strings(msg):
     if not msg.note:
         return
-    MAX_LEN = 15
-    ANY_CHAR_BUT_QUOTE_OR_NEWLINE = '[^"\n]'
-    MAX_LENGTH_STRING = '%s{%s}' % (ANY_CHAR_BUT_QUOTE_OR_NEWLINE, MAX_LEN)
-    ANY_CHAR_NON_GREEDY = '.*?'
-    REGEX = '"(' + MAX_LENGTH_STRING + ')' + ANY_CHAR_NON_GREEDY + '"'
-    msg.note = re.sub(REGEX, r'"\1..."', msg.note)
+    msg.note = _LONG_STRING.sub(r'"\1..."', msg.note)
+
+
+@attrs(frozen=True, slots=True)
+class JSONFormatter(object):
+    """Pretty-print JSON notes, preserving the order of their items, with
+    strings longer than max_string_length characters already shortened.
+
+    The parsed document is written out in a single pass, which stops once
+    the output grows beyond max_chars characters, if given: the output is
+    then cut there and ends with an ellipsis. Notes that aren't JSON are
+    formatted as None. Formatters with the same settings compare equal, so
+    they share cached notes.
+    """
+    max_string_length = attrib(default=MAX_STRING_LENGTH)
+    max_chars = attrib(default=None)
+
+    def __call__(self, note):
+        try:
+            document = json.loads(note, object_pairs_hook=_Members)
+        except ValueError:
+            return None
+        return _JSONWriter(self.max_string_length,
+                           self.max_chars).write(document)
+
+    def format_head(self, text, max_lines=None):
+        """Pretty-print the beginning of a JSON document, such as the excerpt
+        of a note over budget, token by token and as far as it goes, or up
+        to max_lines lines
+        """
+        parts = []
+        newline = '\n'
+        opened = False
+        lines = 1
+        for match in _JSON_TOKEN.finditer(text):
+            string, literal, punctuation = match.groups()
+            closing = punctuation in ('}', ']')
+            # Whether the token goes on a new line, or is followed by one
+            if (not opened) if closing else (opened or punctuation == ','):
+                if lines == max_lines:
+                    break
+                lines += 1
+            if closing:
+                if len(newline) > 1:
+                    newline = newline[:-len(INDENT)]
+                parts.append(punctuation if opened else newline + punctuation)
+                opened = False
+                continue
+            if opened:
+                parts.append(newline)
+                opened = False
+            if string is not None:
+                if '\\' in string:
+                    try:
+                        string = json.loads(string)
+                    except ValueError:
+                        break
+                else:
+                    string = string[1:-1]
+                parts.append(_shortened_string(string, self.max_string_length))
+            elif literal is not None:
+                parts.append(literal)
+            elif punctuation in ('{', '['):
+                parts.append(punctuation)
+                newline += INDENT
+                opened = True
+            elif punctuation == ',':
+                parts.append(',' + newline)
+            elif punctuation == ':':
+                parts.append(': ')
+            else:  # An unterminated string, or not JSON
+                break
+        return ''.join(parts).rstrip()
+
+
+format_json = JSONFormatter()
+
+
+# Formatters by media type. A '+suffix' key applies to every structured
+# syntax suffix, as in application/problem+json, and a 'type/*' key to every
+# subtype. Media types that map to None, or aren't registered, are left as
+# they are.
+CONTENT_TYPE_FORMATTERS = {
+    'application/json': format_json,
+    'text/json': format_json,
+    '+json': format_json,
+}
+
+# Formatters by the first non-blank character of notes whose content type
+# wasn't captured
+FIRST_CHAR_FORMATTERS = {
+    '{': format_json,
+    '[': format_json,
+}
+
+
+@attrs(frozen=True, slots=True)
+class NoteBudget(object):
+    """The most of a note that is formatted and drawn: max_bytes, counted
+    in characters of the decoded note, and max_lines. Either can be None.
+
+    Notes over budget aren't formatted, and neither are notes that only go
+    over it once formatted. They are summarised with their size, their
+    digest and as much of their beginning as fits, which formatters with a
+    format_head method, such as JSONFormatter, format. The size and digest
+    recorded at capture are used when known.
+    """
+    max_bytes = attrib(default=64 * 1024)
+    max_lines = attrib(default=1000)
+
+    def exceeded_by(self, note):
+        if self.max_bytes is not None and len(note) > self.max_bytes:
+            return True
+        return (self.max_lines is not None and
+                note.count('\n', 0, self.max_bytes) >= self.max_lines)
+
+    def summarize(self, note, formatter=None, size=None, digest=None):
+        "Summarise a note over budget"
+        head = self._cut(note)
+        format_head = getattr(formatter, 'format_head', None)
+        if format_head is not None:
+            head = self._cut(format_head(head, self.max_lines)).rstrip()
+        if size is None or digest is None:
+            encoded = _encoded(note)
+            size = len(encoded) if size is None else size
+            digest = digest or hashlib.sha1(encoded).hexdigest()
+        return SUMMARY % (size, digest) + head + TRUNCATION_MARK
+
+    def _cut(self, text):
+        if self.max_bytes is not None:
+            text = text[:self.max_bytes]
+        if self.max_lines is not None:
+            end = -1
+            for _ in range(self.max_lines):
+                end = text.find('\n', end + 1)
+                if end < 0:
+                    break
+            else:
+                text = text[:end]
+        return text
+
+
+DEFAULT_BUDGET = NoteBudget()
+
+
+class NoteFormatter(object):
+    """Format the note of each message with the single formatter that suits
+    it: the one registered for the Content-Type it was captured with, or
+    else the one guessed from its first character.
+
+    It remembers the formatter every content type resolves to. Formatted
+    notes are kept in the given NoteCache, or else in one of its own, so
+    that identical notes are only formatted once. Notes over the given
+    NoteBudget, or DEFAULT_BUDGET, before or after formatting, are
+    summarised instead, and JSONFormatters stop writing once they are over
+    it. It is pickled without its cache, which processes can't share.
+    """
+
+    def __init__(self,
+                 content_type_formatters=None,
+                 first_char_formatters=None,
+                 cache=None,
+                 budget=None):
+        self._by_content_type = (CONTENT_TYPE_FORMATTERS
+                                 if content_type_formatters is None else
+                                 content_type_formatters)
+        self._by_first_char = (FIRST_CHAR_FORMATTERS
+                               if first_char_formatters is None else
+                               first_char_formatters)
+        self.cache = NoteCache() if cache is None else cache
+        self.budget = DEFAULT_BUDGET if budget is None else budget
+        self._resolved = {}
+        self._within_budget = {}
+
+    def __call__(self, msg):
+        if not msg.note:
+            return
+        info = note_info(msg)
+        formatter = self.formatter_for(msg.note, info['content_type'])
+        if self.budget.exceeded_by(msg.note):
+            msg.note = self.budget.summarize(msg.note, formatter, info['size'],
+                                             info['digest'])
+            return
+        if formatter is None:
+            return
+        formatted = self.cache.format(self._stopping_early(formatter),
+                                      msg.note)
+        if formatted is None:
+            return
+        if self.budget.exceeded_by(formatted):
+            msg.note = self.budget.summarize(msg.note, formatter, info['size'],
+                                             info['digest'])
+            return
+        msg.note = formatted
+
+    def __reduce__(self):
+        # The default registries are left to be found by the unpickling
+        # process, as they may hold functions that can't be pickled
+        by_content_type = self._by_content_type
+        if by_content_type is CONTENT_TYPE_FORMATTERS:
+            by_content_type = None
+        by_first_char = self._by_first_char
+        if by_first_char is FIRST_CHAR_FORMATTERS:
+            by_first_char = None
+        return (NoteFormatter,
+                (by_content_type, by_first_char, None, self.budget))
+
+    def formatter_for(self, note, content_type=None):
+        "The formatter for a note, or None if it is to be left as it is"
+        if content_type:
+            try:
+                return self._resolved[content_type]
+            except KeyError:
+                formatter = self._resolved[content_type] = self._lookup(
+                    content_type)
+                return formatter
+        match = _FIRST_CHAR.match(note)
+        return self._by_first_char.get(match.group(1)) if match else None
+
+    def _stopping_early(self, formatter):
+        """The formatter, or a JSONFormatter like it that stops writing just
+        past the byte budget
+        """
+        if (self.budget.max_bytes is None or
+                not isinstance(formatter, JSONFormatter) or
+                formatter.max_chars is not None):
+            return formatter
+        try:
+            return self._within_budget[formatter]
+        except KeyError:
+            stopping = self._within_budget[formatter] = JSONFormatter(
+                formatter.max_string_length, self.budget.max_bytes)
+            return stopping
+
+    def _lookup(self, content_type):
+        media_type = content_type.split(';', 1)[0].strip().lower()
+        if media_type in self._by_content_type:
+            return self._by_content_type[media_type]
+        _, plus, suffix = media_type.rpartition('+')
+        if plus and '+' + suffix in self._by_content_type:
+            return self._by_content_type['+' + suffix]
+        return self._by_content_type.get(media_type.split('/', 1)[0] + '/*')
+
+
+class NoteCache(object):
+    """Remember formatted notes, by formatter and by digest of the raw note,
+    so that payloads that show up many times are only formatted once.
+
+    The least recently used notes are forgotten once the cached notes add up
+    to more than max_bytes, each of them counting the formatted note, its
+    digest and entry_overhead bytes, so that notes that couldn't be
+    formatted count too. A cache can be passed to save_seq_diag to keep it
+    across diagrams; hits and misses count its lookups.
+    """
+    # Roughly what the key tuple and the dict entry of a note take
+    entry_overhead = 128
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # (formatter, digest) -> formatted note, least recently used first
+        self._notes = OrderedDict()
+
+    def format(self, formatter, note):
+        "Return formatter(note), formatting it only if it isn't cached"
+        key = (formatter, _digest(note))
+        with self._lock:
+            formatted = self._notes.pop(key, _MISSING)
+            if formatted is not _MISSING:
+                self._notes[key] = formatted
+                self.hits += 1
+                return formatted
+            self.misses += 1
+        formatted = formatter(note)
+        size = self._entry_size(key, formatted)
+        if size <= self.max_bytes:
+            with self._lock:
+                if key not in self._notes:
+                    self._notes[key] = formatted
+                    self.cached_bytes += size
+                    self._evict()
+        return formatted
+
+    def clear(self):
+        with self._lock:
+            self._notes.clear()
+            self.cached_bytes = 0
+
+    def __len__(self):
+        return len(self._notes)
+
+    def _entry_size(self, key, formatted):
+        return (self.entry_overhead + len(key[1]) +
+                (len(formatted) if formatted else 0))
+
+    def _evict(self):
+        while self.cached_bytes > self.max_bytes:
+            key, formatted = self._notes.popitem(last=False)
+            self.cached_bytes -= self._entry_size(key, formatted)
+
+
+def note_info(msg):
+    """What is known from capture about the body in a message note: its
+    Content-Type, its size in bytes and its digest, each of them or None
+    """
+    data = msg.data if isinstance(msg.data, dict) else {}
+    return dict((key, data.get(key)) for key in NOTE_INFO)
+
+
+class _Members(list):
+    "The name-value pairs of a parsed JSON object, in order"
+
+
+class _BudgetExhausted(Exception):
+    pass
+
+
+class _JSONWriter(object):
+    """Write a parsed JSON document as json.dumps(indent=4) would, with long
+    strings shortened as they are written
+    """
+
+    def __init__(self, max_string_length, max_chars):
+        self._max_string_length = max_string_length
+        self._max_chars = max_chars
+        self._parts = []
+        self._size = 0
+        # Objects tend to repeat the same names, which are encoded once
+        self._names = {}
+
+    def write(self, document):
+        try:
+            self._value(document, '\n')
+        except _BudgetExhausted:
+            return ''.join(
+                self._parts)[:self._max_chars].rstrip() + TRUNCATION_MARK
+        return ''.join(self._parts)
+
+    def _emit(self, text):
+        self._parts.append(text)
+        if self._max_chars is not None:
+            self._size += len(text)
+            if self._size > self._max_chars:
+                raise _BudgetExhausted()
+
+    def _value(self, value, newline):
+        kind = type(value)
+        if kind is _Members:
+            self._object(value, newline)
+        elif kind is list:
+            self._array(value, newline)
+        else:
+            self._emit(self._scalar(value))
+
+    def _object(self, members, newline):
+        if not members:
+            self._emit('{}')
+            return
+        inner = newline + INDENT
+        separator = '{' + inner
+        names = self._names
+        for name, value in members:
+            encoded_name = names.get(name)
+            if encoded_name is None:
+                encoded_name = names[name] = self._string(name) + ': '
+            kind = type(value)
+            if kind is _Members or kind is list:
+                self._emit(separator + encoded_name)
+                self._value(value, inner)
+            else:
+                self._emit(separator + encoded_name + self._scalar(value))
+            separator = ',' + inner
+        self._emit(newline + '}')
+
+    def _array(self, items, newline):
+        if not items:
+            self._emit('[]')
+            return
+        inner = newline + INDENT
+        separator = '[' + inner
+        for item in items:
+            kind = type(item)
+            if kind is _Members or kind is list:
+                self._emit(separator)
+                self._value(item, inner)
+            else:
+                self._emit(separator + self._scalar(item))
+            separator = ',' + inner
+        self._emit(newline + ']')
+
+    def _scalar(self, value):
+        if isinstance(value, string_types):
+            return self._string(value)
+        return _SCALARS[type(value)](value)
+
+    def _string(self, text):
+        return _shortened_string(text, self._max_string_length)
+
+
+def _shortened_string(text, max_length):
+    if len(text) > max_length:
+        return _encode_string(text[:max_length])[:-1] + '..."'
+    return _encode_string(text)
+
+
+def _digest(note):
+    return hashlib.sha1(_encoded(note)).digest()
+
+
+def _encoded(note):
+    if isinstance(note, text_type):
+        return note.encode('utf-8', 'surrogatepass')
+    return note
+
+
+def _float(value):
+    if value != value:
+        return 'NaN'
+    if value in (_INFINITY, -_INFINITY):
+        return 'Infinity' if value > 0 else '-Infinity'
+    return repr(value)
+
+
+# How parsed JSON values other than strings, arrays and objects are written
+_SCALARS = {
+    bool: lambda value: 'true' if value else 'false',
+    float: _float,
+    type(None): lambda value: 'null',
+}
+_SCALARS.update((integer_type, str) for integer_type in integer_types)
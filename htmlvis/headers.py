@@ -0,0 +1,103 @@
+"""
+Captured HTTP headers, shared between transactions that carry the same ones
+"""
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class FrozenHeaders(dict):
+    """An immutable dict of header names to values, which can be shared by
+    every transaction with the same headers
+    """
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('FrozenHeaders are immutable')
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __repr__(self):
+        return 'FrozenHeaders(%s)' % dict.__repr__(self)
+
+    def __reduce__(self):
+        return (FrozenHeaders, (dict(self), ))
+
+
+class LazyHeaders(Mapping):
+    """Headers whose name-value pairs are only interned, and turned into a
+    mapping, the first time they are read
+    """
+    __slots__ = ('_items', '_store', '_headers')
+
+    def __init__(self, items, store):
+        self._items = items
+        self._store = store
+        self._headers = None
+
+    @property
+    def headers(self):
+        "The FrozenHeaders these headers materialise into"
+        if self._headers is None:
+            self._headers = self._store.intern(self._items)
+            self._items = self._store = None
+        return self._headers
+
+    def __getitem__(self, name):
+        return self.headers[name]
+
+    def __iter__(self):
+        return iter(self.headers)
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __repr__(self):
+        return 'LazyHeaders(%r)' % (dict(self.headers), )
+
+    def __reduce__(self):
+        return (FrozenHeaders, (dict(self.headers), ))
+
+
+class HeaderStore(object):
+    """Intern identical sets of headers into shared FrozenHeaders.
+
+    Headers such as Date make many sets unique, so the store forgets every
+    set it knows once it holds max_sets of them. In lazy mode, capture
+    returns LazyHeaders, which defer interning until the headers are read,
+    e.g. when exported.
+    """
+
+    def __init__(self, lazy=False, max_sets=1024):
+        self.lazy = lazy
+        self.max_sets = max_sets
+        self._sets = {}
+
+    def capture(self, headers):
+        """Keep the headers of a request or response, given as a mapping or
+        as name-value pairs. Only the pairs are copied, never the live
+        headers, which may hold on to the whole request, such as the WSGI
+        environ and its body.
+        """
+        items = headers.items() if hasattr(headers, 'items') else headers
+        if self.lazy:
+            return LazyHeaders(tuple(items), self)
+        return self.intern(items)
+
+    def intern(self, items):
+        "Return the shared FrozenHeaders with the given name-value pairs"
+        key = tuple(items)
+        try:
+            shared = self._sets.get(key)
+        except TypeError:  # Unhashable values can't be interned
+            return FrozenHeaders(key)
+        if shared is None:
+            if len(self._sets) >= self.max_sets:
+                self._sets.clear()
+            shared = self._sets[key] = FrozenHeaders(key)
+        return shared
+
+    def __len__(self):
+        return len(self._sets)
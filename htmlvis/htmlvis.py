@@ -1,36 +1,128 @@
+import heapq
+
+import attr
 from attr import attrib, attrs
+from six.moves import intern
 
-from . import seqdiag
+from . import body
 from . import seqdiag_model
+from .filters import CaptureFilter
+from .headers import HeaderStore
+from .transaction_store import ListStore
 
 
 class HTTPSniffer(object):
     """A class that captures network traffic at either client or server side and
     records information about each HTTP transaction, such as URLs, headers,
     bodies, etc
+
+    Transactions are recorded in the given TransactionStore, or in an
+    unbounded ListStore by default. If a BackgroundRecorder is given, the
+    transactions are built and recorded in its worker thread instead of
+    the thread that captured them. Headers are interned in the given
+    HeaderStore, which several sniffers can share, or in their own one.
+
+    Only the transactions that match one of the include Rules, if any, and
+    none of the exclude Rules are captured, which is decided before
+    anything is copied from them.
     """
 
+    def __init__(self,
+                 store=None,
+                 recorder=None,
+                 headers=None,
+                 include=(),
+                 exclude=()):
+        self._store = ListStore() if store is None else store
+        self._recorder = recorder
+        self._headers = HeaderStore() if headers is None else headers
+        self._filter = None
+        if include or exclude:
+            self._filter = CaptureFilter(include, exclude)
+        self._reset_order()
+
     @property
     def transactions(self):
         """A list of Transaction objects"""
         raise NotImplementedError()
 
+    @property
+    def ordered(self):
+        """Whether the transactions are sorted by both request and response
+        elapsed time, which is the case unless they overlapped in time
+        """
+        return self._ordered and self._store.ordered
+
+    def snapshot_and_reset(self):
+        """Remove the captured transactions and return them in a list. It is
+        atomic if the sniffer's store is safe to use from several threads,
+        such as a PerThreadStore. Transactions still being recorded in the
+        background are waited for.
+        """
+        self.flush()
+        snapshot = self._store.snapshot_and_reset()
+        self._reset_order()
+        return snapshot
+
+    def flush(self, timeout=None):
+        """Wait until every captured transaction has been recorded.
+        Return False if the timeout expired first.
+        """
+        if self._recorder is None:
+            return True
+        return self._recorder.flush(timeout)
+
+    def _capture(self, build, *raw):
+        """Record the transaction built by build(*raw), in the background if
+        the sniffer has a recorder
+        """
+        if self._recorder is None:
+            self._record(build(*raw))
+        else:
+            self._recorder.submit(self._build_and_record, build, raw)
+
+    def _build_and_record(self, build, raw):
+        self._record(build(*raw))
+
+    def _record(self, transaction):
+        """Append a captured transaction, keeping track of whether the
+        capture order is still chronological
+        """
+        request_elapsed = transaction.request.elapsed
+        response_elapsed = transaction.response.elapsed
+        if self._ordered:
+            self._ordered = (
+                self._last_request_elapsed <= request_elapsed and
+                self._last_response_elapsed <= response_elapsed)
+        self._last_request_elapsed = request_elapsed
+        self._last_response_elapsed = response_elapsed
+        self.transactions.append(transaction)
+
+    def _reset_order(self):
+        "Start tracking the order of the transactions from scratch"
+        self._ordered = True
+        self._last_request_elapsed = float('-inf')
+        self._last_response_elapsed = float('-inf')
+
     def restart(self):
         """Clear the captured transactions and reset the capture clock"""
         raise NotImplementedError()
 
 
-@attrs
+@attrs(slots=True)
 class Request(object):
-    """Simplified representation of an HTTP request."""
+    """Simplified representation of an HTTP request.
+    The route is the URL path with its variable parts collapsed, if known.
+    """
     body = attrib()
     elapsed = attrib()
     headers = attrib()
     method = attrib()
     url_path = attrib()
+    route = attrib(default=None)
 
 
-@attrs
+@attrs(slots=True)
 class Response(object):
     """Simplified representation of an HTTP response."""
     body = attrib()
@@ -39,7 +131,7 @@ class Response(object):
     status = attrib()
 
 
-@attrs
+@attrs(slots=True)
 class Transaction(object):
     """Simplified representation of a request-response pair."""
     client_name = attrib()
@@ -48,42 +140,160 @@ class Transaction(object):
     server_name = attrib()
 
 
-def save_seq_diag(output_file_path, sniffers):
+def transaction_to_dict(transaction):
+    """The transaction as a dict that json.dumps() accepts, with every body
+    as its text, whatever kind of body was captured, and the headers as
+    plain dicts
+    """
+    data = attr.asdict(
+        transaction,
+        filter=lambda field, value: field.name not in ('body', 'headers'))
+    for name in ('request', 'response'):
+        message = getattr(transaction, name)
+        data[name]['body'] = body.as_text(message.body)
+        data[name]['headers'] = (dict(message.headers.items())
+                                 if hasattr(message.headers, 'items') else
+                                 message.headers)
+    return data
+
+
+def intern_text(text):
+    """Intern a string that repeats across transactions, such as an HTTP
+    method or status, so that all of them share a single copy
+    """
+    try:
+        return intern(text)
+    except TypeError:  # Python 2 can only intern byte strings
+        return text
+
+
+def save_seq_diag(output_file_path,
+                  sniffers,
+                  backend='plantuml',
+                  page_size=None,
+                  page_bytes=None,
+                  page_duration=None,
+                  workers=None,
+                  note_formatter=None):
     """Generate a sequence diagram based on the transactions captured
-    by the given HTTP sniffers
+    by the given HTTP sniffers, rendered with the given seqdiag backend.
+
+    If any of page_size (messages), page_bytes (approximate bytes of diagram
+    description) or page_duration (seconds) is given, the diagram is split
+    into pages of that size, each one saved to its own file next to
+    output_file_path, which becomes an index of the pages. Pages are
+    rendered in parallel by the given number of worker processes, if any.
+
+    Notes are formatted by the given formatting.NoteFormatter, which can be
+    passed to every call so that its cache and budget outlive one diagram.
     """
-    messages = []
+    # The rendering stack is only imported when a diagram is saved, so that
+    # capturing doesn't pay for it
+    from . import paging
+    from . import seqdiag
+
+    sniffers = list(sniffers)
     for sniffer in sniffers:
-        for trans in sniffer.transactions:
-            messages += _convert_to_seq_diag_messages(trans)
-    messages.sort(key=lambda msg: msg.when)
+        if isinstance(sniffer, HTTPSniffer):
+            sniffer.flush()
+    messages = _merge_messages(sniffers)
+
+    if (page_size, page_bytes, page_duration) != (None, None, None):
+        pages = paging.paginate(
+            messages,
+            max_messages=page_size,
+            max_bytes=page_bytes,
+            max_duration=page_duration)
+        paging.save_pages(
+            output_file_path,
+            pages,
+            backend=backend,
+            workers=workers,
+            note_formatter=note_formatter)
+        return
 
     with open(output_file_path, 'w') as output_file:
-        html_seqdiag = seqdiag.draw(messages=messages)
-        print('html diagram: %s' % html_seqdiag)
-        output_file.write(html_seqdiag)
+        seqdiag.draw(
+            messages=messages,
+            output=output_file,
+            backend=backend,
+            note_formatter=note_formatter)
+
+
+def _merge_messages(sniffers):
+    """Lazily merge the messages of all the sniffers in chronological order.
+
+    Each sniffer contributes a stream of request messages and a stream of
+    response messages. Only the streams of sniffers that are not known to be
+    ordered are sorted, the rest are merged as they are produced. Ties are
+    broken as a stable sort of all the messages would do.
+    """
+    streams = []
+    for sniffer_index, sniffer in enumerate(sniffers):
+        converters = (_convert_to_request_message,
+                      _convert_to_response_message)
+        for kind, convert in enumerate(converters):
+            stream = _sortable_messages(sniffer_index, kind,
+                                        sniffer.transactions, convert)
+            if not _is_ordered(sniffer):
+                stream = sorted(stream)
+            streams.append(stream)
+    return (msg for _, _, _, _, msg in heapq.merge(*streams))
+
 
+def _sortable_messages(sniffer_index, kind, transactions, convert):
+    for transaction_index, transaction in enumerate(transactions):
+        msg = convert(transaction)
+        yield (msg.when, sniffer_index, transaction_index, kind, msg)
 
-def _convert_to_seq_diag_messages(transaction):
+
+def _is_ordered(sniffer):
+    return isinstance(sniffer, HTTPSniffer) and sniffer.ordered
+
+
+def _convert_to_request_message(transaction):
     request = transaction.request
-    request_msg = seqdiag_model.Message(
+    return seqdiag_model.make_message(
         category=seqdiag_model.Category.request,
         src=transaction.client_name,
         dst=transaction.server_name,
         text='%s %s' % (request.method, request.url_path),
-        note=request.body,
+        note=body.as_text(request.body),
         when=request.elapsed,
         data={
             'method': request.method,
             'url': request.url_path,
+            'content_type': _content_type(request.headers),
+            'size': getattr(request.body, 'size', None),
+            'digest': getattr(request.body, 'digest', None),
         })
+
+
+def _convert_to_response_message(transaction):
     response = transaction.response
-    response_msg = seqdiag_model.Message(
+    return seqdiag_model.make_message(
         category=seqdiag_model.Category.response,
         src=transaction.server_name,
         dst=transaction.client_name,
         text=response.status,
-        note=response.body,
+        note=body.as_text(response.body),
         when=response.elapsed,
-        data={'status': response.status})
-    return [request_msg, response_msg]
+        data={
+            'status': response.status,
+            'content_type': _content_type(response.headers),
+            'size': getattr(response.body, 'size', None),
+            'digest': getattr(response.body, 'digest', None),
+        })
+
+
+def _content_type(headers):
+    "The Content-Type header, whatever the case of its name"
+    get = getattr(headers, 'get', None)
+    if get is None:
+        return None
+    content_type = get('Content-Type')
+    if content_type is None:
+        for name, value in headers.items():
+            if name.lower() == 'content-type':
+                return value
+    return content_type
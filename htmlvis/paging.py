@@ -0,0 +1,224 @@
+"""
+Split huge captures into pages that are rendered as independent, linked
+sequence diagrams
+"""
+import os
+from collections import OrderedDict, deque
+from xml.sax.saxutils import escape, quoteattr
+
+from attr import attrib, attrs
+from six import binary_type, string_types
+
+from . import formatting, seqdiag
+from .seqdiag_model import Category, make_message
+
+PAGE_START = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<nav>{links}</nav>
+<p>{summary}</p>
+'''
+PAGE_END = '''
+</body>
+</html>
+'''
+INDEX_ENTRY = '<li><a href={href}>{title}</a>: {summary}</li>\n'
+LINK = '<a href={href}>{text}</a>'
+
+
+@attrs
+class Page(object):
+    """A slice of the time-ordered messages of a capture"""
+    number = attrib()
+    messages = attrib()
+    # Every participant seen up to this page, in order of appearance, so
+    # that all pages draw the participants they share in the same order
+    participants = attrib()
+
+    @property
+    def title(self):
+        return 'Page %d' % self.number
+
+    @property
+    def summary(self):
+        return '%d messages from %.3f s to %.3f s' % (
+            len(self.messages), self.messages[0].when,
+            self.messages[-1].when)
+
+
+def paginate(messages, max_messages=None, max_bytes=None, max_duration=None):
+    """Lazily split time-ordered messages into pages that hold at most the
+    given number of messages, approximate bytes of diagram description, and
+    seconds between the first and the last message. Only the page being
+    filled is kept in memory.
+    """
+    participants = OrderedDict()
+    page_messages = []
+    page_bytes = 0
+    page_start = None
+    number = 0
+    for msg in messages:
+        msg_bytes = _estimated_size(msg)
+        if page_messages and (
+            (max_messages is not None and len(page_messages) >= max_messages)
+                or (max_bytes is not None and
+                    page_bytes + msg_bytes > max_bytes) or
+            (max_duration is not None and
+             msg.when - page_start > max_duration)):
+            number += 1
+            yield Page(number, page_messages, tuple(participants))
+            page_messages = []
+            page_bytes = 0
+        if not page_messages:
+            page_start = msg.when
+        page_messages.append(msg)
+        page_bytes += msg_bytes
+        participants[msg.src] = participants[msg.dst] = None
+    if page_messages:
+        yield Page(number + 1, page_messages, tuple(participants))
+
+
+def save_pages(output_file_path,
+               pages,
+               backend='plantuml',
+               workers=None,
+               note_formatter=None):
+    """Write every page as an HTML file next to output_file_path, and an
+    index linking all of them to output_file_path itself.
+
+    If a number of workers is given, the pages are rendered in that many
+    processes and written in order as they are ready. Otherwise each page is
+    rendered straight into its file.
+    """
+    if note_formatter is None:
+        note_formatter = formatting.NoteFormatter()
+    if workers:
+        rendered_pages = _render_in_process_pool(pages, backend, workers,
+                                                 note_formatter)
+    else:
+        rendered_pages = ((page, None) for page in pages)
+    index_title = os.path.basename(output_file_path)
+    index_entries = []
+    for (page, diagram), next_rendered in _with_next(rendered_pages):
+        links = [LINK.format(href=quoteattr(index_title), text='Index')]
+        if page.number > 1:
+            links.append(
+                LINK.format(
+                    href=quoteattr(_page_file_name(output_file_path,
+                                                   page.number - 1)),
+                    text='Previous'))
+        if next_rendered is not None:
+            links.append(
+                LINK.format(
+                    href=quoteattr(_page_file_name(output_file_path,
+                                                   next_rendered[0].number)),
+                    text='Next'))
+        page_path = os.path.join(
+            os.path.dirname(output_file_path),
+            _page_file_name(output_file_path, page.number))
+        with open(page_path, 'w') as page_file:
+            page_file.write(
+                PAGE_START.format(
+                    title=escape(page.title),
+                    links=' | '.join(links),
+                    summary=escape(page.summary)))
+            if diagram is None:
+                seqdiag.draw(
+                    messages=page.messages,
+                    output=page_file,
+                    backend=backend,
+                    participants=page.participants,
+                    note_formatter=note_formatter)
+            else:
+                page_file.write(diagram)
+            page_file.write(PAGE_END)
+        index_entries.append(
+            INDEX_ENTRY.format(
+                href=quoteattr(_page_file_name(output_file_path,
+                                               page.number)),
+                title=escape(page.title),
+                summary=escape(page.summary)))
+    with open(output_file_path, 'w') as index_file:
+        index_file.write(
+            PAGE_START.format(
+                title=escape(index_title),
+                links='',
+                summary='%d pages' % len(index_entries)))
+        index_file.write('<ul>\n%s</ul>' % ''.join(index_entries))
+        index_file.write(PAGE_END)
+
+
+def _render_in_process_pool(pages, backend, workers, note_formatter=None):
+    """Render the pages in a pool of processes, yielding each page along with
+    its diagram in page order. At most two pages per worker are in flight,
+    so pages are still produced lazily.
+    """
+    # Imported here since Python 2 needs the 'futures' backport for it
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for page in pages:
+            in_flight.append((page,
+                              executor.submit(_render_diagram, backend,
+                                              page.participants,
+                                              _compact(page.messages),
+                                              note_formatter)))
+            if len(in_flight) >= 2 * workers:
+                page, future = in_flight.popleft()
+                yield page, future.result()
+        while in_flight:
+            page, future = in_flight.popleft()
+            yield page, future.result()
+
+
+def _compact(messages):
+    """Reduce the messages to plain tuples, which are cheaper to pickle,
+    keeping only what their data tells about their notes
+    """
+    return [(msg.category.value, msg.src, msg.dst, msg.text, msg.note,
+             msg.when, formatting.note_info(msg)) for msg in messages]
+
+
+def _render_diagram(backend, participants, compact_messages,
+                    note_formatter=None):
+    messages = (make_message(
+        category=Category(category),
+        src=src,
+        dst=dst,
+        text=text,
+        note=note,
+        when=when,
+        data=info) for (category, src, dst, text, note, when,
+                        info) in compact_messages)
+    return seqdiag.draw(
+        messages=messages,
+        backend=backend,
+        participants=participants,
+        note_formatter=note_formatter)
+
+
+def _page_file_name(output_file_path, number):
+    root, ext = os.path.splitext(os.path.basename(output_file_path))
+    return '%s-%d%s' % (root, number, ext or '.html')
+
+
+def _with_next(iterable):
+    "Pair every item with the one that follows it, or None for the last one"
+    iterator = iter(iterable)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    for following in iterator:
+        yield current, following
+        current = following
+    yield current, None
+
+
+def _estimated_size(msg):
+    "Approximate the size of the description of a message and its note"
+    size = len(msg.src) + len(msg.dst) + len(msg.text)
+    if isinstance(msg.note, (string_types, binary_type)):
+        size += len(msg.note)
+    return size
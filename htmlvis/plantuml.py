@@ -16,35 +16,54 @@ NOTE_LOCATION = {
     Category.request: 'right',
     Category.response: 'left',
 }
+PARTICIPANT_DECLARATION = 'participant "{name}"\n'
+IMG_ELEMENT = '<img src="http://www.plantuml.com/plantuml/svg/%s">'
 
 
-def html_image(messages):
+def html_image(messages,
+               output=None,
+               participants=(),
+               note_formatter=None):
     """
     Generate an HTML img element with an SVG sequence diagram
+
+    The messages can be any iterable, including a generator. If a file-like
+    output is given, the element is written to it while it is being encoded
+    instead of being returned. The given participants are declared upfront
+    so that they are drawn first and in that order.
     """
     logger.debug('Generating sequence diagram')
-    textual_repr = _generate_textual_representation(messages)
-    encoded_repr = plantuml_text_encoding.encode(textual_repr)
-    html = '<img src="http://www.plantuml.com/plantuml/svg/%s">' % encoded_repr
-    return html
+    textual_repr = _generate_textual_representation(
+        messages, participants, note_formatter)
+    if output is None:
+        encoded_repr = plantuml_text_encoding.encode(textual_repr)
+        return IMG_ELEMENT % encoded_repr
+    element_start, element_end = IMG_ELEMENT.split('%s')
+    output.write(element_start)
+    for encoded_chunk in plantuml_text_encoding.iterencode(textual_repr):
+        output.write(encoded_chunk)
+    output.write(element_end)
 
 
-def _generate_textual_representation(messages):
-    textual_repr = ''
+def _generate_textual_representation(messages,
+                                     participants=(),
+                                     note_formatter=None):
+    """Yield the textual representation of the messages, one message or note
+    at a time, so that the whole diagram description is never held in memory
+    """
+    format_note = (formatting.NoteFormatter()
+                   if note_formatter is None else note_formatter)
+    for participant in participants:
+        yield PARTICIPANT_DECLARATION.format(name=_sanitize(participant))
     for msg in messages:
-        textual_repr += MSG_TO_TEXTUAL_REPR[msg.category].format(
+        yield MSG_TO_TEXTUAL_REPR[msg.category].format(
             source=_sanitize(msg.src),
             destination=_sanitize(msg.dst),
             text=msg.text)
-        formatters = [
-            formatting.prettify_json, formatting.shorten_long_strings
-        ]
-        for fmt in formatters:
-            fmt(msg)
+        format_note(msg)
         if msg.note:
-            textual_repr += 'note ' + NOTE_LOCATION[
-                msg.category] + '\n' + _indent(msg.note) + '\nend note'
-    return textual_repr
+            yield 'note ' + NOTE_LOCATION[
+                msg.category] + '\n' + _indent(msg.note) + '\nend note\n'
 
 
 def _sanitize(participant):
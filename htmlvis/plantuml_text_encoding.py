@@ -5,21 +5,76 @@ A text description has to be:
 - Encoded in UTF-8
 - Compressed using Deflate algorithm
 - Reencoded in ASCII using a transformation "close to base64"
+
+The description is compressed as a raw Deflate stream, which is what
+zlib.compress produces once its 2-byte header and 4-byte checksum are
+stripped, so it can also be encoded incrementally with iterencode.
+
+The transformation only differs from base64 in its alphabet, so the encoder
+delegates the bit shuffling to the standard library and then translates
+the result. The original byte-by-byte implementation is kept as a reference.
 """
+import base64
 import zlib
 
 from six.moves import zip_longest
 from six import string_types
 
+try:
+    _maketrans = bytes.maketrans
+except AttributeError:  # Python 2
+    from string import maketrans as _maketrans
+
 SIXBITOFFSET = [48] * 10 + [55] * 26 + [61] * 26 + [-17] + [32]
 
+BASE64_ALPHABET = (b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                   b'abcdefghijklmnopqrstuvwxyz'
+                   b'0123456789+/')
+PLANTUML_ALPHABET = (b'0123456789'
+                     b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                     b'abcdefghijklmnopqrstuvwxyz'
+                     b'-_')
+# base64 pads incomplete groups with '=' whereas PlantUML pads the input with
+# zero bytes, which always yields the character for the 6-bit group 0
+BASE64_TO_PLANTUML = _maketrans(BASE64_ALPHABET + b'=',
+                                PLANTUML_ALPHABET + b'0')
+
 
 def encode(text):
-    "Apply PlantUML text encoding to a diagram description"
-    assert isinstance(text, string_types)
-    utf8_encoded_data = text.encode('utf-8')
-    compressed_data = bytearray(zlib.compress(utf8_encoded_data)[2:-4])
-    return _encode_similar_to_base64(compressed_data)
+    """Apply PlantUML text encoding to a diagram description, given either as
+    a string or as an iterable of text chunks
+    """
+    if isinstance(text, string_types):
+        text = [text]
+    return ''.join(iterencode(text))
+
+
+def iterencode(chunks):
+    """Apply PlantUML text encoding to a diagram description given as an
+    iterable of text chunks, yielding the encoded text as it becomes available
+
+    Only the compressor state and up to two bytes of an incomplete 3-byte
+    group are kept between chunks.
+    """
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                  -zlib.MAX_WBITS)
+    pending = b''
+    for chunk in chunks:
+        assert isinstance(chunk, string_types)
+        pending += compressor.compress(chunk.encode('utf-8'))
+        complete_groups_len = len(pending) - len(pending) % 3
+        if complete_groups_len:
+            yield _encode_with_base64(pending[:complete_groups_len])
+            pending = pending[complete_groups_len:]
+    pending += compressor.flush()
+    if pending:
+        yield _encode_with_base64(pending)
+
+
+def _encode_with_base64(byte_seq):
+    "Encode a byte sequence with base64 and translate it to PlantUML alphabet"
+    return base64.b64encode(byte_seq).translate(BASE64_TO_PLANTUML).decode(
+        'ascii')
 
 
 def _encode_similar_to_base64(byte_seq):
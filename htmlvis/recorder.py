@@ -0,0 +1,127 @@
+"""
+Background recording of captured transactions, so that building them is
+kept off the threads of the application being sniffed
+"""
+import logging
+import threading
+from collections import deque
+
+BLOCK = 'block'
+DROP = 'drop'
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRecorder(object):
+    """Build and record transactions in a worker thread.
+
+    Sniffers submit the raw data they capture together with the function
+    that turns it into a Transaction and records it. Submitting is only an
+    append to a deque, which doesn't take a lock. When more than
+    max_pending submissions are waiting, the overflow policy either drops
+    the new one (DROP) or makes the submitting thread wait (BLOCK).
+    """
+
+    def __init__(self, max_pending=10000, overflow=BLOCK):
+        if overflow not in (BLOCK, DROP):
+            raise ValueError('Unknown overflow policy: %s' % overflow)
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.dropped = 0
+        self.failed = 0
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._drained = threading.Event()
+        self._counters_lock = threading.Lock()
+        # Orders flushes with closing, so that no flush waits behind the stop
+        self._closing_lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._run, name='htmlvis-recorder')
+        self._worker.daemon = True
+        self._worker.start()
+
+    def submit(self, record, *raw):
+        """Call record(*raw) in the worker thread.
+        Return False if the submission was dropped, which is always the case
+        once the recorder is closed.
+        """
+        if len(self._pending) >= self.max_pending and not self._closed:
+            if self.overflow == DROP:
+                self._count_dropped()
+                return False
+            self._wait_for_room()
+        if self._closed:
+            self._count_dropped()
+            return False
+        self._enqueue((record, raw))
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far has been recorded.
+        Return False if the timeout expired first.
+        """
+        with self._closing_lock:
+            if self._closed:
+                # close() already waited for everything to be recorded
+                return True
+            done = threading.Event()
+            self._enqueue(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Record everything submitted so far and stop the worker thread.
+        Submissions made afterwards are dropped.
+        """
+        with self._closing_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._enqueue(_STOP)
+        self._worker.join()
+        # Whatever was submitted while closing will never be recorded
+        while self._pending:
+            self._pending.popleft()
+            self._count_dropped()
+
+    def _count_dropped(self):
+        with self._counters_lock:
+            self.dropped += 1
+
+    def _enqueue(self, item):
+        self._pending.append(item)
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def _wait_for_room(self):
+        while len(self._pending) >= self.max_pending and not self._closed:
+            self._drained.clear()
+            if len(self._pending) >= self.max_pending:
+                self._drained.wait(0.1)
+
+    def _run(self):
+        pending = self._pending
+        while True:
+            try:
+                item = pending.popleft()
+            except IndexError:
+                self._wakeup.clear()
+                if not pending:
+                    self._wakeup.wait()
+                continue
+            if not self._drained.is_set():
+                self._drained.set()
+            if item is _STOP:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            record, raw = item
+            try:
+                record(*raw)
+            except Exception:
+                logger.exception('Could not record a captured transaction')
+                with self._counters_lock:
+                    self.failed += 1
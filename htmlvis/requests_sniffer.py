@@ -1,66 +1,110 @@
-import re
 import time
 
-from .htmlvis import HTTPSniffer, Request, Response, Transaction
-
-try:
-    from urllib.parse import urlsplit
-except ImportError:
-    from urlparse import urlsplit
+from .body import Body, TeeReader
+from .htmlvis import (HTTPSniffer, Request, Response, Transaction,
+                      intern_text)
+from .urls import URLParser
 
 
 class RequestsSniffer(HTTPSniffer):
     """An HTTP sniffer than can be hooked to the requests library
     See http://docs.python-requests.org/en/master/user/advanced/
+
+    Response bodies are kept as raw bytes and decoded with their declared
+    encoding when rendered. The bodies of streamed responses are not
+    downloaded by the sniffer: up to stream_body_bytes of them are kept as
+    the application reads them, or none by default.
+
+    URLs are split by the given URLParser, whose route rules, if any, give
+    the route of each request. See HTTPSniffer for the include and exclude
+    capture rules.
     """
 
-    def __init__(self, client_name, server_name):
-        super(RequestsSniffer, self).__init__()
-        self._transactions = []
-        self._client_name = client_name
-        self._server_name = server_name
+    def __init__(self,
+                 client_name,
+                 server_name,
+                 store=None,
+                 recorder=None,
+                 stream_body_bytes=0,
+                 headers=None,
+                 url_parser=None,
+                 include=(),
+                 exclude=()):
+        super(RequestsSniffer, self).__init__(
+            store=store,
+            recorder=recorder,
+            headers=headers,
+            include=include,
+            exclude=exclude)
+        self._client_name = intern_text(client_name)
+        self._server_name = intern_text(server_name)
+        self._stream_body_bytes = stream_body_bytes
+        self._url_parser = URLParser() if url_parser is None else url_parser
         self._start_time = time.time()
 
     @property
     def transactions(self):
-        return self._transactions
+        return self._store
 
     def restart(self):
+        # Pending transactions belong to the capture being discarded
+        self.flush()
         self._start_time = time.time()
-        del self._transactions[:]
+        self._store.clear()
+        self._reset_order()
 
     def __call__(self, response, *args, **kwargs):
-        transaction = Transaction(
+        url = None
+        if self._filter is not None:
+            request = response.request
+            url = self._url_parser.parse(request.url)
+            if not self._filter.captures(request.method, response.status_code,
+                                         url.host, url.path):
+                return
+        body = self._capture_body(response, kwargs.get('stream', False))
+        # Timed here, as the transaction may be built after a restart
+        self._capture(self._build_transaction, response, body, url,
+                      time.time() - self._start_time)
+
+    def _capture_body(self, response, stream):
+        if not stream:
+            # requests reads the content right after the hooks anyway
+            return Body(content=response.content, encoding=response.encoding)
+        if not self._stream_body_bytes:
+            return None
+        body = Body(encoding=response.encoding, limit=self._stream_body_bytes)
+        response.raw = TeeReader(response.raw, body)
+        return body
+
+    def _build_transaction(self, response, body, url, response_elapsed_time):
+        return Transaction(
             client_name=self._client_name,
             server_name=self._server_name,
-            request=self._extract_request_info(response),
-            response=self._extract_response_info(response))
-        self._transactions.append(transaction)
+            request=self._extract_request_info(response, url,
+                                               response_elapsed_time),
+            response=self._extract_response_info(response, body,
+                                                 response_elapsed_time))
 
-    def _extract_request_info(self, response):
+    def _extract_request_info(self, response, url, response_elapsed_time):
         request = response.request
-        response_elapsed_time = time.time() - self._start_time
         request_elapsed_time = max(
             response_elapsed_time - response.elapsed.total_seconds(), 0)
-        parsed_url = urlsplit(request.url)
-        url_host = parsed_url.netloc
-        url_path = re.sub('.*' + url_host, '', request.url)
-        headers = {key: value for key, value in request.headers.items()}
+        if url is None:
+            url = self._url_parser.parse(request.url)
         return Request(
             body=request.body,
             elapsed=request_elapsed_time,
-            headers=headers,
-            method=request.method,
-            url_path=url_path)
+            headers=self._headers.capture(request.headers),
+            method=intern_text(request.method),
+            url_path=url.target,
+            route=url.route)
 
-    def _extract_response_info(self, response):
-        response_elapsed_time = time.time() - self._start_time
+    def _extract_response_info(self, response, body, response_elapsed_time):
         status_and_reason = str(response.status_code)
         if response.reason:
             status_and_reason += ' ' + response.reason
-        headers = {key: value for key, value in response.headers.items()}
         return Response(
-            body=response.text,
+            body=body,
             elapsed=response_elapsed_time,
-            headers=headers,
-            status=status_and_reason)
+            headers=self._headers.capture(response.headers),
+            status=intern_text(status_and_reason))
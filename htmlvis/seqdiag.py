@@ -1,5 +1,28 @@
-from . import plantuml
+from . import plantuml, svg
 
+# Functions that render messages as an HTML element, by backend name
+BACKENDS = {
+    'plantuml': plantuml.html_image,
+    'svg': svg.html_image,
+}
 
-def draw(messages):
-    return plantuml.html_image(messages)
+
+def draw(messages,
+         output=None,
+         backend='plantuml',
+         participants=(),
+         note_formatter=None):
+    """Render the messages as an HTML sequence diagram with the given
+    backend: 'plantuml' links to an image rendered by plantuml.com while
+    'svg' renders an inline SVG element locally. The given participants are
+    drawn first, in order, whether they take part in the messages or not.
+    """
+    try:
+        html_image = BACKENDS[backend]
+    except KeyError:
+        raise ValueError('Unknown sequence diagram backend: %s' % backend)
+    return html_image(
+        messages,
+        output=output,
+        participants=participants,
+        note_formatter=note_formatter)
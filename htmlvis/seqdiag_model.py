@@ -11,7 +11,7 @@ def assert_not_empty(message, attribute, value):
             '{attribute} cannot be empty'.format(attribute=attribute.name))
 
 
-@attrs
+@attrs(slots=True)
 class Message(object):
     category = attrib()
     src = attrib(validator=assert_not_empty)
@@ -20,3 +20,19 @@ class Message(object):
     note = attrib()
     when = attrib()
     data = attrib(default=Factory(dict))
+
+
+def make_message(category, src, dst, text, note, when, data,
+                 _new=object.__new__):
+    """Build a Message without validating it or computing defaults, for
+    bulk conversions of data that is known to be well formed
+    """
+    msg = _new(Message)
+    msg.category = category
+    msg.src = src
+    msg.dst = dst
+    msg.text = text
+    msg.note = note
+    msg.when = when
+    msg.data = data
+    return msg
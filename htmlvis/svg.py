@@ -0,0 +1,201 @@
+"""
+Render sequence diagrams as inline SVG, without any network round trip.
+
+The layout is computed in a single pass over the messages: participants
+get a column the first time they show up, and every message and note is
+stacked below the previous one.
+"""
+import logging
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from . import formatting
+from .seqdiag_model import Category
+
+logger = logging.getLogger(__name__)
+
+MARGIN = 20
+FONT_SIZE = 13
+# Approximate advance of a character, used to size boxes without fonts
+CHAR_WIDTH = 8
+LINE_HEIGHT = 16
+PARTICIPANT_MIN_WIDTH = 120
+PARTICIPANT_PADDING = 10
+PARTICIPANT_GAP = 60
+PARTICIPANT_HEIGHT = 30
+MESSAGE_HEIGHT = 30
+SELF_MESSAGE_WIDTH = 30
+SELF_MESSAGE_HEIGHT = 14
+NOTE_PADDING = 6
+NOTE_GAP = 10
+
+NOTE_ON_THE_RIGHT = {
+    Category.request: True,
+    Category.response: False,
+}
+LINE_STYLE = {
+    Category.request: '',
+    Category.response: ' stroke-dasharray="5,3"',
+}
+
+SVG_START = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+    'height="{height}" viewBox="0 0 {width} {height}" '
+    'font-family="sans-serif" font-size="{font_size}">'
+    '<defs><marker id="htmlvis-arrow" markerWidth="10" markerHeight="8" '
+    'refX="10" refY="4" orient="auto"><path d="M0,0 L10,4 L0,8 z"/>'
+    '</marker></defs><g transform="translate({offset},0)">')
+SVG_END = '</g></svg>'
+PARTICIPANT = (
+    '<rect x="{x}" y="{y}" width="{width}" height="{height}" fill="#fefece" '
+    'stroke="#a80036"/><text x="{center}" y="{text_y}" '
+    'text-anchor="middle">{name}</text><line x1="{center}" y1="{top}" '
+    'x2="{center}" y2="{bottom}" stroke="#a80036" stroke-dasharray="5,5"/>')
+ARROW = ('<line x1="{x1}" y1="{y}" x2="{x2}" y2="{y}" stroke="#a80036"'
+         '{style} marker-end="url(#htmlvis-arrow)"/>')
+SELF_ARROW = ('<polyline points="{x},{y} {right},{y} {right},{bottom} '
+              '{x},{bottom}" fill="none" stroke="#a80036"{style} '
+              'marker-end="url(#htmlvis-arrow)"/>')
+LABEL = '<text x="{x}" y="{y}" text-anchor="{anchor}">{text}</text>'
+NOTE = ('<rect x="{x}" y="{y}" width="{width}" height="{height}" '
+        'fill="#fbfb77" stroke="#a80036"/><text x="{text_x}" y="{text_y}" '
+        'font-family="monospace" xml:space="preserve">{lines}</text>')
+NOTE_LINE = '<tspan x="{x}" dy="{dy}">{text}</tspan>'
+
+
+def html_image(messages,
+               output=None,
+               participants=(),
+               note_formatter=None):
+    """
+    Generate an inline HTML svg element with a sequence diagram
+
+    The messages can be any iterable, including a generator. If a file-like
+    output is given, the element is written to it instead of being returned.
+    The given participants get the first columns, in that order.
+    """
+    logger.debug('Generating SVG sequence diagram')
+    layout = _Layout(note_formatter)
+    for participant in participants:
+        layout.add_participant(participant)
+    for msg in messages:
+        layout.add(msg)
+    chunks = layout.render()
+    if output is None:
+        return ''.join(chunks)
+    for chunk in chunks:
+        output.write(chunk)
+
+
+class _Layout(object):
+    def __init__(self, note_formatter=None):
+        self._participants = OrderedDict()
+        self._next_participant_left = 0
+        self._elements = []
+        self._bottom = MARGIN + PARTICIPANT_HEIGHT
+        self._min_x = 0
+        self._max_x = 0
+        self._format_note = (formatting.NoteFormatter()
+                             if note_formatter is None else note_formatter)
+
+    def add(self, msg):
+        src_x = self._participant_center(msg.src)
+        dst_x = self._participant_center(msg.dst)
+        style = LINE_STYLE[msg.category]
+        arrow_y = self._bottom + MESSAGE_HEIGHT
+        if src_x == dst_x:
+            self._add_self_message(msg, src_x, arrow_y, style)
+            arrow_y += SELF_MESSAGE_HEIGHT
+        else:
+            self._elements.append(
+                LABEL.format(
+                    x=(src_x + dst_x) // 2,
+                    y=arrow_y - 4,
+                    anchor='middle',
+                    text=escape(msg.text)))
+            self._elements.append(
+                ARROW.format(x1=src_x, x2=dst_x, y=arrow_y, style=style))
+        self._bottom = arrow_y
+        self._format_note(msg)
+        if msg.note:
+            self._add_note(msg.note, dst_x, NOTE_ON_THE_RIGHT[msg.category])
+
+    def add_participant(self, name):
+        self._participant_center(name)
+
+    def render(self):
+        """Yield the SVG element in chunks"""
+        offset = MARGIN - self._min_x
+        bottom = self._bottom + MARGIN
+        yield SVG_START.format(
+            width=self._max_x + offset + MARGIN,
+            height=bottom + MARGIN,
+            font_size=FONT_SIZE,
+            offset=offset)
+        for name, (left, width) in self._participants.items():
+            yield PARTICIPANT.format(
+                x=left,
+                y=MARGIN,
+                width=width,
+                height=PARTICIPANT_HEIGHT,
+                center=left + width // 2,
+                text_y=MARGIN + PARTICIPANT_HEIGHT // 2 + FONT_SIZE // 3,
+                name=escape(name),
+                top=MARGIN + PARTICIPANT_HEIGHT,
+                bottom=bottom)
+        for element in self._elements:
+            yield element
+        yield SVG_END
+
+    def _participant_center(self, name):
+        if name not in self._participants:
+            width = max(PARTICIPANT_MIN_WIDTH,
+                        len(name) * CHAR_WIDTH + 2 * PARTICIPANT_PADDING)
+            self._participants[name] = (self._next_participant_left, width)
+            self._next_participant_left += width + PARTICIPANT_GAP
+            self._extend(self._next_participant_left - PARTICIPANT_GAP)
+        left, width = self._participants[name]
+        return left + width // 2
+
+    def _add_self_message(self, msg, x, y, style):
+        right = x + SELF_MESSAGE_WIDTH
+        self._elements.append(
+            LABEL.format(
+                x=right + 4, y=y - 4, anchor='start', text=escape(msg.text)))
+        self._elements.append(
+            SELF_ARROW.format(
+                x=x, y=y, right=right, bottom=y + SELF_MESSAGE_HEIGHT,
+                style=style))
+        self._extend(right + 4 + len(msg.text) * CHAR_WIDTH)
+
+    def _add_note(self, note, anchor_x, on_the_right):
+        lines = note.splitlines() or ['']
+        width = max(len(line) for line in lines) * CHAR_WIDTH + (
+            2 * NOTE_PADDING)
+        height = len(lines) * LINE_HEIGHT + 2 * NOTE_PADDING
+        if on_the_right:
+            left = anchor_x + NOTE_GAP
+        else:
+            left = anchor_x - NOTE_GAP - width
+        top = self._bottom + NOTE_GAP
+        text_x = left + NOTE_PADDING
+        tspans = ''.join(
+            NOTE_LINE.format(
+                x=text_x, dy=0 if index == 0 else LINE_HEIGHT,
+                text=escape(line)) for index, line in enumerate(lines))
+        self._elements.append(
+            NOTE.format(
+                x=left,
+                y=top,
+                width=width,
+                height=height,
+                text_x=text_x,
+                text_y=top + NOTE_PADDING + FONT_SIZE,
+                lines=tspans))
+        self._extend(left)
+        self._extend(left + width)
+        self._bottom = top + height
+
+    def _extend(self, x):
+        self._min_x = min(self._min_x, x)
+        self._max_x = max(self._max_x, x)
@@ -0,0 +1,281 @@
+"""
+Containers where sniffers keep the transactions they capture
+"""
+import heapq
+import threading
+from collections import deque
+
+from .body import Body, body_size
+
+EVICT_OLDEST = 'oldest'
+EVICT_BODIES_FIRST = 'bodies_first'
+
+
+class TransactionStore(object):
+    """A container of Transaction objects that keeps them in capture order
+    and can be indexed and iterated like a list
+    """
+
+    @property
+    def ordered(self):
+        """False if the store can't tell whether its transactions are in
+        chronological order, e.g. because they come from several threads
+        """
+        return True
+
+    def append(self, transaction):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def snapshot_and_reset(self):
+        """Remove every transaction from the store and return them in a list.
+
+        Stores that are safe to use from several threads do it atomically,
+        so that every transaction ends up in exactly one snapshot.
+        """
+        snapshot = list(self)
+        self.clear()
+        return snapshot
+
+    def __iter__(self):
+        raise NotImplementedError()
+
+    def __len__(self):
+        raise NotImplementedError()
+
+    def __getitem__(self, index):
+        raise NotImplementedError()
+
+
+class ListStore(TransactionStore):
+    """Unbounded store that keeps every transaction.
+
+    If a BodyStore is given, identical bodies are shared through it.
+    """
+
+    def __init__(self, bodies=None):
+        self._bodies = bodies
+        self._transactions = []
+
+    def append(self, transaction):
+        if self._bodies is not None:
+            _share_bodies(self._bodies, transaction)
+        self._transactions.append(transaction)
+
+    def clear(self):
+        self.snapshot_and_reset()
+
+    def snapshot_and_reset(self):
+        snapshot, self._transactions = self._transactions, []
+        if self._bodies is not None:
+            for transaction in snapshot:
+                _release_bodies(self._bodies, transaction)
+        return snapshot
+
+    def __iter__(self):
+        return iter(self._transactions)
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def __getitem__(self, index):
+        return self._transactions[index]
+
+
+class RingBufferStore(TransactionStore):
+    """Fixed-capacity store that keeps the most recent transactions.
+
+    Besides the number of transactions, the total size of the request and
+    response bodies can be capped. When it is exceeded, the eviction policy
+    decides what goes first: EVICT_OLDEST drops the oldest transactions,
+    while EVICT_BODIES_FIRST drops the bodies of the oldest transactions and
+    keeps the rest of their data.
+
+    If a BodyStore is given, identical bodies are shared through it. They
+    still count once per transaction towards max_body_bytes.
+    """
+
+    def __init__(self,
+                 capacity,
+                 max_body_bytes=None,
+                 eviction=EVICT_OLDEST,
+                 bodies=None):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        if eviction not in (EVICT_OLDEST, EVICT_BODIES_FIRST):
+            raise ValueError('Unknown eviction policy: %s' % eviction)
+        self.capacity = capacity
+        self.max_body_bytes = max_body_bytes
+        self.eviction = eviction
+        self.evicted_transactions = 0
+        self.evicted_bodies = 0
+        self._bodies = bodies
+        self._transactions = deque()
+        self._body_sizes = deque()
+        self._body_bytes = 0
+        # Number of transactions, starting from the oldest one, whose bodies
+        # have been dropped already
+        self._without_bodies = 0
+
+    @property
+    def body_bytes(self):
+        """Total size of the bodies currently kept"""
+        return self._body_bytes
+
+    def append(self, transaction):
+        if self._bodies is not None:
+            _share_bodies(self._bodies, transaction)
+        size = (body_size(transaction.request.body) +
+                body_size(transaction.response.body))
+        self._transactions.append(transaction)
+        self._body_sizes.append(size)
+        self._body_bytes += size
+        if len(self._transactions) > self.capacity:
+            self._evict_oldest()
+        if self.max_body_bytes is not None:
+            while self._body_bytes > self.max_body_bytes:
+                if (self.eviction == EVICT_BODIES_FIRST and
+                        self._without_bodies < len(self._transactions)):
+                    self._drop_oldest_bodies()
+                else:
+                    self._evict_oldest()
+
+    def clear(self):
+        if self._bodies is not None:
+            for transaction in self._transactions:
+                _release_bodies(self._bodies, transaction)
+        self._transactions.clear()
+        self._body_sizes.clear()
+        self._body_bytes = 0
+        self._without_bodies = 0
+
+    def __iter__(self):
+        # Iterate a copy, since diagrams are rendered lazily while
+        # transactions are still being captured
+        return iter(list(self._transactions))
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def __getitem__(self, index):
+        return self._transactions[index]
+
+    def _evict_oldest(self):
+        transaction = self._transactions.popleft()
+        if self._bodies is not None:
+            _release_bodies(self._bodies, transaction)
+        self._body_bytes -= self._body_sizes.popleft()
+        self._without_bodies = max(self._without_bodies - 1, 0)
+        self.evicted_transactions += 1
+
+    def _drop_oldest_bodies(self):
+        transaction = self._transactions[self._without_bodies]
+        if self._bodies is not None:
+            _release_bodies(self._bodies, transaction)
+        for message in (transaction.request, transaction.response):
+            if message.body:
+                message.body = None
+                self.evicted_bodies += 1
+        self._body_bytes -= self._body_sizes[self._without_bodies]
+        self._body_sizes[self._without_bodies] = 0
+        self._without_bodies += 1
+
+
+class PerThreadStore(TransactionStore):
+    """Unbounded store where every thread records into its own buffer, so
+    that threads capturing concurrently never wait for each other.
+
+    Each buffer has a lock that is only contended while a snapshot retires
+    it. Reading merges the buffers by response elapsed time, which is the
+    order in which each thread records its transactions.
+    """
+
+    def __init__(self):
+        self._registry_lock = threading.Lock()
+        self._local = threading.local()
+        self._buffers = []
+
+    @property
+    def ordered(self):
+        return len(self._buffers) <= 1
+
+    def append(self, transaction):
+        while True:
+            buffer = self._thread_buffer()
+            with buffer.lock:
+                if not buffer.retired:
+                    buffer.transactions.append(transaction)
+                    return
+
+    def clear(self):
+        self.snapshot_and_reset()
+
+    def snapshot_and_reset(self):
+        with self._registry_lock:
+            buffers, self._buffers = self._buffers, []
+        for buffer in buffers:
+            with buffer.lock:
+                buffer.retired = True
+        return _merge_by_response_time(
+            [buffer.transactions for buffer in buffers])
+
+    def __iter__(self):
+        return iter(self._merged())
+
+    def __len__(self):
+        return sum(len(buffer.transactions) for buffer in self._buffers)
+
+    def __getitem__(self, index):
+        return self._merged()[index]
+
+    def _merged(self):
+        copies = []
+        for buffer in list(self._buffers):
+            with buffer.lock:
+                copies.append(list(buffer.transactions))
+        return _merge_by_response_time(copies)
+
+    def _thread_buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.retired:
+            buffer = self._local.buffer = _ThreadBuffer()
+            with self._registry_lock:
+                self._buffers.append(buffer)
+        return buffer
+
+
+class _ThreadBuffer(object):
+    __slots__ = ('lock', 'retired', 'transactions')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.retired = False
+        self.transactions = []
+
+
+def _merge_by_response_time(transaction_lists):
+    if len(transaction_lists) == 1:
+        return transaction_lists[0]
+    decorated = [[(transaction.response.elapsed, list_index, position,
+                   transaction)
+                  for position, transaction in enumerate(transactions)]
+                 for list_index, transactions in enumerate(transaction_lists)]
+    return [item[-1] for item in heapq.merge(*decorated)]
+
+
+def _share_bodies(bodies, transaction):
+    for message in (transaction.request, transaction.response):
+        if isinstance(message.body, Body):
+            message.body.content = bodies.add(message.body.content)
+        else:
+            message.body = bodies.add(message.body)
+
+
+def _release_bodies(bodies, transaction):
+    for message in (transaction.request, transaction.response):
+        if isinstance(message.body, Body):
+            bodies.release(message.body.content)
+        else:
+            bodies.release(message.body)
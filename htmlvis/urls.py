@@ -0,0 +1,97 @@
+"""
+Splitting of captured URLs into host, path and query, and collapsing of
+paths into routes such as /users/{id}
+"""
+import re
+from collections import OrderedDict
+
+from attr import attrib, attrs
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+# Everything up to the path: scheme, credentials, host and port
+_PREFIX = re.compile(r'[^:/?#]*://[^/?#]*')
+
+# Route rules that collapse numeric and UUID path segments
+ID_RULES = (
+    (r'/\d+(?=/|$)', '/{id}'),
+    (r'/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+     r'[0-9a-fA-F]{12}(?=/|$)', '/{uuid}'),
+)
+
+
+@attrs(slots=True)
+class ParsedURL(object):
+    """The parts of a URL that sequence diagrams are interested in.
+    The target is everything after the host, as sent in the request line.
+    """
+    host = attrib()
+    path = attrib()
+    query = attrib()
+    target = attrib()
+    route = attrib(default=None)
+
+
+class URLParser(object):
+    """Split URLs without building or compiling anything per URL.
+
+    Hosts are looked up by URL prefix in an LRU cache of up to
+    max_prefixes entries. If route rules are given, as (regular
+    expression, replacement) pairs, they are compiled into a single
+    pattern that turns each path into its route.
+    """
+
+    def __init__(self, route_rules=None, max_prefixes=1024):
+        self._hosts = _LRUCache(max_prefixes)
+        self._routes = None
+        if route_rules:
+            self._replacements = dict(
+                ('rule%d' % index, replacement)
+                for index, (_, replacement) in enumerate(route_rules))
+            self._routes = re.compile('|'.join(
+                '(?P<rule%d>%s)' % (index, pattern)
+                for index, (pattern, _) in enumerate(route_rules)))
+
+    def parse(self, url):
+        match = _PREFIX.match(url)
+        prefix = match.group() if match else ''
+        host = self._hosts.get(prefix)
+        if host is None:
+            host = self._hosts[prefix] = urlsplit(prefix).netloc
+        target = url[len(prefix):]
+        path, _, query = target.split('#', 1)[0].partition('?')
+        route = None
+        if self._routes is not None:
+            route = self._routes.sub(self._replace, path)
+        return ParsedURL(
+            host=host, path=path, query=query, target=target, route=route)
+
+    def _replace(self, match):
+        return self._replacements[match.lastgroup]
+
+
+class _LRUCache(object):
+    "A mapping that forgets its least recently used keys beyond max_size"
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def get(self, key):
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            return None
+        self._items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
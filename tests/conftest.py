@@ -1,8 +1,94 @@
+import sys
+
+import pytest
+
+# htmlvis only exposes its test-only names if this is set when it is first
+# imported, which the helpers below do
+sys._called_from_test = True
+
+from htmlvis import seqdiag_model  # noqa: E402
+from htmlvis.htmlvis import (HTTPSniffer, Request, Response,  # noqa: E402
+                             Transaction)
+
+
 def pytest_configure(config):
-    import sys
     sys._called_from_test = True
 
 
 def pytest_unconfigure(config):
-    import sys
     del sys._called_from_test
+
+
+class StoreSniffer(HTTPSniffer):
+    """A sniffer whose transactions are its store, where the given ones are
+    recorded upfront
+    """
+
+    def __init__(self, transactions=(), **kwargs):
+        super(StoreSniffer, self).__init__(**kwargs)
+        for transaction in transactions:
+            self._record(transaction)
+
+    @property
+    def transactions(self):
+        return self._store
+
+
+def make_transaction(index=0,
+                     request_elapsed=None,
+                     response_elapsed=None,
+                     client_name='client',
+                     server_name='server',
+                     method='GET',
+                     url_path=None,
+                     route=None,
+                     status='200 OK',
+                     request_body='',
+                     response_body='',
+                     request_headers=None,
+                     response_headers=None):
+    """A transaction requesting /<index> at <index> seconds, and responded at
+    the same time, unless told otherwise
+    """
+    if request_elapsed is None:
+        request_elapsed = index
+    return Transaction(
+        client_name=client_name,
+        server_name=server_name,
+        request=Request(
+            body=request_body,
+            elapsed=request_elapsed,
+            headers={} if request_headers is None else request_headers,
+            method=method,
+            url_path='/%d' % index if url_path is None else url_path,
+            route=route),
+        response=Response(
+            body=response_body,
+            elapsed=(request_elapsed
+                     if response_elapsed is None else response_elapsed),
+            headers={} if response_headers is None else response_headers,
+            status=status))
+
+
+@pytest.fixture
+def sample_request():
+    return seqdiag_model.Message(
+        category=seqdiag_model.Category.request,
+        src='Client A',
+        dst='Server A',
+        text='hi there',
+        when=0.0,
+        note='multi\nline',
+        data='')
+
+
+@pytest.fixture
+def sample_response():
+    return seqdiag_model.Message(
+        category=seqdiag_model.Category.response,
+        src='Server A',
+        dst='Client A',
+        text='hello',
+        when=0.0,
+        note='multi\nline',
+        data='')
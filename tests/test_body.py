@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import gc
+import hashlib
+import io
+import os
+import pickle
+
+import attr
+import pytest
+from htmlvis.body import (Body, BodyStore, SpooledBody, TeeIterable,
+                          TeeReader, as_text, body_size, spool)
+
+
+class TestBody(object):
+    def test_bodies_are_compared_by_their_raw_content(self):
+        assert Body(b'\xff', 'utf-8') != Body(b'\xfe', 'utf-8')
+        assert attr.evolve(Body(b'\xff'), encoding='latin-1').text == u'\xff'
+
+    def test_decodes_the_content_with_the_declared_encoding(self):
+        body = Body(content=u'caf\xe9'.encode('latin-1'), encoding='latin-1')
+        assert body.text == u'caf\xe9'
+
+    def test_decodes_utf8_if_no_encoding_is_declared(self):
+        assert Body(content=u'caf\xe9'.encode('utf-8')).text == u'caf\xe9'
+
+    def test_decodes_utf8_if_the_declared_encoding_is_unknown(self):
+        body = Body(content=b'cafe', encoding='no-such-charset')
+        assert body.text == u'cafe'
+
+    def test_replaces_undecodable_bytes(self):
+        assert Body(content=b'caf\xff').text == u'caf\ufffd'
+
+    def test_keeps_chunks_up_to_the_limit(self):
+        body = Body(limit=5)
+        body.keep(b'abc')
+        body.keep(b'def')
+        assert body.content == b'abcde'
+        assert body.truncated
+
+    def test_kept_chunks_are_joined_when_the_content_is_read(self):
+        body = Body()
+        for chunk in (b'abc', b'def', b'ghi'):
+            body.keep(chunk)
+        assert body._content == [b'', b'abc', b'def', b'ghi']
+        assert body.content == b'abcdefghi'
+        body.keep(b'jkl')
+        assert body.content == b'abcdefghijkl'
+        assert body == Body(b'abcdefghijkl')
+
+    def test_counts_the_size_of_everything_it_was_given(self):
+        body = Body(limit=2)
+        body.keep(b'abc')
+        assert body.size == 3
+        assert Body(content=b'abcd').size == 4
+
+    def test_is_not_truncated_if_everything_fits(self):
+        body = Body(limit=6)
+        body.keep(b'abc')
+        body.keep(b'def')
+        assert body.content == b'abcdef'
+        assert not body.truncated
+
+
+class TestTeeReader(object):
+    def test_keeps_what_the_application_reads(self):
+        body = Body()
+        reader = TeeReader(io.BytesIO(b'hello world'), body)
+        assert reader.read(5) == b'hello'
+        assert body.content == b'hello'
+        assert reader.read() == b' world'
+        assert body.content == b'hello world'
+
+    def test_keeps_at_most_the_limit_of_the_body(self):
+        body = Body(limit=4)
+        reader = TeeReader(io.BytesIO(b'hello world'), body)
+        assert reader.read() == b'hello world'
+        assert body.content == b'hell'
+        assert body.truncated
+
+    def test_delegates_everything_else_to_the_raw_stream(self):
+        raw = io.BytesIO(b'hello')
+        reader = TeeReader(raw, Body())
+        reader.close()
+        assert raw.closed
+
+    def test_digests_the_whole_stream_once_it_is_read(self):
+        body = Body(limit=1)
+        reader = TeeReader(io.BytesIO(b'hello'), body, digest='md5')
+        reader.read(3)
+        assert body.digest is None
+        reader.read()
+        reader.read()
+        assert body.digest == hashlib.md5(b'hello').hexdigest()
+
+
+class TestTeeIterable(object):
+    def test_keeps_the_chunks_as_they_are_iterated(self):
+        body = Body()
+        chunks = iter(TeeIterable([b'ab', b'cd'], body))
+        assert next(chunks) == b'ab'
+        assert body.content == b'ab'
+        assert list(chunks) == [b'cd']
+        assert body.content == b'abcd'
+
+    def test_keeps_text_chunks_encoded_with_the_body_encoding(self):
+        body = Body(encoding='latin-1')
+        list(TeeIterable([u'caf\xe9'], body))
+        assert body.content == b'caf\xe9'
+
+    def test_digests_the_whole_iterable(self):
+        body = Body(limit=1)
+        list(TeeIterable([b'ab', b'cd'], body, digest='sha1'))
+        assert body.size == 4
+        assert body.digest == hashlib.sha1(b'abcd').hexdigest()
+
+    def test_closing_closes_the_iterable(self):
+        def chunks():
+            try:
+                yield b'ab'
+                yield b'cd'
+            finally:
+                closed.append(True)
+
+        closed = []
+        tee = TeeIterable(chunks(), Body())
+        next(iter(tee))
+        tee.close()
+        assert closed == [True]
+
+
+def test_as_text_decodes_bytes_and_bodies():
+    assert as_text(b'caf\xc3\xa9') == u'caf\xe9'
+    assert as_text(Body(content=b'cafe')) == u'cafe'
+
+
+def test_as_text_leaves_text_and_none_untouched():
+    assert as_text(u'cafe') == u'cafe'
+    assert as_text(None) is None
+
+
+def test_body_size_counts_the_captured_content():
+    assert body_size(Body(content=b'abc')) == 3
+    assert body_size('abcd') == 4
+    assert body_size(None) == 0
+
+
+class TestSpool(object):
+    def test_keeps_the_whole_body_by_default(self):
+        body = spool(io.BytesIO(b'hello'))
+        assert body.content == b'hello'
+        assert body.size == body_size(body) == 5
+        assert not body.truncated
+
+    def test_keeps_at_most_the_limit(self):
+        body = spool(io.BytesIO(b'hello'), limit=2, digest='md5')
+        assert body.content == b'he'
+        assert body.truncated
+        assert body.size == 5
+        assert body.digest == hashlib.md5(b'hello').hexdigest()
+
+    def test_moves_large_bodies_to_disk(self):
+        body = spool(io.BytesIO(b'hello'), spool_bytes=2, digest='md5')
+        assert isinstance(body, SpooledBody)
+        assert body.content == b'hello'
+        assert body.size == body.kept == 5
+        assert body.digest == hashlib.md5(b'hello').hexdigest()
+        assert not isinstance(
+            spool(io.BytesIO(b'hello'), spool_bytes=10), SpooledBody)
+
+    def test_keeps_at_most_the_limit_on_disk(self):
+        body = spool(io.BytesIO(b'hello'), limit=3, spool_bytes=2)
+        assert body.content == b'hel'
+        assert body.truncated
+        assert body.size == 5
+
+    @pytest.mark.skipif(
+        not os.path.isdir('/proc/self/fd'), reason='needs /proc/self/fd')
+    def test_does_not_keep_files_open(self):
+        open_files = len(os.listdir('/proc/self/fd'))
+        bodies = [
+            spool(io.BytesIO(b'hello'), spool_bytes=2) for _ in range(20)
+        ]
+        assert len(os.listdir('/proc/self/fd')) == open_files
+        assert all(body.content == b'hello' for body in bodies)
+
+    def test_removes_the_file_along_with_the_body(self):
+        body = spool(io.BytesIO(b'hello'), spool_bytes=2)
+        path = body.path
+        del body
+        gc.collect()
+        assert not os.path.exists(path)
+
+    def test_is_pickled_as_a_plain_body(self):
+        body = spool(io.BytesIO(b'hello'), spool_bytes=2, encoding='ascii')
+        assert pickle.loads(pickle.dumps(body, 2)) == Body(
+            content=b'hello', encoding='ascii')
+
+    def test_is_turned_into_text(self):
+        body = spool(io.BytesIO(b'hello'), limit=3, spool_bytes=2)
+        assert as_text(body) == u'hel'
+        assert body_size(body) == 3
+
+
+class TestBodyStore(object):
+    def test_identical_contents_are_shared(self):
+        bodies = BodyStore()
+        first = bodies.add(b''.join([b'same ', b'payload']))
+        second = bodies.add(b''.join([b'same ', b'payload']))
+        assert first is second
+        assert bodies.references(first) == 2
+        assert len(bodies) == 1
+        assert bodies.unique_bytes == len(b'same payload')
+
+    def test_leaves_empty_and_non_string_bodies_alone(self):
+        bodies = BodyStore()
+        assert bodies.add(None) is None
+        assert bodies.add(b'') == b''
+        assert len(bodies) == 0
+
+    def test_keeps_unreferenced_contents_within_the_limit(self):
+        bodies = BodyStore(max_bytes=10)
+        content = bodies.add(b'12345')
+        bodies.release(content)
+        assert bodies.add(b'12345') is content
+
+    def test_forgets_the_least_recently_used_unreferenced_contents(self):
+        bodies = BodyStore(max_bytes=10)
+        for content in (b'aaaaa', b'bbbbb'):
+            bodies.release(bodies.add(content))
+        bodies.add(b'ccccc')
+        assert len(bodies) == 2
+        assert bodies.references(b'aaaaa') == 0
+        assert bodies.unique_bytes == 10
+
+    def test_never_forgets_referenced_contents(self):
+        bodies = BodyStore(max_bytes=4)
+        bodies.add(b'aaaaa')
+        bodies.add(b'bbbbb')
+        assert len(bodies) == 2
+        assert bodies.unique_bytes == 10
+
+    def test_ignores_releases_of_contents_it_did_not_return(self):
+        bodies = BodyStore()
+        content = bodies.add(b''.join([b'same ', b'payload']))
+        bodies.release(b''.join([b'same ', b'payload']))
+        assert bodies.references(content) == 1
@@ -1,10 +1,21 @@
+import gc
+import hashlib
+import io
 import json
+import os
 import time
+import weakref
 
 import bottle
 import pytest
 import webtest
-from htmlvis import BottleSniffer, HTTPSniffer, Transaction
+from htmlvis import (BottleSniffer, HTTPSniffer, Transaction,
+                     transaction_to_dict)
+from htmlvis.body import SpooledBody
+from htmlvis.filters import Rule
+from htmlvis.headers import HeaderStore
+from htmlvis.recorder import BackgroundRecorder
+from htmlvis.transaction_store import RingBufferStore
 
 app = bottle.Bottle()
 
@@ -47,6 +58,52 @@ def httperror():
     raise bottle.HTTPError(status=404)
 
 
+STREAMED_CHUNKS = [b'first chunk, ', b'second chunk, ', b'last chunk']
+STREAMED_BODY = b''.join(STREAMED_CHUNKS)
+
+
+@app.get('/generator')
+def generator():
+    for chunk in STREAMED_CHUNKS:
+        yield chunk
+
+
+@app.get('/file')
+def file_object():
+    return io.BytesIO(STREAMED_BODY)
+
+
+@app.get('/static')
+def static():
+    return bottle.static_file(
+        os.path.basename(__file__), root=os.path.dirname(__file__))
+
+
+@app.get('/items/<item_id>')
+def item(item_id):
+    return item_id
+
+
+@app.post('/echo')
+def echo():
+    return bottle.request.body.read()
+
+
+@app.get('/plain')
+def plain():
+    return 'hello'
+
+
+# Weak references to the bodies of the uploads to /upload
+UPLOADED_BODIES = []
+
+
+@app.post('/upload')
+def upload():
+    UPLOADED_BODIES.append(weakref.ref(bottle.request.body))
+    return 'uploaded'
+
+
 @app.post('/exception')
 @app.get('/exception')
 def exceptionalerror():
@@ -85,6 +142,176 @@ def test_multiple_requests_are_captured():
     assert len(sniffer.transactions) == 300
 
 
+def test_transactions_are_recorded_in_the_given_store():
+    test_app = webtest.TestApp(app)
+    sniffer = BottleSniffer(store=RingBufferStore(capacity=2))
+    app.install(sniffer)
+    for _ in range(3):
+        test_app.get('/success')
+    assert len(sniffer.transactions) == 2
+    assert sniffer.transactions.evicted_transactions == 1
+
+
+def test_transactions_are_built_by_the_given_recorder():
+    test_app = webtest.TestApp(app)
+    recorder = BackgroundRecorder()
+    sniffer = BottleSniffer(recorder=recorder)
+    app.install(sniffer)
+    test_app.get('/success')
+    sniffer.flush()
+    recorder.close()
+    transaction = sniffer.transactions[0]
+    assert transaction.request.url_path == '/success'
+    assert transaction.response.headers['The-More'] == 'The-Merrier'
+
+
+def test_the_recorder_captures_the_same_headers_as_inline_capture():
+    test_app = webtest.TestApp(app)
+    inline = BottleSniffer()
+    recorder = BackgroundRecorder()
+    background = BottleSniffer(recorder=recorder)
+    app.install(inline)
+    app.install(background)
+    test_app.get('/plain')
+    recorder.close()
+    assert background.transactions[0].response.headers == (
+        inline.transactions[0].response.headers)
+    assert background.transactions[0].request.headers == (
+        inline.transactions[0].request.headers)
+
+
+def test_repeated_headers_share_a_single_mapping():
+    test_app = webtest.TestApp(app)
+    sniffer = BottleSniffer()
+    app.install(sniffer)
+    test_app.get('/success')
+    test_app.get('/success')
+    first, second = sniffer.transactions
+    assert first.request.headers is second.request.headers
+    assert first.response.headers is second.response.headers
+
+
+class TestCaptureRules(object):
+    def test_excluded_transactions_are_not_captured(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer(exclude=[Rule(method='GET', path='/succ*')])
+        app.install(sniffer)
+        test_app.get('/success')
+        test_app.post('/success')
+        assert [t.request.method for t in sniffer.transactions] == ['POST']
+
+    def test_rules_can_match_the_status_of_failed_requests(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer(include=[Rule(status='5xx')])
+        app.install(sniffer)
+        test_app.get('/success')
+        with pytest.raises(webtest.app.AppError):
+            test_app.get('/exception')
+        with pytest.raises(webtest.app.AppError):
+            test_app.get('/http-error')
+        assert [t.request.url_path for t in sniffer.transactions] == [
+            '/exception'
+        ]
+
+    def test_excluded_streams_are_not_wrapped(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer(exclude=[Rule(path='/generator')])
+        app.install(sniffer)
+        assert test_app.get('/generator').body == STREAMED_BODY
+        assert len(sniffer.transactions) == 0
+
+
+class TestLargeRequestBodies(object):
+    def test_sniffer_does_not_interfere(self):
+        test_app = webtest.TestApp(app)
+        app.install(BottleSniffer(request_body_bytes=10, spool_bytes=5))
+        upload = b'x' * 100
+        assert test_app.post('/echo', upload).body == upload
+
+    def test_bodies_beyond_the_spool_size_are_kept_on_disk(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer(spool_bytes=10)
+        app.install(sniffer)
+        test_app.post('/echo', b'x' * 100)
+        body = sniffer.transactions[0].request.body
+        assert isinstance(body, SpooledBody)
+        assert body.content == b'x' * 100
+
+    def test_empty_bodies_are_kept_as_empty_bytes(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer()
+        app.install(sniffer)
+        test_app.get('/generator')
+        assert sniffer.transactions[0].request.body == b''
+
+    def test_spooled_bodies_are_exported_as_their_text(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer(spool_bytes=10)
+        app.install(sniffer)
+        test_app.post('/echo', b'x' * 100)
+        exported = json.loads(
+            json.dumps(transaction_to_dict(sniffer.transactions[0])))
+        assert exported['request']['body'] == 'x' * 100
+        assert exported['request']['headers']['Content-Length'] == '100'
+
+    def test_at_most_the_given_bytes_are_kept(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer(request_body_bytes=10)
+        app.install(sniffer)
+        upload = b'0123456789' * 10
+        test_app.post('/echo', upload)
+        body = sniffer.transactions[0].request.body
+        assert body.content == b'0123456789'
+        assert body.truncated
+        assert body.size == 100
+        assert body.digest == hashlib.sha256(upload).hexdigest()
+
+
+class TestStreamedResponseBodies(object):
+    @pytest.mark.parametrize('url', ['/generator', '/file'])
+    def test_sniffer_does_not_interfere(self, url):
+        test_app = webtest.TestApp(app)
+        app.install(BottleSniffer(stream_body_bytes=5))
+        assert test_app.get(url).body == STREAMED_BODY
+
+    @pytest.mark.parametrize('url', ['/generator', '/file'])
+    def test_the_start_size_and_digest_of_the_body_are_captured(self, url):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer(stream_body_bytes=5)
+        app.install(sniffer)
+        test_app.get(url)
+        body = sniffer.transactions[0].response.body
+        assert body.content == b'first'
+        assert body.truncated
+        assert body.size == len(STREAMED_BODY)
+        assert body.digest == hashlib.sha256(STREAMED_BODY).hexdigest()
+
+    def test_static_files_are_captured_as_they_are_sent(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer(body_digest=None)
+        app.install(sniffer)
+        sent = test_app.get('/static').body
+        body = sniffer.transactions[0].response.body
+        assert body.content == sent[:1024]
+        assert body.size == len(sent)
+        assert body.digest is None
+
+    def test_chunks_are_captured_as_they_are_sent(self):
+        sniffer = BottleSniffer(stream_body_bytes=100)
+        captured = []
+
+        def handler():
+            yield b'one'
+            captured.append(sniffer.transactions[0].response.body.content)
+            yield b'two'
+
+        streaming_app = bottle.Bottle()
+        streaming_app.route('/', callback=handler)
+        streaming_app.install(sniffer)
+        webtest.TestApp(streaming_app).get('/')
+        assert captured == [b'one']
+
+
 class TestRequestDataCapturedInSuccessfulTransations():
     def test_sniffer_does_not_interfere(self):
         test_app = webtest.TestApp(app)
@@ -97,7 +324,7 @@ class TestRequestDataCapturedInSuccessfulTransations():
         app.install(sniffer)
         test_app.post('/success', "Dreams + work")
         request = sniffer.transactions[0].request
-        assert request.body == b"Dreams + work"
+        assert request.body.content == b"Dreams + work"
 
     def test_the_elapsed_time_is_captured(self):
         test_app = webtest.TestApp(app)
@@ -143,6 +370,13 @@ class TestRequestDataCapturedInSuccessfulTransations():
         request = sniffer.transactions[0].request
         assert request.url_path == '/success'
 
+    def test_the_route_is_captured(self):
+        test_app = webtest.TestApp(app)
+        sniffer = BottleSniffer()
+        app.install(sniffer)
+        test_app.get('/items/42')
+        assert sniffer.transactions[0].request.route == '/items/<item_id>'
+
 
 class TestRequestDataCapturedInFailedTransations():
     def test_sniffer_does_not_interfere(self):
@@ -178,7 +412,7 @@ class TestRequestDataCapturedInFailedTransations():
         with pytest.raises(webtest.app.AppError):
             test_app.post(url, '2 + 2 = 5')
         request = sniffer.transactions[0].request
-        assert request.body == b"2 + 2 = 5"
+        assert request.body.content == b"2 + 2 = 5"
 
     def test_the_elapsed_time_is_captured(self):
         test_app = webtest.TestApp(app)
@@ -338,3 +572,16 @@ class TestResponsetDataCapturedInFailedTransations():
             test_app.get('/http-error')
         response = sniffer.transactions[0].response
         assert response.status == '404 Not Found'
+
+
+def test_lazy_headers_do_not_keep_the_request_alive():
+    test_app = webtest.TestApp(app)
+    sniffer = BottleSniffer(headers=HeaderStore(lazy=True))
+    app.install(sniffer)
+    test_app.post('/upload', b'x' * 500 * 1024)
+    # Bottle keeps the last request around until the next one
+    test_app.get('/success')
+    gc.collect()
+    assert UPLOADED_BODIES[-1]() is None
+    assert sniffer.transactions[0].request.headers['Content-Length'] == (
+        str(500 * 1024))
@@ -0,0 +1,143 @@
+import os
+import threading
+
+import pytest
+from htmlvis import save_seq_diag
+from htmlvis.capture_log import CaptureLog, CaptureLogReader
+
+from .conftest import make_transaction
+
+
+@pytest.fixture
+def log_dir(tmpdir):
+    return str(tmpdir.join('capture'))
+
+
+class TestCaptureLog(object):
+    def test_transactions_are_read_back_in_capture_order(self, log_dir):
+        log = CaptureLog(log_dir)
+        transactions = [make_transaction(index) for index in range(5)]
+        for transaction in transactions:
+            log.append(transaction)
+        assert list(log) == transactions
+        assert list(CaptureLogReader(log_dir).transactions) == transactions
+
+    def test_supports_len_and_indexing(self, log_dir):
+        log = CaptureLog(log_dir)
+        for index in range(5):
+            log.append(make_transaction(index))
+        assert len(log) == 5
+        assert log[0] == make_transaction(0)
+        assert log[-1] == make_transaction(4)
+        assert log[-2] == make_transaction(3)
+        with pytest.raises(IndexError):
+            log[5]
+
+    def test_appends_from_several_threads_are_not_mixed_up(self, log_dir):
+        log = CaptureLog(log_dir, segment_bytes=64 * 1024)
+
+        def append_many(thread_index):
+            for index in range(200):
+                log.append(make_transaction(thread_index * 1000 + index))
+
+        threads = [
+            threading.Thread(target=append_many, args=(thread_index, ))
+            for thread_index in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        log.close()
+        read_back = list(CaptureLogReader(log_dir).transactions)
+        assert len(log) == len(read_back) == 8 * 200
+        assert sorted(t.request.url_path for t in read_back) == sorted(
+            '/%d' % (thread_index * 1000 + index)
+            for thread_index in range(8) for index in range(200))
+
+    def test_rotates_segments_once_they_reach_their_size(self, log_dir):
+        log = CaptureLog(log_dir, segment_bytes=500)
+        transactions = [make_transaction(index) for index in range(20)]
+        for transaction in transactions:
+            log.append(transaction)
+        segments = [name for name in os.listdir(log_dir)
+                    if name.endswith('.log')]
+        assert len(segments) > 1
+        assert all(
+            os.path.getsize(os.path.join(log_dir, name)) <= 500
+            for name in segments)
+        assert list(CaptureLogReader(log_dir)) == transactions
+        assert CaptureLogReader(log_dir)[7] == transactions[7]
+
+    def test_a_new_log_on_the_same_directory_continues_it(self, log_dir):
+        first_log = CaptureLog(log_dir)
+        first_log.append(make_transaction(0))
+        first_log.close()
+        second_log = CaptureLog(log_dir)
+        second_log.append(make_transaction(1))
+        assert len(second_log) == 2
+        assert list(second_log) == [make_transaction(0), make_transaction(1)]
+
+    def test_clear_deletes_the_segments(self, log_dir):
+        log = CaptureLog(log_dir)
+        log.append(make_transaction(0))
+        log.clear()
+        assert len(log) == 0
+        assert list(log) == []
+        assert os.listdir(log_dir) == []
+        log.append(make_transaction(1))
+        assert list(log) == [make_transaction(1)]
+
+    def test_bodies_that_cannot_be_pickled_are_logged_as_text(self, log_dir):
+        log = CaptureLog(log_dir)
+        log.append(
+            make_transaction(0, request_body=(chunk for chunk in [b''])))
+        body = list(log)[0].request.body
+        assert body.startswith('<generator object')
+
+    def test_partially_written_index_entries_are_ignored(self, log_dir):
+        log = CaptureLog(log_dir)
+        log.append(make_transaction(0))
+        log.close()
+        with open(os.path.join(log_dir, 'segment-000001.idx'),
+                  'ab') as index_file:
+            index_file.write(b'\0' * 10)
+        assert list(CaptureLogReader(log_dir)) == [make_transaction(0)]
+
+
+class TestCaptureLogReader(object):
+    def test_an_empty_directory_has_no_transactions(self, log_dir):
+        CaptureLog(log_dir)
+        reader = CaptureLogReader(log_dir)
+        assert list(reader.transactions) == []
+        assert len(reader) == 0
+
+    def test_is_ordered_if_transactions_do_not_overlap(self, log_dir):
+        log = CaptureLog(log_dir)
+        for index in range(3):
+            log.append(make_transaction(index))
+        assert CaptureLogReader(log_dir).ordered
+
+    def test_is_not_ordered_if_transactions_overlap(self, log_dir):
+        log = CaptureLog(log_dir)
+        log.append(make_transaction(0, 0.3, 0.4))
+        log.append(make_transaction(1, 0.1, 0.5))
+        assert not CaptureLogReader(log_dir).ordered
+
+    def test_sees_transactions_appended_after_it_was_created(self, log_dir):
+        log = CaptureLog(log_dir)
+        reader = CaptureLogReader(log_dir)
+        log.append(make_transaction(0))
+        assert list(reader) == [make_transaction(0)]
+
+    def test_can_be_rendered_as_a_sniffer(self, log_dir, tmpdir):
+        log = CaptureLog(log_dir)
+        for index in range(3):
+            log.append(make_transaction(index))
+        output_path = str(tmpdir.join('diagram.html'))
+        save_seq_diag(output_path, [CaptureLogReader(log_dir)],
+                      backend='svg')
+        with open(output_path) as output_file:
+            diagram = output_file.read()
+        assert 'GET /0' in diagram
+        assert 'GET /2' in diagram
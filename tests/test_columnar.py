@@ -0,0 +1,112 @@
+import pytest
+from htmlvis import columnar
+from htmlvis.columnar import ColumnarStore
+
+from .conftest import make_transaction
+
+
+def _transaction(index, method='GET', status='200 OK', latency=0.5):
+    "A transaction of a sample capture where servers and paths repeat"
+    return make_transaction(
+        index,
+        response_elapsed=index + latency,
+        server_name='server %d' % (index % 2),
+        method=method,
+        url_path='/items/%d' % (index % 3),
+        route='/items/{id}',
+        status=status,
+        request_body=b'request %d' % index,
+        response_body='response %d' % index,
+        request_headers={'Accept': 'application/json'},
+        response_headers={'Content-Type': 'text/plain'})
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'pure-python'])
+def store(request):
+    if request.param and columnar.numpy is None:
+        pytest.skip('NumPy is not installed')
+    store = ColumnarStore(use_numpy=request.param)
+    store.append(_transaction(0))
+    store.append(_transaction(1, 'POST', '201 Created', latency=1.5))
+    store.append(_transaction(2, 'GET', '404 Not Found', latency=0.25))
+    store.append(_transaction(3, 'DELETE', '500 Internal Server Error', 2.0))
+    return store
+
+
+def _list(indexes):
+    return [int(index) for index in indexes]
+
+
+class TestColumnarStoreAsTransactionStore(object):
+    def test_transactions_are_rebuilt_in_capture_order(self, store):
+        assert list(store) == [
+            _transaction(0),
+            _transaction(1, 'POST', '201 Created', latency=1.5),
+            _transaction(2, 'GET', '404 Not Found', latency=0.25),
+            _transaction(3, 'DELETE', '500 Internal Server Error', 2.0),
+        ]
+
+    def test_supports_len_and_indexing(self, store):
+        assert len(store) == 4
+        assert store[0] == _transaction(0)
+        assert store[-1].request.method == 'DELETE'
+        with pytest.raises(IndexError):
+            store[4]
+
+    def test_clear_removes_every_transaction(self, store):
+        store.clear()
+        assert len(store) == 0
+        assert list(store) == []
+        assert store.values('method') == []
+
+    def test_values_are_dictionary_encoded(self, store):
+        assert store.values('method') == ['GET', 'POST', 'DELETE']
+        assert _list(store.column('method')) == [0, 1, 0, 2]
+
+
+class TestColumnarStoreAnalysis(object):
+    def test_numeric_columns(self, store):
+        assert _list(store.column('status_code')) == [200, 201, 404, 500]
+        assert list(store.column('request_elapsed')) == [0.0, 1.0, 2.0, 3.0]
+
+    def test_latencies(self, store):
+        assert list(store.latencies()) == [0.5, 1.5, 0.25, 2.0]
+
+    def test_filter_by_status_range(self, store):
+        assert _list(store.where(min_status_code=400)) == [2, 3]
+        assert _list(store.where(max_status_code=299)) == [0, 1]
+
+    def test_filter_by_encoded_value(self, store):
+        assert _list(store.where(method='GET')) == [0, 2]
+        assert _list(store.where(method='PATCH')) == []
+
+    def test_filter_by_latency_and_status(self, store):
+        assert _list(store.where(min_latency=1.0, status_code=500)) == [3]
+        assert _list(store.where(max_latency=0.5)) == [0, 2]
+
+    def test_filter_by_unknown_column(self, store):
+        with pytest.raises(ValueError):
+            store.where(colour='blue')
+
+    def test_sort_by_numeric_column(self, store):
+        assert _list(store.sort_by('latency')) == [2, 0, 1, 3]
+        assert _list(store.sort_by('latency', reverse=True)) == [3, 1, 0, 2]
+
+    def test_sort_by_encoded_column_uses_its_values(self, store):
+        assert _list(store.sort_by('method')) == [3, 0, 2, 1]
+
+    def test_sort_a_subset(self, store):
+        assert _list(store.sort_by('latency', indexes=[0, 1, 3])) == [0, 1, 3]
+
+    def test_count_by_column(self, store):
+        assert store.count_by('method') == {'GET': 2, 'POST': 1, 'DELETE': 1}
+        assert store.count_by('status_code', indexes=store.where(
+            method='GET')) == {200: 1, 404: 1}
+
+    def test_count_by_route(self, store):
+        assert store.count_by('route') == {'/items/{id}': 4}
+
+    def test_can_keep_recording_after_analysing(self, store):
+        store.column('request_elapsed')
+        store.append(_transaction(4))
+        assert len(store) == 5
@@ -0,0 +1,67 @@
+import pytest
+from htmlvis.filters import CaptureFilter, Rule
+
+
+def _captures(capture_filter, method='GET', status=200, host='api.com',
+              path='/users'):
+    return capture_filter.captures(method, status, host, path)
+
+
+def test_captures_everything_without_rules():
+    assert _captures(CaptureFilter())
+
+
+@pytest.mark.parametrize('rule', [
+    Rule(method='get'),
+    Rule(path='/users'),
+    Rule(path='/us*'),
+    Rule(path='/user?'),
+    Rule(host='*.com'),
+    Rule(status=200),
+    Rule(status='2xx'),
+    Rule(method='GET', path='/users', host='api.com', status=200),
+])
+def test_rules_match_transactions(rule):
+    assert not _captures(CaptureFilter(exclude=[rule]))
+    assert _captures(CaptureFilter(include=[rule]))
+
+
+@pytest.mark.parametrize('rule', [
+    Rule(method='POST'),
+    Rule(path='/users/*'),
+    Rule(path='/user'),
+    Rule(host='*.org'),
+    Rule(status=404),
+    Rule(status='5xx'),
+    Rule(method='GET', status=500),
+])
+def test_rules_do_not_match_other_transactions(rule):
+    assert _captures(CaptureFilter(exclude=[rule]))
+    assert not _captures(CaptureFilter(include=[rule]))
+
+
+def test_globs_do_not_spill_into_other_fields():
+    capture_filter = CaptureFilter(exclude=[Rule(host='api*', path='*s')])
+    assert _captures(capture_filter, host='api.com', path='/user')
+
+
+def test_regular_expression_characters_are_matched_literally():
+    capture_filter = CaptureFilter(exclude=[Rule(path='/a.b+c')])
+    assert not _captures(capture_filter, path='/a.b+c')
+    assert _captures(capture_filter, path='/axbbc')
+
+
+def test_excluding_wins_over_including():
+    capture_filter = CaptureFilter(
+        include=[Rule(host='api.com')], exclude=[Rule(path='/health')])
+    assert _captures(capture_filter, path='/users')
+    assert not _captures(capture_filter, path='/health')
+    assert not _captures(capture_filter, host='cdn.com', path='/users')
+
+
+def test_any_of_several_rules_matches():
+    capture_filter = CaptureFilter(
+        exclude=[Rule(path='/health'), Rule(path='/static/*')])
+    assert not _captures(capture_filter, path='/health')
+    assert not _captures(capture_filter, path='/static/app.js')
+    assert _captures(capture_filter, path='/users')
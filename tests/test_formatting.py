@@ -0,0 +1,289 @@
+import hashlib
+import json
+import pickle
+from collections import OrderedDict
+
+import pytest
+from htmlvis import formatting, seqdiag_model
+
+
+def _message(note, content_type=None):
+    return seqdiag_model.make_message(
+        category=seqdiag_model.Category.response,
+        src='Server',
+        dst='Client',
+        text='200 OK',
+        note=note,
+        when=0.0,
+        data={'content_type': content_type})
+
+
+def _format(msg):
+    formatting.NoteFormatter()(msg)
+    # json dumps adds a trailing space in Python 2. https://bugs.python.org/issue16333
+    return msg.note.replace(' \n', '\n')
+
+
+class TestNoteFormatter(object):
+    @pytest.mark.parametrize('content_type', [
+        'application/json', 'application/json; charset=utf-8',
+        'Application/JSON', 'application/problem+json', 'text/json'
+    ])
+    def test_json_content_types_are_prettified(self, content_type):
+        msg = _message('{"b": 1, "a": 2}', content_type)
+        assert _format(msg) == '{\n    "b": 1,\n    "a": 2\n}'
+
+    def test_json_is_sniffed_without_a_content_type(self):
+        msg = _message('  [1]')
+        assert _format(msg) == '[\n    1\n]'
+
+    def test_messages_without_data_are_sniffed(self):
+        msg = _message('{"a": 1}')
+        msg.data = ''
+        assert _format(msg) == '{\n    "a": 1\n}'
+
+    def test_long_json_strings_are_shortened(self):
+        msg = _message('{"b": "This is a very long string"}',
+                       'application/json')
+        assert _format(msg) == '{\n    "b": "This is a very ..."\n}'
+
+    @pytest.mark.parametrize('content_type', [
+        'text/plain', 'application/octet-stream', 'image/png', 'text/html'
+    ])
+    def test_other_content_types_are_left_as_they_are(self, content_type):
+        note = '{"b": "This is a very long string"}'
+        msg = _message(note, content_type)
+        assert _format(msg) == note
+
+    @pytest.mark.parametrize('note', [
+        'plain "text that is quite long"', '<p>"This is a very long one"</p>',
+        '\x89PNG\r\n'
+    ])
+    def test_notes_that_dont_look_like_json_are_left_as_they_are(self, note):
+        msg = _message(note)
+        assert _format(msg) == note
+
+    def test_unparseable_json_is_left_as_it_is(self):
+        note = '{"b": "This is a very long string", '
+        msg = _message(note, 'application/json')
+        assert _format(msg) == note
+
+    def test_formatters_can_be_registered_by_type(self):
+        format_note = formatting.NoteFormatter(
+            content_type_formatters={'text/*': lambda note: note.upper()})
+        msg = _message('hi', 'text/plain')
+        format_note(msg)
+        assert msg.note == 'HI'
+
+    def test_resolves_each_content_type_once(self, mocker):
+        lookup = mocker.spy(formatting.NoteFormatter, '_lookup')
+        format_note = formatting.NoteFormatter()
+        for _ in range(3):
+            format_note(_message('{}', 'application/json'))
+        assert lookup.call_count == 1
+
+    def test_is_pickled_with_its_budget_but_without_its_cache(self):
+        budget = formatting.NoteBudget(max_bytes=10)
+        format_note = formatting.NoteFormatter(budget=budget)
+        format_note(_message('{"a": 1}'))
+        unpickled = pickle.loads(pickle.dumps(format_note, 2))
+        assert unpickled.budget == budget
+        assert len(unpickled.cache) == 0
+        assert unpickled.formatter_for('{}') is format_note.formatter_for('{}')
+
+    def test_only_one_formatter_runs_per_note(self):
+        calls = []
+        format_note = formatting.NoteFormatter(
+            content_type_formatters={
+                'application/json': calls.append,
+                '+json': calls.append,
+                'application/*': calls.append,
+            })
+        format_note(_message('{}', 'application/json'))
+        assert calls == ['{}']
+
+
+class TestJSONFormatter(object):
+    @pytest.mark.parametrize('note', [
+        '{"b": 1, "a": [true, false, null, 1.5, -2]}', '[]', '{}', '"text"',
+        '[[], {}, {"a": {"b": []}}]', '{"x": "caf\\u00e9"}',
+        '[NaN, -Infinity, 1e300, 10000000000000000000000]'
+    ])
+    def test_indents_like_json_dumps(self, note):
+        formatted = formatting.JSONFormatter(max_string_length=100)(note)
+        # json dumps adds a trailing space in Python 2. https://bugs.python.org/issue16333
+        assert formatted == json.dumps(
+            json.loads(note, object_pairs_hook=OrderedDict),
+            indent=4).replace(' \n', '\n')
+
+    def test_shortens_long_names_and_values(self):
+        formatted = formatting.JSONFormatter(max_string_length=5)(
+            '{"a long name": "a long value", "short": "tiny"}')
+        assert formatted == ('{\n    "a lon...": "a lon...",\n'
+                             '    "short": "tiny"\n}')
+
+    def test_shortens_strings_by_character_rather_than_escape(self):
+        formatted = formatting.JSONFormatter(max_string_length=3)(
+            '["\\u00e9\\u00e9\\u00e9\\u00e9"]')
+        assert formatted == '[\n    "\\u00e9\\u00e9\\u00e9..."\n]'
+
+    def test_stops_at_the_budget(self):
+        note = json.dumps(list(range(1000)))
+        formatted = formatting.JSONFormatter(max_chars=30)(note)
+        assert formatted == '[\n    0,\n    1,\n    2,\n    3,\n...'
+
+    def test_output_within_the_budget_is_complete(self):
+        formatted = formatting.JSONFormatter(max_chars=30)('[1, 2]')
+        assert formatted == '[\n    1,\n    2\n]'
+
+    def test_is_none_for_notes_that_arent_json(self):
+        assert formatting.JSONFormatter()('{"a": ') is None
+
+
+class TestNoteCache(object):
+    def test_formats_identical_notes_once(self, mocker):
+        formatter = mocker.Mock(return_value='formatted')
+        cache = formatting.NoteCache()
+        assert cache.format(formatter, u'{"a": 1}') == 'formatted'
+        assert cache.format(formatter, u'{"a": 1}') == 'formatted'
+        formatter.assert_called_once_with(u'{"a": 1}')
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_keys_include_the_formatter_settings(self):
+        cache = formatting.NoteCache()
+        note = '["This is a very long string"]'
+        cache.format(formatting.JSONFormatter(), note)
+        short = cache.format(formatting.JSONFormatter(max_string_length=4),
+                             note)
+        assert short == '[\n    "This..."\n]'
+        cache.format(formatting.JSONFormatter(max_string_length=4), note)
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_caches_notes_that_cant_be_formatted(self, mocker):
+        formatter = mocker.Mock(return_value=None)
+        cache = formatting.NoteCache()
+        cache.format(formatter, 'not json')
+        assert cache.format(formatter, 'not json') is None
+        assert formatter.call_count == 1
+
+    def test_forgets_the_least_recently_used_notes_beyond_max_bytes(self):
+        entry_bytes = formatting.NoteCache.entry_overhead + 20 + 4
+        cache = formatting.NoteCache(max_bytes=2 * entry_bytes)
+        upper = lambda note: note.upper()  # noqa: E731
+        cache.format(upper, 'abcd')
+        cache.format(upper, 'efgh')
+        cache.format(upper, 'abcd')
+        cache.format(upper, 'ijkl')
+        assert len(cache) == 2
+        assert cache.cached_bytes == 2 * entry_bytes
+        cache.format(upper, 'abcd')
+        assert cache.hits == 2
+
+    def test_counts_notes_that_cant_be_formatted(self):
+        cache = formatting.NoteCache(
+            max_bytes=10 * formatting.NoteCache.entry_overhead)
+        for index in range(100):
+            cache.format(lambda note: None, 'not json %d' % index)
+        assert len(cache) < 10
+        assert 0 < cache.cached_bytes <= cache.max_bytes
+
+    def test_doesnt_keep_notes_bigger_than_max_bytes(self):
+        cache = formatting.NoteCache(
+            max_bytes=formatting.NoteCache.entry_overhead)
+        assert cache.format(lambda note: note, 'abc') == 'abc'
+        assert len(cache) == 0
+
+    def test_note_formatters_share_a_given_cache(self):
+        cache = formatting.NoteCache()
+        for _ in range(2):
+            formatting.NoteFormatter(cache=cache)(_message('{"a": 1}'))
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_clear_forgets_every_note(self):
+        cache = formatting.NoteCache()
+        cache.format(lambda note: note, 'abc')
+        cache.clear()
+        assert (len(cache), cache.cached_bytes) == (0, 0)
+
+
+class TestNoteBudget(object):
+    def test_notes_within_budget_are_formatted(self):
+        msg = _message('{"a": 1}')
+        formatting.NoteFormatter(budget=formatting.NoteBudget(max_bytes=14))(
+            msg)
+        assert msg.note == '{\n    "a": 1\n}'
+
+    def test_notes_over_the_line_budget_once_formatted_are_summarised(self):
+        note = json.dumps(list(range(2000)))
+        msg = _message(note)
+        formatting.NoteFormatter()(msg)
+        assert len(msg.note.splitlines()) == 1 + 1000 + 1
+        assert msg.note.splitlines()[1:3] == ['[', '    0,']
+        assert msg.note.endswith('\n...')
+
+    def test_notes_over_the_byte_budget_once_formatted_are_summarised(self):
+        note = json.dumps({'a': 'b' * 10})
+        msg = _message(note)
+        formatting.NoteFormatter(budget=formatting.NoteBudget(
+            max_bytes=len(note), max_lines=None))(msg)
+        assert msg.note.splitlines()[1] == '{'
+        assert msg.note.endswith('\n...')
+
+    def test_json_formatting_stops_past_the_byte_budget(self, mocker):
+        write = mocker.spy(formatting._JSONWriter, '__init__')
+        formatting.NoteFormatter(budget=formatting.NoteBudget(
+            max_bytes=100, max_lines=None))(_message('[1, 2]'))
+        assert write.call_args[0][2] == 100
+
+    def test_notes_over_the_byte_budget_are_summarised(self):
+        msg = _message('x' * 100, 'text/plain')
+        formatting.NoteFormatter(budget=formatting.NoteBudget(max_bytes=10))(
+            msg)
+        assert msg.note == '[100 bytes, digest %s]\n%s\n...' % (
+            hashlib.sha1(b'x' * 100).hexdigest(), 'x' * 10)
+
+    def test_notes_over_the_line_budget_are_summarised(self):
+        msg = _message('line\n' * 5)
+        formatting.NoteFormatter(budget=formatting.NoteBudget(max_lines=2))(
+            msg)
+        assert msg.note.splitlines()[1:] == ['line', 'line', '...']
+
+    def test_summaries_use_the_size_and_digest_from_capture(self):
+        msg = _message('x' * 100)
+        msg.data.update(size=12345, digest='abc')
+        formatting.NoteFormatter(budget=formatting.NoteBudget(max_bytes=10))(
+            msg)
+        assert msg.note.startswith('[12345 bytes, digest abc]\n')
+
+    def test_the_beginning_of_json_notes_is_formatted(self):
+        note = json.dumps({'items': list(range(1000))})
+        msg = _message(note, 'application/json')
+        formatting.NoteFormatter(
+            budget=formatting.NoteBudget(max_bytes=40, max_lines=None))(msg)
+        assert msg.note.splitlines()[1:] == [
+            '{', '    "items": [', '        0,', '        1,', '...'
+        ]
+
+    def test_formatted_beginnings_are_kept_within_the_line_budget(self):
+        note = json.dumps(list(range(1000)))
+        msg = _message(note)
+        formatting.NoteFormatter(
+            budget=formatting.NoteBudget(max_bytes=100, max_lines=3))(msg)
+        assert msg.note.splitlines()[1:] == ['[', '    0,', '    1', '...']
+
+    def test_no_budget_formats_everything(self):
+        note = json.dumps(list(range(1000)))
+        msg = _message(note)
+        formatting.NoteFormatter(budget=formatting.NoteBudget(None, None))(msg)
+        assert len(msg.note.splitlines()) == 1002
+
+
+class TestFormatHead(object):
+    def test_formats_complete_documents_like_the_formatter(self):
+        note = '{"b": [1, {"c": "This is a very long string"}], "a": {}}'
+        formatter = formatting.JSONFormatter()
+        assert formatter.format_head(note) == formatter(note)
+
+    def test_stops_at_an_unterminated_string(self):
+        formatted = formatting.JSONFormatter().format_head('{"a": [1, "bc')
+        assert formatted == '{\n    "a": [\n        1,'
@@ -0,0 +1,101 @@
+import json
+import gc
+import pickle
+import weakref
+
+import pytest
+from htmlvis.headers import FrozenHeaders, HeaderStore, LazyHeaders
+
+
+class TestFrozenHeaders(object):
+    def test_behaves_like_a_read_only_dict(self):
+        headers = FrozenHeaders([('Accept', 'text/html')])
+        assert headers == {'Accept': 'text/html'}
+        assert headers['Accept'] == 'text/html'
+        assert dict(headers) == {'Accept': 'text/html'}
+        with pytest.raises(TypeError):
+            headers['Accept'] = 'text/plain'
+
+    def test_cannot_be_changed(self):
+        headers = FrozenHeaders([('Accept', 'text/html')])
+        for change in (lambda: headers.update(Accept='text/plain'),
+                       lambda: headers.pop('Accept'), headers.clear,
+                       lambda: headers.setdefault('Host', 'a')):
+            with pytest.raises(TypeError):
+                change()
+        assert headers == {'Accept': 'text/html'}
+
+    def test_are_json_serializable(self):
+        headers = FrozenHeaders([('Accept', 'text/html')])
+        assert json.loads(json.dumps(headers)) == {'Accept': 'text/html'}
+
+    def test_can_be_pickled(self):
+        headers = FrozenHeaders([('Accept', 'text/html')])
+        assert pickle.loads(pickle.dumps(headers, 2)) == headers
+
+
+class TestHeaderStore(object):
+    def test_identical_headers_share_a_single_mapping(self):
+        store = HeaderStore()
+        first = store.capture({'Accept': 'text/html'})
+        second = store.capture({'Accept': 'text/html'})
+        assert first is second
+        assert first == {'Accept': 'text/html'}
+
+    def test_captured_headers_do_not_follow_the_original_ones(self):
+        original = {'Accept': 'text/html'}
+        headers = HeaderStore().capture(original)
+        original['Accept'] = 'text/plain'
+        assert headers == {'Accept': 'text/html'}
+
+    def test_captures_name_value_pairs(self):
+        store = HeaderStore()
+        headers = store.capture((('Accept', 'text/html'), ))
+        assert headers is store.capture({'Accept': 'text/html'})
+
+    def test_forgets_every_set_once_it_is_full(self):
+        store = HeaderStore(max_sets=2)
+        for value in ('a', 'b', 'c'):
+            store.capture({'X-Value': value})
+        assert len(store) == 1
+
+    def test_headers_with_unhashable_values_are_not_interned(self):
+        store = HeaderStore()
+        assert store.capture({'X-List': ['a']}) == {'X-List': ['a']}
+        assert len(store) == 0
+
+
+class TestLazyHeaders(object):
+    def test_are_only_copied_when_read(self):
+        store = HeaderStore(lazy=True)
+        original = {'Accept': 'text/html'}
+        headers = store.capture(original)
+        assert isinstance(headers, LazyHeaders)
+        assert len(store) == 0
+        assert headers['Accept'] == 'text/html'
+        assert len(store) == 1
+
+    def test_materialise_into_interned_headers(self):
+        store = HeaderStore(lazy=True)
+        first = store.capture({'Accept': 'text/html'})
+        second = store.capture({'Accept': 'text/html'})
+        assert first == second == {'Accept': 'text/html'}
+        assert first.headers is second.headers
+
+    def test_do_not_keep_the_live_headers(self):
+        class LiveHeaders(dict):
+            pass
+
+        original = LiveHeaders({'Accept': 'text/html'})
+        headers = HeaderStore(lazy=True).capture(original)
+        original_ref = weakref.ref(original)
+        del original
+        gc.collect()
+        assert original_ref() is None
+        assert headers == {'Accept': 'text/html'}
+
+    def test_are_pickled_as_frozen_headers(self):
+        headers = HeaderStore(lazy=True).capture({'Accept': 'text/html'})
+        unpickled = pickle.loads(pickle.dumps(headers, 2))
+        assert isinstance(unpickled, FrozenHeaders)
+        assert unpickled == {'Accept': 'text/html'}
@@ -1,6 +1,12 @@
+import threading
+
 from htmlvis import HTTPSniffer
+from htmlvis.recorder import BackgroundRecorder
+from htmlvis.transaction_store import PerThreadStore
 from pytest import raises
 
+from .conftest import StoreSniffer, make_transaction
+
 
 class TestHTTPSniffer:
     def test_requires_a_transactions_property_to_be_available(self):
@@ -10,3 +16,68 @@ class TestHTTPSniffer:
     def test_exposes_a_restart_method(self):
         with raises(NotImplementedError):
             HTTPSniffer().restart()
+
+    def test_transactions_are_ordered_while_they_do_not_overlap(self):
+        sniffer = StoreSniffer()
+        sniffer._record(make_transaction(0, 0.1, 0.2))
+        sniffer._record(make_transaction(0, 0.3, 0.4))
+        assert sniffer.ordered
+
+    def test_transactions_are_not_ordered_once_they_overlap(self):
+        sniffer = StoreSniffer()
+        sniffer._record(make_transaction(0, 0.3, 0.4))
+        sniffer._record(make_transaction(0, 0.1, 0.5))
+        sniffer._record(make_transaction(0, 0.6, 0.7))
+        assert not sniffer.ordered
+
+    def test_transactions_are_ordered_again_after_a_snapshot(self):
+        sniffer = StoreSniffer()
+        sniffer._record(make_transaction(0, 0.3, 0.4))
+        sniffer._record(make_transaction(0, 0.1, 0.5))
+        sniffer.snapshot_and_reset()
+        sniffer._record(make_transaction(0, 0.1, 0.5))
+        assert sniffer.ordered
+
+    def test_transactions_are_not_ordered_if_the_store_cannot_tell(self):
+        sniffer = StoreSniffer(store=PerThreadStore())
+        sniffer._record(make_transaction(0, 0.1, 0.2))
+        thread = threading.Thread(
+            target=sniffer._record, args=(make_transaction(0, 0.3, 0.4), ))
+        thread.start()
+        thread.join()
+        assert not sniffer.ordered
+
+    def test_snapshot_and_reset_takes_the_captured_transactions(self):
+        sniffer = StoreSniffer()
+        first = make_transaction(0, 0.1, 0.2)
+        sniffer._record(first)
+        assert sniffer.snapshot_and_reset() == [first]
+        assert len(sniffer.transactions) == 0
+
+    def test_snapshot_and_reset_waits_for_pending_captures(self):
+        recorder = BackgroundRecorder()
+        sniffer = StoreSniffer(recorder=recorder)
+        sniffer._capture(make_transaction, 0, 0.1, 0.2)
+        assert sniffer.snapshot_and_reset() == [make_transaction(0, 0.1, 0.2)]
+        recorder.close()
+
+    def test_flush_succeeds_without_a_recorder(self):
+        assert StoreSniffer().flush()
+
+    def test_captures_in_the_recorder_thread_until_flushed(self):
+        recorder = BackgroundRecorder()
+        sniffer = StoreSniffer(recorder=recorder)
+        release = threading.Event()
+        recorder.submit(release.wait)
+        sniffer._capture(make_transaction, 0, 0.1, 0.2)
+        assert len(sniffer.transactions) == 0
+        release.set()
+        assert sniffer.flush()
+        assert sniffer.transactions[0] == make_transaction(0, 0.1, 0.2)
+        recorder.close()
+
+
+def test_captured_models_have_no_instance_dict():
+    transaction = make_transaction(0, 0.1, 0.2)
+    for obj in (transaction, transaction.request, transaction.response):
+        assert not hasattr(obj, '__dict__')
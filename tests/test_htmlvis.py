@@ -1,6 +1,11 @@
 import htmlvis
 import pytest
-from mock import Mock, mock_open
+from htmlvis.body import Body
+from htmlvis.headers import FrozenHeaders
+from htmlvis.transaction_store import RingBufferStore
+from mock import Mock, PropertyMock, mock_open
+
+from .conftest import StoreSniffer, make_transaction
 
 
 @pytest.fixture(autouse=True)
@@ -16,6 +21,10 @@ def patch_open(mocker):
         mocker.patch('__builtin__.open', mock_open())
 
 
+def _drawn_messages():
+    return list(htmlvis.seqdiag.draw.call_args[1]['messages'])
+
+
 @pytest.fixture
 def successful_transaction():
     return htmlvis.Transaction(
@@ -55,7 +64,7 @@ class TestRequestProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        request_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][0]
+        request_msg = _drawn_messages()[0]
         assert request_msg.category == htmlvis.seqdiag_model.Category.request
 
     def test_the_client_is_the_message_source(self, mocker,
@@ -63,7 +72,7 @@ class TestRequestProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        request_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][0]
+        request_msg = _drawn_messages()[0]
         assert request_msg.src == successful_transaction.client_name
 
     def test_the_server_is_the_message_destination(self, mocker,
@@ -71,7 +80,7 @@ class TestRequestProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        request_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][0]
+        request_msg = _drawn_messages()[0]
         assert request_msg.dst == successful_transaction.server_name
 
     def test_the_url_is_passed_as_additional_data(self, mocker,
@@ -79,7 +88,7 @@ class TestRequestProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        request_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][0]
+        request_msg = _drawn_messages()[0]
         assert request_msg.data[
             'url'] == successful_transaction.request.url_path
 
@@ -87,9 +96,22 @@ class TestRequestProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        request_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][0]
+        request_msg = _drawn_messages()[0]
         assert request_msg.note == successful_transaction.request.body
 
+    @pytest.mark.parametrize(
+        'name',
+        ['Content-Type', 'content-type', 'Content-type', 'CONTENT-TYPE'])
+    def test_the_content_type_is_passed_as_additional_data(
+            self, successful_transaction, name):
+        successful_transaction.request.headers = FrozenHeaders(
+            [(name, 'application/json')])
+        sniffer = Mock()
+        sniffer.transactions = [successful_transaction]
+        htmlvis.save_seq_diag('/fake/path', [sniffer])
+        request_msg = _drawn_messages()[0]
+        assert request_msg.data['content_type'] == 'application/json'
+
     @pytest.mark.parametrize(
         'transaction, expected_method',
         [(successful_transaction, 'PUT'), (error_transaction, 'GET')])
@@ -98,7 +120,7 @@ class TestRequestProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [transaction()]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        request_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][0]
+        request_msg = _drawn_messages()[0]
         assert request_msg.data['method'] == expected_method
 
     @pytest.mark.parametrize('transaction, expected_text',
@@ -109,7 +131,7 @@ class TestRequestProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [transaction()]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        request_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][0]
+        request_msg = _drawn_messages()[0]
         assert request_msg.text == expected_text
 
 
@@ -119,7 +141,7 @@ class TestResponseProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        response_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][1]
+        response_msg = _drawn_messages()[1]
         assert response_msg.category == htmlvis.seqdiag_model.Category.response
 
     def test_the_server_is_the_message_source(self, mocker,
@@ -127,7 +149,7 @@ class TestResponseProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        response_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][1]
+        response_msg = _drawn_messages()[1]
         assert response_msg.src == successful_transaction.server_name
 
     def test_the_client_is_the_message_destination(self, mocker,
@@ -135,7 +157,7 @@ class TestResponseProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        response_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][1]
+        response_msg = _drawn_messages()[1]
         assert response_msg.dst == successful_transaction.client_name
 
     def test_the_status_is_passed_as_additional_data(self, mocker,
@@ -143,7 +165,7 @@ class TestResponseProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        response_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][1]
+        response_msg = _drawn_messages()[1]
         assert response_msg.data[
             'status'] == successful_transaction.response.status
 
@@ -154,16 +176,37 @@ class TestResponseProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [transaction()]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        response_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][1]
+        response_msg = _drawn_messages()[1]
         assert response_msg.text == expected_text
 
     def test_the_body_is_passed_as_note(self, mocker, successful_transaction):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        response_msg = htmlvis.seqdiag.draw.call_args[1]['messages'][1]
+        response_msg = _drawn_messages()[1]
         assert response_msg.note == successful_transaction.response.body
 
+    def test_the_body_size_and_digest_are_passed_as_additional_data(
+            self, successful_transaction):
+        successful_transaction.response.body = Body(
+            b'response body', size=1000, digest='abc')
+        sniffer = Mock()
+        sniffer.transactions = [successful_transaction]
+        htmlvis.save_seq_diag('/fake/path', [sniffer])
+        response_msg = _drawn_messages()[1]
+        assert response_msg.data['size'] == 1000
+        assert response_msg.data['digest'] == 'abc'
+
+    @pytest.mark.parametrize('headers', [{}, None, ''])
+    def test_the_content_type_may_be_unknown(self, successful_transaction,
+                                             headers):
+        successful_transaction.response.headers = headers
+        sniffer = Mock()
+        sniffer.transactions = [successful_transaction]
+        htmlvis.save_seq_diag('/fake/path', [sniffer])
+        response_msg = _drawn_messages()[1]
+        assert response_msg.data['content_type'] is None
+
 
 class TestTransactionProcessingInSaveSeqDiag(object):
     def test_passes_both_request_and_response_to_the_sequence_diagram_generator(
@@ -171,7 +214,7 @@ class TestTransactionProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        messages = htmlvis.seqdiag.draw.call_args[1]['messages']
+        messages = _drawn_messages()
         assert len(messages) == 2
 
     def test_passes_multiple_transactions_to_the_sequence_diagram_generator(
@@ -179,7 +222,7 @@ class TestTransactionProcessingInSaveSeqDiag(object):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction, error_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        messages = htmlvis.seqdiag.draw.call_args[1]['messages']
+        messages = _drawn_messages()
         assert len(messages) == 4
 
     def test_converts_transactions_to_messages_ordered_by_elapsed_time(
@@ -194,7 +237,7 @@ class TestTransactionProcessingInSaveSeqDiag(object):
             error_transaction,
         ]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        messages = htmlvis.seqdiag.draw.call_args[1]['messages']
+        messages = _drawn_messages()
         msg_time = [msg.when for msg in messages]
         assert msg_time == [0.01, 0.02, 0.03, 0.05]
 
@@ -205,7 +248,7 @@ class TestTransactionProcessingInSaveSeqDiag(object):
         sniffer_b = Mock()
         sniffer_b.transactions = [error_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer_a, sniffer_b])
-        messages = htmlvis.seqdiag.draw.call_args[1]['messages']
+        messages = _drawn_messages()
         assert len(messages) == 4
 
     def test_opens_the_output_file_path_for_writing(self, mocker,
@@ -215,10 +258,124 @@ class TestTransactionProcessingInSaveSeqDiag(object):
         htmlvis.save_seq_diag('/fake/path', [sniffer])
         open.assert_called_once_with('/fake/path', 'w')
 
+    def test_draws_with_plantuml_by_default(self, successful_transaction):
+        sniffer = Mock()
+        sniffer.transactions = [successful_transaction]
+        htmlvis.save_seq_diag('/fake/path', [sniffer])
+        assert htmlvis.seqdiag.draw.call_args[1]['backend'] == 'plantuml'
+
+    def test_draws_with_the_selected_backend(self, successful_transaction):
+        sniffer = Mock()
+        sniffer.transactions = [successful_transaction]
+        htmlvis.save_seq_diag('/fake/path', [sniffer], backend='svg')
+        assert htmlvis.seqdiag.draw.call_args[1]['backend'] == 'svg'
+
+    def test_saves_pages_when_a_page_size_is_given(self, mocker,
+                                                   successful_transaction):
+        mocker.patch('htmlvis.paging.save_pages')
+        sniffer = Mock()
+        sniffer.transactions = [successful_transaction]
+        htmlvis.save_seq_diag(
+            '/fake/path', [sniffer], backend='svg', page_size=1)
+        output_file_path, pages = htmlvis.paging.save_pages.call_args[0]
+        assert output_file_path == '/fake/path'
+        assert [len(page.messages) for page in pages] == [1, 1]
+        assert htmlvis.paging.save_pages.call_args[1]['backend'] == 'svg'
+
+    def test_pages_are_rendered_by_the_given_workers(
+            self, mocker, successful_transaction):
+        mocker.patch('htmlvis.paging.save_pages')
+        sniffer = Mock()
+        sniffer.transactions = [successful_transaction]
+        htmlvis.save_seq_diag('/fake/path', [sniffer], page_size=1, workers=4)
+        assert htmlvis.paging.save_pages.call_args[1]['workers'] == 4
+
     def test_writes_the_html_sequence_diagram_to_the_output_file(
             self, mocker, successful_transaction):
         sniffer = Mock()
         sniffer.transactions = [successful_transaction]
         htmlvis.save_seq_diag('/fake/path', [sniffer])
-        open.return_value.write.assert_called_once_with(
-            htmlvis.seqdiag.draw.return_value)
+        assert htmlvis.seqdiag.draw.call_args[1]['output'] is (
+            open.return_value)
+
+    def test_formats_notes_with_the_given_formatter(self,
+                                                    successful_transaction):
+        sniffer = Mock()
+        sniffer.transactions = [successful_transaction]
+        note_formatter = Mock()
+        htmlvis.save_seq_diag(
+            '/fake/path', [sniffer], note_formatter=note_formatter)
+        assert htmlvis.seqdiag.draw.call_args[1]['note_formatter'] is (
+            note_formatter)
+
+    def test_flushes_the_sniffers_before_drawing(self, mocker,
+                                                 successful_transaction):
+        sniffer = StoreSniffer([successful_transaction])
+        mocker.patch.object(sniffer, 'flush')
+        htmlvis.save_seq_diag('/fake/path', [sniffer])
+        sniffer.flush.assert_called_once_with()
+
+
+class TestMessageMergingInSaveSeqDiag(object):
+    def test_merges_messages_of_ordered_sniffers_by_elapsed_time(self):
+        sniffer_a = StoreSniffer(
+            [make_transaction(0, 0.1, 0.2),
+             make_transaction(0, 0.5, 0.6)])
+        sniffer_b = StoreSniffer(
+            [make_transaction(0, 0.15, 0.3),
+             make_transaction(0, 0.35, 0.4)])
+        htmlvis.save_seq_diag('/fake/path', [sniffer_a, sniffer_b])
+        msg_time = [msg.when for msg in _drawn_messages()]
+        assert msg_time == [0.1, 0.15, 0.2, 0.3, 0.35, 0.4, 0.5, 0.6]
+
+    def test_sorts_messages_of_sniffers_with_overlapping_transactions(self):
+        sniffer = StoreSniffer(
+            [make_transaction(0, 0.3, 0.4),
+             make_transaction(0, 0.1, 0.5)])
+        assert not sniffer.ordered
+        htmlvis.save_seq_diag('/fake/path', [sniffer])
+        msg_time = [msg.when for msg in _drawn_messages()]
+        assert msg_time == [0.1, 0.3, 0.4, 0.5]
+
+    def test_ties_keep_sniffer_and_capture_order(self):
+        sniffer_a = StoreSniffer([
+            make_transaction(
+                0, 0.1, 0.1, client_name='A', server_name='Server')
+        ])
+        sniffer_b = StoreSniffer([
+            make_transaction(
+                0, 0.1, 0.1, client_name='B', server_name='Server')
+        ])
+        htmlvis.save_seq_diag('/fake/path', [sniffer_a, sniffer_b])
+        messages = [(msg.category.name, msg.src, msg.dst)
+                    for msg in _drawn_messages()]
+        assert messages == [
+            ('request', 'A', 'Server'),
+            ('response', 'Server', 'A'),
+            ('request', 'B', 'Server'),
+            ('response', 'Server', 'B'),
+        ]
+
+    def test_transactions_can_be_captured_while_merging(self):
+        sniffer = StoreSniffer(
+            [make_transaction(0, 0.1, 0.2),
+             make_transaction(1, 0.3, 0.4)],
+            store=RingBufferStore(capacity=10))
+        messages = htmlvis.htmlvis._merge_messages([sniffer])
+        first = next(messages)
+        sniffer._record(make_transaction(2, 0.5, 0.6))
+        msg_time = [msg.when for msg in [first] + list(messages)]
+        assert msg_time == [0.1, 0.2, 0.3, 0.4]
+
+    def test_messages_of_ordered_sniffers_are_merged_lazily(self, mocker):
+        def transactions():
+            yield make_transaction(0, 0.1, 0.2)
+            raise AssertionError('transactions consumed before drawing')
+
+        sniffer = StoreSniffer()
+        mocker.patch.object(
+            StoreSniffer,
+            'transactions',
+            new_callable=PropertyMock,
+            return_value=transactions())
+        htmlvis.save_seq_diag('/fake/path', [sniffer])
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import htmlvis
+import pytest
+from htmlvis import bottle_sniffer, requests_sniffer
+
+
+def _modules_imported_by(statement):
+    output = subprocess.check_output(
+        [
+            sys.executable, '-c',
+            '%s; import sys; print("\\n".join(sys.modules))' % statement
+        ],
+        universal_newlines=True)
+    return set(output.split())
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 7), reason='Module __getattr__ needs Python 3.7')
+def test_importing_the_package_imports_no_dependency():
+    imported = _modules_imported_by('import htmlvis')
+    for name in ('bottle', 'requests', 'attr', 'six', 'json',
+                 'htmlvis.htmlvis', 'htmlvis.plantuml', 'htmlvis.paging'):
+        assert name not in imported
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 7), reason='Module __getattr__ needs Python 3.7')
+def test_capturing_with_requests_does_not_import_the_rendering_stack():
+    imported = _modules_imported_by('from htmlvis import RequestsSniffer')
+    for name in ('bottle', 'json', 'htmlvis.plantuml', 'htmlvis.svg',
+                 'htmlvis.paging'):
+        assert name not in imported
+
+
+def test_public_names_are_loaded_on_first_use():
+    assert htmlvis.RequestsSniffer is requests_sniffer.RequestsSniffer
+    assert htmlvis.BottleSniffer is bottle_sniffer.BottleSniffer
+    assert 'save_seq_diag' in dir(htmlvis)
+
+
+def test_unknown_names_are_still_missing():
+    with pytest.raises(AttributeError):
+        htmlvis.NoSuchSniffer
@@ -0,0 +1,156 @@
+import os
+import re
+
+import pytest
+from htmlvis import formatting, paging, seqdiag_model
+
+
+def _message(when, src='Client', dst='Server', note=''):
+    return seqdiag_model.Message(
+        category=seqdiag_model.Category.request,
+        src=src,
+        dst=dst,
+        text='GET /',
+        note=note,
+        when=when)
+
+
+class TestPaginate(object):
+    def test_everything_fits_in_one_page_without_limits(self):
+        messages = [_message(when) for when in range(10)]
+        pages = list(paging.paginate(messages))
+        assert len(pages) == 1
+        assert pages[0].messages == messages
+
+    def test_splits_by_number_of_messages(self):
+        messages = [_message(when) for when in range(10)]
+        pages = list(paging.paginate(messages, max_messages=4))
+        assert [len(page.messages) for page in pages] == [4, 4, 2]
+        assert [page.number for page in pages] == [1, 2, 3]
+
+    def test_splits_by_approximate_description_size(self):
+        messages = [_message(when, note='x' * 100) for when in range(10)]
+        pages = list(paging.paginate(messages, max_bytes=250))
+        assert [len(page.messages) for page in pages] == [2] * 5
+
+    def test_a_message_bigger_than_the_budget_gets_its_own_page(self):
+        messages = [_message(0), _message(1, note='x' * 1000), _message(2)]
+        pages = list(paging.paginate(messages, max_bytes=250))
+        assert [len(page.messages) for page in pages] == [1, 1, 1]
+
+    def test_splits_by_time_window(self):
+        messages = [_message(when * 0.5) for when in range(10)]
+        pages = list(paging.paginate(messages, max_duration=1.0))
+        assert [[msg.when for msg in page.messages] for page in pages] == [
+            [0.0, 0.5, 1.0], [1.5, 2.0, 2.5], [3.0, 3.5, 4.0], [4.5]
+        ]
+
+    def test_pages_declare_every_participant_seen_so_far(self):
+        messages = [
+            _message(0, 'A', 'B'),
+            _message(1, 'C', 'B'),
+            _message(2, 'A', 'B'),
+        ]
+        pages = list(paging.paginate(messages, max_messages=1))
+        assert [page.participants for page in pages] == [
+            ('A', 'B'), ('A', 'B', 'C'), ('A', 'B', 'C')
+        ]
+
+    def test_pages_are_produced_lazily(self):
+        def messages():
+            for when in range(3):
+                yield _message(when)
+            raise AssertionError('messages consumed past the first page')
+
+        pages = paging.paginate(messages(), max_messages=2)
+        assert len(next(pages).messages) == 2
+
+    def test_no_messages_means_no_pages(self):
+        assert list(paging.paginate([], max_messages=1)) == []
+
+
+class TestSavePages(object):
+    @pytest.fixture
+    def index_path(self, tmpdir):
+        return str(tmpdir.join('diagram.html'))
+
+    def test_writes_a_file_per_page_and_an_index(self, index_path):
+        messages = [_message(when) for when in range(5)]
+        paging.save_pages(
+            index_path, paging.paginate(messages, max_messages=2), 'svg')
+        directory = os.path.dirname(index_path)
+        assert sorted(os.listdir(directory)) == [
+            'diagram-1.html', 'diagram-2.html', 'diagram-3.html',
+            'diagram.html'
+        ]
+
+    def test_the_index_links_every_page(self, index_path):
+        messages = [_message(when) for when in range(5)]
+        paging.save_pages(
+            index_path, paging.paginate(messages, max_messages=2), 'svg')
+        with open(index_path) as index_file:
+            index = index_file.read()
+        assert re.findall('href="([^"]+)"', index) == [
+            'diagram-1.html', 'diagram-2.html', 'diagram-3.html'
+        ]
+
+    def test_pages_link_the_index_and_their_neighbours(self, index_path):
+        messages = [_message(when) for when in range(5)]
+        paging.save_pages(
+            index_path, paging.paginate(messages, max_messages=2), 'svg')
+        links = []
+        for number in range(1, 4):
+            page_path = index_path.replace('.html', '-%d.html' % number)
+            with open(page_path) as page_file:
+                links.append(re.findall('href="([^"]+)"', page_file.read()))
+        assert links == [
+            ['diagram.html', 'diagram-2.html'],
+            ['diagram.html', 'diagram-1.html', 'diagram-3.html'],
+            ['diagram.html', 'diagram-2.html'],
+        ]
+
+    def test_every_page_draws_the_participants_seen_so_far(self, index_path):
+        messages = [_message(0, 'A', 'B'), _message(1, 'C', 'D')]
+        paging.save_pages(
+            index_path, paging.paginate(messages, max_messages=1), 'svg')
+        with open(index_path.replace('.html', '-2.html')) as page_file:
+            page = page_file.read()
+        assert re.findall('>([A-D])</text>', page) == ['A', 'B', 'C', 'D']
+
+    def test_pages_are_drawn_with_the_selected_backend(self, index_path):
+        paging.save_pages(index_path, paging.paginate([_message(0)]),
+                          'plantuml')
+        with open(index_path.replace('.html', '-1.html')) as page_file:
+            assert 'http://www.plantuml.com/plantuml/svg/' in page_file.read()
+
+    @pytest.mark.parametrize('backend', ['plantuml', 'svg'])
+    def test_parallel_rendering_writes_the_same_files(self, tmpdir, backend):
+        def messages():
+            for when in range(50):
+                msg = _message(
+                    when,
+                    src='Client %d' % (when % 3),
+                    note='{"n": %d, "data": %s}' % (when, [when] * when))
+                msg.data = {'size': 1000 + when, 'digest': str(when)}
+                yield msg
+
+        sequential_dir = tmpdir.mkdir('sequential')
+        parallel_dir = tmpdir.mkdir('parallel')
+        note_formatter = formatting.NoteFormatter(
+            budget=formatting.NoteBudget(max_bytes=100))
+        paging.save_pages(
+            str(sequential_dir.join('diagram.html')),
+            paging.paginate(messages(), max_messages=7),
+            backend,
+            note_formatter=note_formatter)
+        paging.save_pages(
+            str(parallel_dir.join('diagram.html')),
+            paging.paginate(messages(), max_messages=7),
+            backend,
+            workers=2,
+            note_formatter=note_formatter)
+        file_names = sorted(os.listdir(str(sequential_dir)))
+        assert sorted(os.listdir(str(parallel_dir))) == file_names
+        for file_name in file_names:
+            assert (parallel_dir.join(file_name).read() ==
+                    sequential_dir.join(file_name).read())
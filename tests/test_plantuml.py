@@ -1,37 +1,18 @@
+import io
 import json
 import pytest
 from htmlvis import plantuml, plantuml_text_encoding, seqdiag_model
 
 
-@pytest.fixture
-def sample_request():
-    return seqdiag_model.Message(
-        category=seqdiag_model.Category.request,
-        src='Client A',
-        dst='Server A',
-        text='hi there',
-        when=0.0,
-        note='multi\nline',
-        data='')
-
-
-@pytest.fixture
-def sample_response():
-    return seqdiag_model.Message(
-        category=seqdiag_model.Category.response,
-        src='Server A',
-        dst='Client A',
-        text='hello',
-        when=0.0,
-        note='multi\nline',
-        data='')
-
-
 @pytest.fixture(autouse=True)
 def mock_plantuml(mocker):
     mocker.patch('htmlvis.plantuml_text_encoding.encode')
 
 
+def _encoded_text_repr():
+    return ''.join(plantuml_text_encoding.encode.call_args[0][0])
+
+
 class TestTextualRepresentation(object):
     def test_source_is_mandatory(self, sample_request):
         with pytest.raises(ValueError):
@@ -47,55 +28,55 @@ class TestTextualRepresentation(object):
 
     def test_sources_are_quoted(self, sample_request):
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert '"Client A"' in text_repr
 
     def test_destinations_are_quoted(self, sample_request):
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert '"Server A"' in text_repr
 
     def test_double_quotes_in_source_name_are_converted_to_single_quotes(
             self, sample_request):
         sample_request.src = 'This " contains quotes"'
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert r"This ' contains quotes'" in text_repr
 
     def test_double_quotes_in_destination_name_are_converted_to_single_quotes(
             self, sample_request):
         sample_request.dst = 'This " contains quotes"'
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert r"This ' contains quotes'" in text_repr
 
     def test_request_notes_are_drawn_at_the_right_of_the_destination(
             self, sample_request):
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert 'note right\n    multi\n    line\nend note' in text_repr
 
     def test_no_note_is_added_if_request_has_no_notes(self, sample_request):
         sample_request.note = None
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert 'note' not in text_repr
 
     def test_empty_notes_are_not_added(self, sample_request):
         sample_request.note = ''
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert 'note' not in text_repr
 
     def test_handles_two_messages(self, sample_request, sample_response):
         plantuml.html_image([sample_request, sample_response])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert 'hi there' in text_repr
         assert 'hello' in text_repr
 
     def test_request_syntax(self, sample_request):
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert '"Client A" -> "Server A": hi there\n' in text_repr
 
     def test_returns_an_img_element(self, sample_request):
@@ -103,28 +84,67 @@ class TestTextualRepresentation(object):
         img_element = plantuml.html_image([sample_request])
         assert img_element == '<img src="http://www.plantuml.com/plantuml/svg/lalala">'
 
+    def test_participants_are_declared_first(self, sample_request):
+        plantuml.html_image(
+            [sample_request], participants=['Server A', 'Client "B"'])
+        text_repr = _encoded_text_repr()
+        assert text_repr.startswith(
+            'participant "Server A"\nparticipant "Client \'B\'"\n')
+
+    def test_a_note_is_followed_by_a_new_line(self, sample_request,
+                                              sample_response):
+        plantuml.html_image([sample_request, sample_response])
+        text_repr = _encoded_text_repr()
+        assert 'end note\n"Client A" <-- "Server A": hello\n' in text_repr
+
+    def test_messages_can_be_a_generator(self, sample_request,
+                                         sample_response):
+        plantuml.html_image(
+            msg for msg in [sample_request, sample_response])
+        text_repr = _encoded_text_repr()
+        assert 'hi there' in text_repr
+        assert 'hello' in text_repr
+
+    def test_messages_are_not_consumed_before_encoding(self, sample_request):
+        def messages():
+            yield sample_request
+            raise AssertionError('messages consumed before encoding')
+
+        plantuml.html_image(messages())
+
+    def test_the_img_element_is_written_to_the_output(self, sample_request):
+        output = io.StringIO()
+        result = plantuml.html_image([sample_request], output=output)
+        encoded_repr = ''.join(
+            plantuml_text_encoding.iterencode(
+                plantuml._generate_textual_representation([sample_request])))
+        assert result is None
+        assert output.getvalue() == (
+            '<img src="http://www.plantuml.com/plantuml/svg/%s">' %
+            encoded_repr)
+
 
 class TestFormatting(object):
     def test_a_request_is_drawn_with_solid_line(self, sample_request):
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert '"Client A" -> "Server A"' in text_repr
 
     def test_a_response_is_drawn_with_a_dotted_line(self, sample_response):
         plantuml.html_image([sample_response])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert '"Client A" <-- "Server A"' in text_repr
 
     def test_response_notes_are_drawn_at_the_left_of_the_destination(
             self, sample_response):
         plantuml.html_image([sample_response])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         assert 'note left\n    multi\n    line\nend note' in text_repr
 
     def test_json_notes_are_pretty_formatted(self, sample_request):
         sample_request.note = '{"name": "John", "age": 33}'
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         # json dumps adds a trailing space in Python 2. https://bugs.python.org/issue16333
         text_repr = text_repr.replace(' \n', '\n')
         assert '    {\n        "name": "John",\n        "age": 33\n    }' in text_repr
@@ -137,7 +157,7 @@ class TestFormatting(object):
                                                    json_note, formatted_note):
         sample_request.note = json_note
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         # json dumps adds a trailing space in Python 2. https://bugs.python.org/issue16333
         text_repr = text_repr.replace(' \n', '\n')
         assert formatted_note in text_repr
@@ -152,7 +172,7 @@ class TestFormatting(object):
                                         formatted_note):
         sample_request.note = json_note
         plantuml.html_image([sample_request])
-        text_repr = plantuml_text_encoding.encode.call_args[0][0]
+        text_repr = _encoded_text_repr()
         # json dumps adds a trailing space in Python 2. https://bugs.python.org/issue16333
         text_repr = text_repr.replace(' \n', '\n')
         assert formatted_note in text_repr
@@ -1,3 +1,8 @@
+import random
+import string
+import zlib
+
+import pytest
 from htmlvis import plantuml_text_encoding
 
 
@@ -357,3 +362,71 @@ def test_lifeline_activation_and_destruction():
     '''
     expected = 'ROz12iCW44Ntdc8ka0k48AWvGQ5qBMOMKeZfP5hexUkCIMb3NEdtyVwCWNgMI9nJNkBCS5sHZ95KRj1PS3sCvLRehcbCd5-H4LoZd22-Xs60H5W_BlXuuifWxJ_l6--53-VAeCy0NLCAC9OPDPsgaygxChkcZRRL1UsUDlHOgaFAFjBx5Vwi8i47'
     assert plantuml_text_encoding.encode(diagram) == expected
+
+
+@pytest.mark.parametrize('length', list(range(10)) + [1000, 65537])
+def test_base64_encoder_matches_the_reference_encoder(length):
+    data = bytearray(random.Random(length).getrandbits(8)
+                     for _ in range(length))
+    reference = plantuml_text_encoding._encode_similar_to_base64(data)
+    assert plantuml_text_encoding._encode_with_base64(bytes(data)) == reference
+
+
+def test_all_six_bit_groups_are_translated_like_the_reference_encoder():
+    # 0x00, 0x10, 0x83 ... enumerates every 6-bit value across 4-char groups
+    data = bytearray()
+    for six_bits in range(0, 64, 4):
+        group = (six_bits << 18) | ((six_bits + 1) << 12) | (
+            (six_bits + 2) << 6) | (six_bits + 3)
+        data += bytearray([group >> 16, (group >> 8) & 0xFF, group & 0xFF])
+    reference = plantuml_text_encoding._encode_similar_to_base64(data)
+    assert plantuml_text_encoding._encode_with_base64(bytes(data)) == reference
+    assert sorted(reference) == sorted(
+        plantuml_text_encoding.PLANTUML_ALPHABET.decode('ascii'))
+
+
+def test_iterencode_yields_the_same_encoding_as_encode():
+    diagram = ''.join('Alice -> Bob: message %d\n' % i for i in range(5000))
+    lines = diagram.splitlines(True)
+    assert ''.join(plantuml_text_encoding.iterencode(
+        lines)) == plantuml_text_encoding.encode(diagram)
+
+
+def test_iterencode_matches_zlib_compress_for_arbitrary_chunking():
+    rand = random.Random(0)
+    diagram = ''.join(
+        rand.choice(u'abé中 -> :\n') for _ in range(20000))
+    chunks = []
+    pos = 0
+    while pos < len(diagram):
+        size = rand.randint(0, 700)
+        chunks.append(diagram[pos:pos + size])
+        pos += size
+    compressed = zlib.compress(diagram.encode('utf-8'))[2:-4]
+    expected = plantuml_text_encoding._encode_similar_to_base64(
+        bytearray(compressed))
+    assert ''.join(plantuml_text_encoding.iterencode(chunks)) == expected
+
+
+def test_iterencode_is_lazy():
+    rand = random.Random(0)
+    incompressible = ''.join(
+        rand.choice(string.ascii_letters) for _ in range(200000))
+
+    def chunks():
+        yield incompressible
+        raise AssertionError('the second chunk should not be requested')
+
+    encoded = plantuml_text_encoding.iterencode(chunks())
+    assert next(encoded)
+
+
+def test_iterencode_only_yields_complete_groups_until_the_end():
+    encoded = list(
+        plantuml_text_encoding.iterencode(['x' * 100000, 'y' * 100000]))
+    assert all(len(piece) % 4 == 0 for piece in encoded)
+
+
+def test_iterencode_of_no_chunks_encodes_an_empty_diagram():
+    assert ''.join(plantuml_text_encoding.iterencode(
+        [])) == plantuml_text_encoding.encode('')
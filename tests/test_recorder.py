@@ -0,0 +1,138 @@
+import threading
+
+import pytest
+from htmlvis.recorder import BLOCK, DROP, BackgroundRecorder
+
+
+@pytest.fixture
+def recorder():
+    recorder = BackgroundRecorder(max_pending=2, overflow=DROP)
+    yield recorder
+    recorder.close()
+
+
+def _stall(recorder):
+    "Keep the worker busy until the returned event is set"
+    started = threading.Event()
+    release = threading.Event()
+
+    def wait():
+        started.set()
+        release.wait()
+
+    recorder.submit(wait)
+    started.wait()
+    return release
+
+
+def test_records_in_the_worker_thread(recorder):
+    threads = []
+    recorder.submit(lambda: threads.append(threading.current_thread()))
+    recorder.flush()
+    assert threads == [recorder._worker]
+
+
+def test_records_in_submission_order(recorder):
+    recorder.max_pending = 100
+    recorded = []
+    for index in range(50):
+        recorder.submit(recorded.append, index)
+    recorder.flush()
+    assert recorded == list(range(50))
+
+
+def test_flush_times_out_while_the_worker_is_busy(recorder):
+    release = _stall(recorder)
+    assert not recorder.flush(timeout=0.01)
+    release.set()
+    assert recorder.flush()
+
+
+def test_drops_submissions_when_too_many_are_pending(recorder):
+    recorded = []
+    release = _stall(recorder)
+    results = [recorder.submit(recorded.append, index) for index in range(3)]
+    release.set()
+    recorder.flush()
+    assert results == [True, True, False]
+    assert recorded == [0, 1]
+    assert recorder.dropped == 1
+
+
+def test_blocks_submissions_until_there_is_room():
+    recorder = BackgroundRecorder(max_pending=2, overflow=BLOCK)
+    recorded = []
+    release = _stall(recorder)
+    recorder.submit(recorded.append, 0)
+    recorder.submit(recorded.append, 1)
+    submitter = threading.Thread(
+        target=recorder.submit, args=(recorded.append, 2))
+    submitter.start()
+    submitter.join(0.05)
+    assert submitter.is_alive()
+    release.set()
+    submitter.join()
+    recorder.close()
+    assert recorded == [0, 1, 2]
+
+
+def test_counts_failures_and_keeps_recording(recorder):
+    recorded = []
+    recorder.submit(lambda: 1 / 0)
+    recorder.submit(recorded.append, 'after')
+    recorder.flush()
+    assert recorder.failed == 1
+    assert recorded == ['after']
+
+
+def test_close_records_everything_pending_and_stops_the_worker(recorder):
+    recorded = []
+    recorder.submit(recorded.append, 'last')
+    recorder.close()
+    assert recorded == ['last']
+    assert not recorder._worker.is_alive()
+
+
+def test_rejects_unknown_overflow_policies():
+    with pytest.raises(ValueError):
+        BackgroundRecorder(overflow='ignore')
+
+
+def test_flush_returns_at_once_after_close(recorder):
+    recorder.close()
+    assert recorder.flush(timeout=1)
+
+
+def test_drops_submissions_after_close():
+    recorder = BackgroundRecorder(max_pending=1, overflow=BLOCK)
+    recorded = []
+    recorder.close()
+    assert not recorder.submit(recorded.append, 0)
+    assert not recorder.submit(recorded.append, 1)
+    assert recorded == []
+    assert recorder.dropped == 2
+    assert not recorder._pending
+
+
+def test_releases_blocked_submissions_on_close():
+    recorder = BackgroundRecorder(max_pending=1, overflow=BLOCK)
+    recorded = []
+    release = _stall(recorder)
+    recorder.submit(recorded.append, 0)
+    submitter = threading.Thread(
+        target=recorder.submit, args=(recorded.append, 1))
+    submitter.start()
+    closer = threading.Thread(target=recorder.close)
+    closer.start()
+    release.set()
+    closer.join()
+    submitter.join(1)
+    assert not submitter.is_alive()
+    assert recorded[0] == 0
+
+
+def test_logs_failures(recorder, caplog):
+    recorder.submit(lambda: 1 / 0)
+    recorder.flush()
+    assert 'Could not record' in caplog.text
+    assert 'ZeroDivisionError' in caplog.text
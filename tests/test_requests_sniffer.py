@@ -1,10 +1,14 @@
 import json
 import time
 
-import attr
 import requests
 import responses
-from htmlvis import HTTPSniffer, RequestsSniffer
+from htmlvis import HTTPSniffer, RequestsSniffer, transaction_to_dict
+from htmlvis.filters import Rule
+from htmlvis.headers import HeaderStore
+from htmlvis.recorder import BackgroundRecorder
+from htmlvis.transaction_store import RingBufferStore
+from htmlvis.urls import ID_RULES, URLParser
 from pytest import fixture, mark
 
 
@@ -73,16 +77,66 @@ def test_records_the_request_url_path(success_response):
     assert transaction.request.url_path == '/api/1/success'
 
 
+@responses.activate
+def test_records_the_query_string_in_the_url_path():
+    responses.add(responses.GET, 'http://my.sniffer.com/api/1/success')
+    sniffing_hook = RequestsSniffer('', '')
+    requests.get(
+        'http://my.sniffer.com/api/1/success?my.sniffer.com=1',
+        hooks={'response': sniffing_hook})
+    transaction = sniffing_hook.transactions[0]
+    assert transaction.request.url_path == '/api/1/success?my.sniffer.com=1'
+
+
+@responses.activate
+def test_does_not_capture_excluded_transactions(success_response,
+                                                error_response):
+    sniffing_hook = RequestsSniffer(
+        '', '', exclude=[Rule(path='/api/*/notfound')])
+    for url in ('http://mysniffer.com/api/1/notfound',
+                'http://mysniffer.com/api/1/success'):
+        requests.get(url, hooks={'response': sniffing_hook})
+    assert [t.request.url_path for t in sniffing_hook.transactions] == [
+        '/api/1/success'
+    ]
+
+
+@responses.activate
+def test_only_captures_included_transactions(success_response,
+                                             error_response):
+    sniffing_hook = RequestsSniffer('', '', include=[Rule(status='4xx')])
+    for url in ('http://mysniffer.com/api/1/notfound',
+                'http://mysniffer.com/api/1/success'):
+        requests.get(url, hooks={'response': sniffing_hook})
+    assert [t.request.url_path for t in sniffing_hook.transactions] == [
+        '/api/1/notfound'
+    ]
+
+
+@responses.activate
+def test_records_the_route_given_by_the_url_parser():
+    responses.add(responses.GET, 'http://mysniffer.com/api/1/users/42')
+    sniffing_hook = RequestsSniffer(
+        '', '', url_parser=URLParser(route_rules=ID_RULES))
+    requests.get(
+        'http://mysniffer.com/api/1/users/42',
+        hooks={'response': sniffing_hook})
+    transaction = sniffing_hook.transactions[0]
+    assert transaction.request.route == '/api/{id}/users/{id}'
+
+
 @responses.activate
 @mark.parametrize("url, response_fixture",
-                  [('http://mysniffer.com/api/1/success', success_response),
-                   ('http://mysniffer.com/api/1/notfound', error_response)])
-def test_transactions_are_json_serializable(url, response_fixture):
-    response_fixture()
+                  [('http://mysniffer.com/api/1/success', 'success_response'),
+                   ('http://mysniffer.com/api/1/notfound', 'error_response')])
+def test_transactions_are_json_serializable(url, response_fixture, request):
+    request.getfixturevalue(response_fixture)
     sniffing_hook = RequestsSniffer('', '')
     requests.get(url, hooks={'response': sniffing_hook})
     transaction = sniffing_hook.transactions[0]
-    json.dumps(attr.asdict(transaction))
+    serialized = json.loads(json.dumps(transaction_to_dict(transaction)))
+    assert json.loads(serialized['response']['body']) in (
+        {"greeting": "hi there!"}, {"error": "not found"})
 
 
 @responses.activate
@@ -193,7 +247,7 @@ def test_records_the_response_body_if_content_type_is_json():
         'http://mysniffer.com/api/1/success',
         hooks={'response': sniffing_hook})
     transaction = sniffing_hook.transactions[0]
-    assert transaction.response.body == '{"Better safe": "Than sorry"}'
+    assert transaction.response.body.text == '{"Better safe": "Than sorry"}'
 
 
 @responses.activate
@@ -207,7 +261,50 @@ def test_records_the_response_body_if_content_is_plain_text():
         'http://mysniffer.com/api/1/success',
         hooks={'response': sniffing_hook})
     transaction = sniffing_hook.transactions[0]
-    assert transaction.response.body == 'Better safe than sorry'
+    assert transaction.response.body.text == 'Better safe than sorry'
+
+
+@responses.activate
+def test_keeps_the_raw_response_body_and_its_declared_encoding():
+    responses.add(
+        responses.GET,
+        'http://mysniffer.com/api/1/success',
+        body=u'D\xe9j\xe0 vu'.encode('latin-1'),
+        content_type='text/plain; charset=latin-1')
+    sniffing_hook = RequestsSniffer('', '')
+    requests.get(
+        'http://mysniffer.com/api/1/success',
+        hooks={'response': sniffing_hook})
+    body = sniffing_hook.transactions[0].response.body
+    assert body.content == u'D\xe9j\xe0 vu'.encode('latin-1')
+    assert body.encoding == 'latin-1'
+    assert body.text == u'D\xe9j\xe0 vu'
+
+
+@responses.activate
+def test_skips_the_body_of_streamed_responses_by_default(success_response):
+    sniffing_hook = RequestsSniffer('', '')
+    response = requests.get(
+        'http://mysniffer.com/api/1/success',
+        stream=True,
+        hooks={'response': sniffing_hook})
+    assert sniffing_hook.transactions[0].response.body is None
+    assert response.json() == {"greeting": "hi there!"}
+
+
+@responses.activate
+def test_keeps_the_start_of_streamed_bodies_as_they_are_read(
+        success_response):
+    sniffing_hook = RequestsSniffer('', '', stream_body_bytes=8)
+    response = requests.get(
+        'http://mysniffer.com/api/1/success',
+        stream=True,
+        hooks={'response': sniffing_hook})
+    body = sniffing_hook.transactions[0].response.body
+    assert body.content == b''
+    assert response.json() == {"greeting": "hi there!"}
+    assert body.content == b'{"greeti'
+    assert body.truncated
 
 
 @responses.activate
@@ -230,6 +327,41 @@ def test_records_the_response_status_for_an_error_response(error_response):
     assert transaction.response.status == '404'
 
 
+@responses.activate
+def test_repeated_headers_share_a_single_mapping(success_response):
+    sniffing_hook = RequestsSniffer('', '')
+    for _ in range(2):
+        requests.get(
+            'http://mysniffer.com/api/1/success',
+            hooks={'response': sniffing_hook})
+    first, second = sniffing_hook.transactions
+    assert first.request.headers is second.request.headers
+    assert first.response.headers is second.response.headers
+
+
+@responses.activate
+def test_lazy_headers_are_read_from_the_response(success_response):
+    sniffing_hook = RequestsSniffer('', '', headers=HeaderStore(lazy=True))
+    requests.get(
+        'http://mysniffer.com/api/1/success',
+        hooks={'response': sniffing_hook})
+    transaction = sniffing_hook.transactions[0]
+    assert transaction.response.headers['Content-Type'] == 'application/json'
+
+
+@responses.activate
+def test_repeated_methods_and_statuses_share_a_single_string(
+        success_response):
+    sniffing_hook = RequestsSniffer('', '')
+    for _ in range(2):
+        requests.get(
+            'http://mysniffer.com/api/1/success',
+            hooks={'response': sniffing_hook})
+    first, second = sniffing_hook.transactions
+    assert first.request.method is second.request.method
+    assert first.response.status is second.response.status
+
+
 @responses.activate
 def test_transaction_includes_the_client_and_server_name(success_response):
     sniffing_hook = RequestsSniffer('Client name', 'Server name')
@@ -281,6 +413,45 @@ def test_restart_resets_the_captured_transactions(success_response):
     assert len(sniffing_hook.transactions) == 1
 
 
+@responses.activate
+def test_restart_discards_transactions_still_being_recorded(success_response):
+    recorder = BackgroundRecorder()
+    sniffing_hook = RequestsSniffer('', '', recorder=recorder)
+    requests.get(
+        'http://mysniffer.com/api/1/success',
+        hooks={'response': sniffing_hook})
+    sniffing_hook.restart()
+    recorder.close()
+    assert len(sniffing_hook.transactions) == 0
+
+
+@responses.activate
+def test_records_transactions_in_the_given_store(success_response):
+    sniffing_hook = RequestsSniffer('', '', store=RingBufferStore(capacity=2))
+    for _ in range(3):
+        requests.get(
+            'http://mysniffer.com/api/1/success',
+            hooks={'response': sniffing_hook})
+    assert len(sniffing_hook.transactions) == 2
+    assert sniffing_hook.transactions.evicted_transactions == 1
+
+
+@responses.activate
+def test_transactions_are_built_by_the_given_recorder(success_response):
+    recorder = BackgroundRecorder()
+    sniffing_hook = RequestsSniffer('', '', recorder=recorder)
+    requests.get(
+        'http://mysniffer.com/api/1/success',
+        hooks={'response': sniffing_hook})
+    sniffing_hook.flush()
+    recorder.close()
+    transaction = sniffing_hook.transactions[0]
+    assert transaction.request.url_path == '/api/1/success'
+    assert json.loads(transaction.response.body.text) == {
+        "greeting": "hi there!"
+    }
+
+
 @fixture
 def transactions_response():
     responses.add(
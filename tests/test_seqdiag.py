@@ -0,0 +1,25 @@
+import pytest
+from htmlvis import seqdiag
+
+
+@pytest.mark.parametrize('backend', ['plantuml', 'svg'])
+def test_draws_with_the_selected_backend(mocker, backend):
+    mocker.patch.dict(seqdiag.BACKENDS, {backend: mocker.Mock()})
+    html = seqdiag.draw(messages=[], backend=backend)
+    seqdiag.BACKENDS[backend].assert_called_once_with(
+        [],
+        output=None,
+        participants=(),
+        note_formatter=None)
+    assert html == seqdiag.BACKENDS[backend].return_value
+
+
+def test_uses_plantuml_by_default(mocker):
+    mocker.patch.dict(seqdiag.BACKENDS, {'plantuml': mocker.Mock()})
+    seqdiag.draw(messages=[])
+    assert seqdiag.BACKENDS['plantuml'].called
+
+
+def test_rejects_unknown_backends():
+    with pytest.raises(ValueError):
+        seqdiag.draw(messages=[], backend='graphviz')
@@ -0,0 +1,49 @@
+import pytest
+from htmlvis import seqdiag_model
+
+
+def test_messages_have_no_instance_dict():
+    msg = seqdiag_model.Message(
+        category=seqdiag_model.Category.request,
+        src='Client',
+        dst='Server',
+        text='GET /',
+        note='',
+        when=0.0)
+    assert not hasattr(msg, '__dict__')
+
+
+def test_the_source_is_validated():
+    with pytest.raises(ValueError):
+        seqdiag_model.Message(
+            category=seqdiag_model.Category.request,
+            src='',
+            dst='Server',
+            text='GET /',
+            note='',
+            when=0.0)
+
+
+def test_make_message_builds_the_same_message():
+    kwargs = dict(
+        category=seqdiag_model.Category.response,
+        src='Server',
+        dst='Client',
+        text='200 OK',
+        note='{}',
+        when=1.5,
+        data={'status': '200 OK'})
+    assert seqdiag_model.make_message(**kwargs) == seqdiag_model.Message(
+        **kwargs)
+
+
+def test_make_message_does_not_validate():
+    msg = seqdiag_model.make_message(
+        category=seqdiag_model.Category.request,
+        src='',
+        dst='Server',
+        text='GET /',
+        note='',
+        when=0.0,
+        data=None)
+    assert msg.src == ''
@@ -0,0 +1,130 @@
+import io
+import xml.etree.ElementTree as ElementTree
+
+from htmlvis import svg
+
+SVG_NS = '{http://www.w3.org/2000/svg}'
+
+
+def _parse(svg_element):
+    return ElementTree.fromstring(svg_element)
+
+
+def _texts(root):
+    return [
+        ''.join(text.itertext()) for text in root.iter(SVG_NS + 'text')
+    ]
+
+
+class TestSVGRendering(object):
+    def test_returns_an_svg_element(self, sample_request):
+        root = _parse(svg.html_image([sample_request]))
+        assert root.tag == SVG_NS + 'svg'
+
+    def test_participants_are_drawn_once_in_order_of_appearance(
+            self, sample_request, sample_response):
+        root = _parse(svg.html_image([sample_request, sample_response]))
+        texts = _texts(root)
+        assert texts[:2] == ['Client A', 'Server A']
+        assert texts.count('Client A') == 1
+
+    def test_given_participants_are_drawn_first(self, sample_request):
+        root = _parse(
+            svg.html_image(
+                [sample_request], participants=['Server A', 'Nobody']))
+        assert _texts(root)[:3] == ['Server A', 'Nobody', 'Client A']
+
+    def test_each_message_is_an_arrow_with_its_text(self, sample_request,
+                                                    sample_response):
+        root = _parse(svg.html_image([sample_request, sample_response]))
+        assert len(root.findall('.//%sline[@marker-end]' % SVG_NS)) == 2
+        assert 'hi there' in _texts(root)
+        assert 'hello' in _texts(root)
+
+    def test_a_request_is_drawn_with_a_solid_line(self, sample_request):
+        root = _parse(svg.html_image([sample_request]))
+        arrow = root.find('.//%sline[@marker-end]' % SVG_NS)
+        assert 'stroke-dasharray' not in arrow.attrib
+
+    def test_a_response_is_drawn_with_a_dotted_line(self, sample_response):
+        root = _parse(svg.html_image([sample_response]))
+        arrow = root.find('.//%sline[@marker-end]' % SVG_NS)
+        assert 'stroke-dasharray' in arrow.attrib
+
+    def test_arrows_go_from_source_to_destination(self, sample_request,
+                                                  sample_response):
+        root = _parse(svg.html_image([sample_request, sample_response]))
+        request_arrow, response_arrow = root.findall(
+            './/%sline[@marker-end]' % SVG_NS)
+        assert int(request_arrow.get('x1')) < int(request_arrow.get('x2'))
+        assert int(response_arrow.get('x1')) > int(response_arrow.get('x2'))
+
+    def test_messages_are_stacked_downwards(self, sample_request,
+                                            sample_response):
+        root = _parse(svg.html_image([sample_request, sample_response]))
+        request_arrow, response_arrow = root.findall(
+            './/%sline[@marker-end]' % SVG_NS)
+        assert int(request_arrow.get('y1')) < int(response_arrow.get('y1'))
+
+    def test_request_notes_are_drawn_at_the_right_of_the_destination(
+            self, sample_request):
+        root = _parse(svg.html_image([sample_request]))
+        arrow = root.find('.//%sline[@marker-end]' % SVG_NS)
+        note = root.find('.//%stext[@font-family="monospace"]' % SVG_NS)
+        assert [line.text for line in note] == ['multi', 'line']
+        assert int(note.get('x')) > int(arrow.get('x2'))
+
+    def test_response_notes_are_drawn_at_the_left_of_the_destination(
+            self, sample_response):
+        root = _parse(svg.html_image([sample_response]))
+        arrow = root.find('.//%sline[@marker-end]' % SVG_NS)
+        note = root.find('.//%stext[@font-family="monospace"]' % SVG_NS)
+        assert int(note.get('x')) < int(arrow.get('x2'))
+
+    def test_everything_is_drawn_inside_the_view_box(self, sample_response):
+        root = _parse(svg.html_image([sample_response]))
+        group = root.find(SVG_NS + 'g')
+        offset = int(group.get('transform')[len('translate('):].split(',')[0])
+        note = root.find('.//%srect[@fill="#fbfb77"]' % SVG_NS)
+        assert int(note.get('x')) + offset >= 0
+        assert int(note.get('x')) + int(note.get('width')) + offset <= int(
+            root.get('width'))
+
+    def test_empty_notes_are_not_added(self, sample_request):
+        sample_request.note = ''
+        root = _parse(svg.html_image([sample_request]))
+        assert root.find('.//%stext[@font-family="monospace"]' %
+                         SVG_NS) is None
+
+    def test_json_notes_are_pretty_formatted(self, sample_request):
+        sample_request.note = '{"name": "John", "age": 33}'
+        root = _parse(svg.html_image([sample_request]))
+        note = root.find('.//%stext[@font-family="monospace"]' % SVG_NS)
+        assert [line.text.rstrip() for line in note] == [
+            '{', '    "name": "John",', '    "age": 33', '}'
+        ]
+
+    def test_text_is_escaped(self, sample_request):
+        sample_request.src = '<Client & "Co">'
+        sample_request.text = 'GET /?a=1&b=2'
+        root = _parse(svg.html_image([sample_request]))
+        assert '<Client & "Co">' in _texts(root)
+        assert 'GET /?a=1&b=2' in _texts(root)
+
+    def test_messages_to_self_are_drawn_as_a_loop(self, sample_request):
+        sample_request.dst = sample_request.src
+        root = _parse(svg.html_image([sample_request]))
+        assert root.find('.//%spolyline' % SVG_NS) is not None
+        assert _texts(root).count('Client A') == 1
+
+    def test_messages_can_be_a_generator(self, sample_request,
+                                         sample_response):
+        root = _parse(
+            svg.html_image(msg for msg in [sample_request, sample_response]))
+        assert len(root.findall('.//%sline[@marker-end]' % SVG_NS)) == 2
+
+    def test_the_svg_element_is_written_to_the_output(self, sample_request):
+        output = io.StringIO()
+        result = svg.html_image([sample_request], output=output)
+        assert result is None
+        assert output.getvalue() == svg.html_image([sample_request])
@@ -0,0 +1,243 @@
+import threading
+
+import pytest
+from htmlvis.body import Body, BodyStore
+from htmlvis.transaction_store import (EVICT_BODIES_FIRST, EVICT_OLDEST,
+                                       ListStore, PerThreadStore,
+                                       RingBufferStore)
+
+from .conftest import make_transaction
+
+
+def _paths(store):
+    return [transaction.request.url_path for transaction in store]
+
+
+class TestListStore(object):
+    def test_keeps_every_transaction_in_order(self):
+        store = ListStore()
+        for index in range(3):
+            store.append(make_transaction(index))
+        assert _paths(store) == ['/0', '/1', '/2']
+        assert len(store) == 3
+        assert store[-1].request.url_path == '/2'
+
+    def test_clear_removes_every_transaction(self):
+        store = ListStore()
+        store.append(make_transaction(0))
+        store.clear()
+        assert len(store) == 0
+
+    def test_snapshot_and_reset_returns_the_transactions(self):
+        store = ListStore()
+        store.append(make_transaction(0))
+        snapshot = store.snapshot_and_reset()
+        store.append(make_transaction(1))
+        assert _paths(snapshot) == ['/0']
+        assert _paths(store) == ['/1']
+
+    def test_shares_identical_bodies_through_the_body_store(self):
+        bodies = BodyStore()
+        store = ListStore(bodies=bodies)
+        for index in range(3):
+            store.append(
+                make_transaction(
+                    index,
+                    request_body='poll' * index,
+                    response_body=Body(content=b'{"status": "ok"}')))
+        first, second, third = [t.response.body.content for t in store]
+        assert first is second is third
+        assert bodies.references(first) == 3
+
+    def test_clear_releases_the_shared_bodies(self):
+        bodies = BodyStore()
+        store = ListStore(bodies=bodies)
+        store.append(make_transaction(0, request_body='x' * 10))
+        store.clear()
+        assert bodies.references('x' * 10) == 0
+
+
+class TestRingBufferStore(object):
+    def test_keeps_the_most_recent_transactions_up_to_its_capacity(self):
+        store = RingBufferStore(capacity=3)
+        for index in range(5):
+            store.append(make_transaction(index))
+        assert _paths(store) == ['/2', '/3', '/4']
+        assert store[0].request.url_path == '/2'
+        assert store[-1].request.url_path == '/4'
+
+    def test_counts_evicted_transactions(self):
+        store = RingBufferStore(capacity=3)
+        for index in range(5):
+            store.append(make_transaction(index))
+        assert store.evicted_transactions == 2
+        assert store.evicted_bodies == 0
+
+    def test_evicts_oldest_transactions_when_bodies_exceed_the_limit(self):
+        store = RingBufferStore(capacity=10, max_body_bytes=10)
+        for index in range(5):
+            store.append(
+                make_transaction(
+                    index, request_body='abc', response_body='de'))
+        assert _paths(store) == ['/3', '/4']
+        assert store.body_bytes == 10
+        assert store.evicted_transactions == 3
+
+    def test_drops_oldest_bodies_before_whole_transactions(self):
+        store = RingBufferStore(
+            capacity=10, max_body_bytes=10, eviction=EVICT_BODIES_FIRST)
+        for index in range(5):
+            store.append(
+                make_transaction(
+                    index, request_body='abc', response_body='de'))
+        assert _paths(store) == ['/0', '/1', '/2', '/3', '/4']
+        assert [(t.request.body, t.response.body) for t in store] == [
+            (None, None), (None, None), (None, None), ('abc', 'de'),
+            ('abc', 'de')
+        ]
+        assert store.body_bytes == 10
+        assert store.evicted_bodies == 6
+        assert store.evicted_transactions == 0
+
+    def test_body_eviction_continues_after_transactions_are_evicted(self):
+        store = RingBufferStore(
+            capacity=3, max_body_bytes=5, eviction=EVICT_BODIES_FIRST)
+        for index in range(6):
+            store.append(make_transaction(index, request_body='abc'))
+        assert [t.request.body for t in store] == [None, None, 'abc']
+        assert store.body_bytes == 3
+        assert store.evicted_transactions == 3
+
+    def test_a_body_bigger_than_the_limit_is_dropped(self):
+        store = RingBufferStore(
+            capacity=3, max_body_bytes=5, eviction=EVICT_BODIES_FIRST)
+        store.append(make_transaction(0, request_body='too long to keep'))
+        assert [t.request.body for t in store] == [None]
+        assert store.body_bytes == 0
+
+    def test_memory_stays_flat_under_sustained_load(self):
+        store = RingBufferStore(capacity=100, max_body_bytes=1000)
+        for index in range(10000):
+            store.append(make_transaction(index, request_body='x' * 20))
+        assert len(store) == 50
+        assert store.body_bytes == 1000
+        assert store.evicted_transactions == 9950
+
+    def test_can_be_appended_to_while_iterated(self):
+        store = RingBufferStore(capacity=3)
+        store.append(make_transaction(0))
+        transactions = iter(store)
+        store.append(make_transaction(1))
+        assert list(transactions) == [make_transaction(0)]
+
+    def test_clear_removes_every_transaction(self):
+        store = RingBufferStore(capacity=3, max_body_bytes=10)
+        store.append(make_transaction(0, request_body='abc'))
+        store.clear()
+        assert len(store) == 0
+        assert store.body_bytes == 0
+
+    @pytest.mark.parametrize('kwargs', [{
+        'capacity': 0
+    }, {
+        'capacity': 1,
+        'eviction': 'newest'
+    }])
+    def test_rejects_invalid_settings(self, kwargs):
+        with pytest.raises(ValueError):
+            RingBufferStore(**kwargs)
+
+    def test_evicted_transactions_release_their_shared_bodies(self):
+        bodies = BodyStore()
+        store = RingBufferStore(capacity=1, bodies=bodies)
+        store.append(make_transaction(0, request_body='x' * 10))
+        store.append(make_transaction(1, request_body='y' * 10))
+        assert bodies.references('x' * 10) == 0
+        assert bodies.references('y' * 10) == 1
+
+    def test_dropped_bodies_release_their_shared_copy(self):
+        bodies = BodyStore()
+        store = RingBufferStore(
+            capacity=3,
+            max_body_bytes=15,
+            eviction=EVICT_BODIES_FIRST,
+            bodies=bodies)
+        store.append(make_transaction(0, request_body='x' * 10))
+        store.append(make_transaction(1, request_body='x' * 10))
+        assert store[0].request.body is None
+        assert bodies.references('x' * 10) == 1
+
+    def test_oldest_eviction_is_the_default(self):
+        assert RingBufferStore(capacity=1).eviction == EVICT_OLDEST
+
+
+class TestPerThreadStore(object):
+    def test_keeps_transactions_of_a_single_thread_in_order(self):
+        store = PerThreadStore()
+        for index in range(3):
+            store.append(make_transaction(index))
+        assert _paths(store) == ['/0', '/1', '/2']
+        assert store[1].request.url_path == '/1'
+        assert len(store) == 3
+        assert store.ordered
+
+    def test_merges_the_threads_buffers_by_response_time(self):
+        store = PerThreadStore()
+        _run_in_thread(lambda: [store.append(make_transaction(i))
+                                for i in (0, 2, 4)])
+        _run_in_thread(lambda: [store.append(make_transaction(i))
+                                for i in (1, 3)])
+        assert _paths(store) == ['/0', '/1', '/2', '/3', '/4']
+        assert not store.ordered
+
+    def test_snapshot_and_reset_takes_every_thread_buffer(self):
+        store = PerThreadStore()
+        store.append(make_transaction(0))
+        _run_in_thread(lambda: store.append(make_transaction(1)))
+        snapshot = store.snapshot_and_reset()
+        assert _paths(snapshot) == ['/0', '/1']
+        assert len(store) == 0
+        store.append(make_transaction(2))
+        assert _paths(store) == ['/2']
+
+    def test_clear_removes_every_transaction(self):
+        store = PerThreadStore()
+        store.append(make_transaction(0))
+        store.clear()
+        assert list(store) == []
+
+    def test_no_transaction_is_lost_or_duplicated_under_contention(self):
+        num_threads = 64
+        per_thread = 500
+        store = PerThreadStore()
+        start = threading.Event()
+        snapshots = []
+
+        def capture(thread_index):
+            start.wait()
+            for index in range(per_thread):
+                store.append(
+                    make_transaction(thread_index * per_thread + index))
+
+        threads = [
+            threading.Thread(target=capture, args=(thread_index, ))
+            for thread_index in range(num_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        start.set()
+        while any(thread.is_alive() for thread in threads):
+            snapshots.append(store.snapshot_and_reset())
+        for thread in threads:
+            thread.join()
+        snapshots.append(store.snapshot_and_reset())
+
+        paths = [path for snapshot in snapshots for path in _paths(snapshot)]
+        assert len(paths) == num_threads * per_thread
+        assert len(set(paths)) == num_threads * per_thread
+
+
+def _run_in_thread(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
@@ -0,0 +1,49 @@
+import pytest
+from htmlvis.urls import ID_RULES, URLParser
+
+
+@pytest.mark.parametrize('url, host, path, query, target', [
+    ('http://example.com/users/1?active=true', 'example.com', '/users/1',
+     'active=true', '/users/1?active=true'),
+    ('https://user@example.com:8443/', 'user@example.com:8443', '/', '',
+     '/'),
+    ('http://example.com/page#top', 'example.com', '/page', '', '/page#top'),
+    ('http://a+b.example.com/a+b.example.com/x', 'a+b.example.com',
+     '/a+b.example.com/x', '', '/a+b.example.com/x'),
+    ('/relative?q=1', '', '/relative', 'q=1', '/relative?q=1'),
+])
+def test_splits_urls(url, host, path, query, target):
+    parsed = URLParser().parse(url)
+    assert (parsed.host, parsed.path, parsed.query, parsed.target) == (
+        host, path, query, target)
+
+
+def test_there_is_no_route_without_rules():
+    assert URLParser().parse('http://example.com/users/1').route is None
+
+
+@pytest.mark.parametrize('url, route', [
+    ('http://example.com/users/123', '/users/{id}'),
+    ('http://example.com/users/123/posts/4?page=2', '/users/{id}/posts/{id}'),
+    ('http://example.com/users/123abc', '/users/123abc'),
+    ('http://example.com/orders/1b4e28ba-2fa1-11d2-883f-0016d3cca427',
+     '/orders/{uuid}'),
+])
+def test_route_rules_collapse_variable_segments(url, route):
+    assert URLParser(route_rules=ID_RULES).parse(url).route == route
+
+
+def test_custom_route_rules_are_applied_in_order():
+    parser = URLParser(route_rules=[(r'/v\d+', '/{version}'),
+                                    (r'/[a-z]+@[a-z.]+', '/{email}')])
+    parsed = parser.parse('http://example.com/v2/users/me@example.com')
+    assert parsed.route == '/{version}/users/{email}'
+
+
+def test_keeps_the_most_recently_used_url_prefixes():
+    parser = URLParser(max_prefixes=2)
+    for host in ('a.com', 'b.com', 'a.com', 'c.com'):
+        parser.parse('http://%s/' % host)
+    assert parser._hosts.get('http://a.com') == 'a.com'
+    assert parser._hosts.get('http://b.com') is None
+    assert len(parser._hosts) == 2